@@ -1,6 +1,12 @@
-from app.main import main
+import multiprocessing
+import sys
 
 if __name__ == "__main__":
+	# Needed for the process export backend in frozen (PyInstaller) builds
+	multiprocessing.freeze_support()
+	# Imported here so spawned export workers, which re-import this module, skip the GUI
+	from app import cli
+	if len(sys.argv) > 1 and sys.argv[1] in cli.COMMANDS:
+		raise SystemExit(cli.main(sys.argv[1:]))
+	from app.main import main
 	raise SystemExit(main())
-
-
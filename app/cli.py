@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import argparse
+import glob
+import os
+import signal
+import sys
+import threading
+import time
+from typing import Iterable, Iterator, Optional, Sequence
+
+from app.core.batch import ensure_qt_app
+from app.core.exporter import SUPPORTED_INPUT_EXTS, ExportJob, choose_backend, default_workers, output_path_for, run_export
+from app.core.journal import ExportJournal
+from app.core.manifest import ExportManifest
+from app.core.models import ExportOptions
+from app.core.scan import iter_image_files
+from app.core.templates import resolve_template
+
+# Subcommands handled here instead of starting the GUI (see app/__main__.py)
+COMMANDS = ("batch", "watch", "serve")
+
+_DEFAULT_AFFIX = {"original": "", "prefix": "wm_", "suffix": "_watermarked"}
+
+
+def iter_input_files(inputs: Iterable[str]) -> Iterator[str]:
+	"""Expand files, directories (walked recursively) and glob patterns into supported image paths, without duplicates."""
+	seen: set[str] = set()
+
+	def emit(path: str) -> Iterator[str]:
+		path = os.path.abspath(path)
+		if path not in seen and os.path.splitext(path)[1].lower() in SUPPORTED_INPUT_EXTS:
+			seen.add(path)
+			yield path
+
+	for spec in inputs:
+		matches = [spec] if os.path.exists(spec) else sorted(glob.glob(spec, recursive=True))
+		if not matches:
+			print(f"警告：没有匹配的文件：{spec}", file=sys.stderr)
+		for match in matches:
+			if os.path.isdir(match):
+				for path in iter_image_files(match):
+					yield from emit(path)
+			else:
+				yield from emit(match)
+
+
+def options_from_args(args: argparse.Namespace) -> ExportOptions:
+	opts = ExportOptions()
+	opts.output_dir = os.path.abspath(args.output_dir)
+	opts.format = args.format
+	opts.jpeg_quality = args.quality
+	opts.scale_mode = args.scale_mode
+	opts.scale_value = args.scale_value
+	opts.scale_height = args.scale_height
+	opts.name_rule = args.name_rule
+	opts.name_affix = _DEFAULT_AFFIX[args.name_rule] if args.affix is None else args.affix
+	opts.engine = args.engine
+	return opts
+
+
+def add_export_arguments(parser: argparse.ArgumentParser) -> None:
+	"""Template and ExportOptions flags shared by the headless commands."""
+	parser.add_argument("-t", "--template", required=True, help="水印模板 JSON 路径，或模板目录中的模板名")
+	parser.add_argument("-o", "--output-dir", required=True, help="输出目录（不存在时自动创建）")
+	parser.add_argument("--format", type=str.upper, choices=["PNG", "JPEG"], default="PNG", help="输出格式")
+	parser.add_argument("--quality", type=int, default=90, help="JPEG 质量 0-100")
+	parser.add_argument("--scale-mode", choices=["none", "width", "height", "both", "percent"], default="none", help="缩放方式")
+	parser.add_argument("--scale-value", type=float, default=1.0, help="宽度像素、高度像素或百分比")
+	parser.add_argument("--scale-height", type=float, default=0.0, help="scale-mode=both 时的高度")
+	parser.add_argument("--name-rule", choices=["original", "prefix", "suffix"], default="suffix", help="命名规则")
+	parser.add_argument("--affix", default=None, help="自定义前缀/后缀（默认 wm_ 或 _watermarked）")
+	parser.add_argument("--engine", choices=["qt", "pillow"], default="qt", help="渲染引擎")
+	parser.add_argument("-j", "--workers", type=int, default=None, help="并行任务数（默认 CPU 核数）")
+
+
+def build_parser() -> argparse.ArgumentParser:
+	parser = argparse.ArgumentParser(prog="python -m app", description="水印批量处理工具（无界面模式）")
+	sub = parser.add_subparsers(dest="command", required=True)
+
+	batch = sub.add_parser("batch", help="批量为图片添加水印并导出")
+	batch.add_argument("inputs", nargs="+", help="图片文件、文件夹或通配符（如 'photos/**/*.jpg'）")
+	add_export_arguments(batch)
+	batch.add_argument("--backend", choices=["auto", "thread", "pipeline", "process"], default="auto", help="导出后端")
+	batch.add_argument("--overwrite", action="store_true", help="覆盖已存在的输出文件（默认跳过）")
+	batch.add_argument("--restart", action="store_true", help="忽略上次中断留下的进度记录，从头开始")
+	batch.add_argument("--full", action="store_true", help="重新导出全部图片（默认跳过源图、模板和导出设置都未变化的图片）")
+	batch.add_argument("--progress-interval", type=float, default=5.0, help="进度输出间隔秒数，0 表示不输出")
+	batch.set_defaults(handler=_cmd_batch)
+
+	watch = sub.add_parser("watch", help="持续监视文件夹，为新增或修改的图片添加水印")
+	watch.add_argument("dirs", nargs="+", help="要监视的文件夹")
+	add_export_arguments(watch)
+	watch.add_argument("--state", default=None, help="状态文件路径（默认 <输出目录>/.watermark_watch.json）")
+	watch.add_argument("--settle", type=float, default=1.0, help="文件大小和修改时间保持不变多少秒后才处理")
+	watch.add_argument("--no-recursive", dest="recursive", action="store_false", help="不监视子文件夹")
+	watch.add_argument("--polling", action="store_true", help="使用定时扫描代替 inotify（网络共享目录）")
+	watch.add_argument("--poll-interval", type=float, default=2.0, help="定时扫描间隔秒数")
+	watch.set_defaults(handler=_cmd_watch)
+
+	serve = sub.add_parser("serve", help="启动本地 HTTP 水印渲染服务（仅监听 127.0.0.1）")
+	serve.add_argument("--port", type=int, default=8765, help="监听端口")
+	serve.add_argument("--engine", choices=["qt", "pillow"], default="qt", help="渲染引擎")
+	serve.add_argument("-j", "--workers", type=int, default=None, help="常驻渲染引擎数量，即最大并发渲染数（默认 CPU 核数）")
+	serve.add_argument("--max-queue", type=int, default=16, help="允许排队等待的请求数，超出时返回 503")
+	serve.add_argument("--queue-timeout", type=float, default=30.0, help="排队等待超时秒数")
+	serve.set_defaults(handler=_cmd_serve)
+	return parser
+
+
+def _format_rate(done: int, elapsed: float) -> str:
+	return f"{done / elapsed:.1f} 张/秒" if elapsed > 0 else "-"
+
+
+def _cmd_batch(args: argparse.Namespace) -> int:
+	cfg = resolve_template(args.template)
+	if cfg is None:
+		print(f"错误：无法加载模板：{args.template}", file=sys.stderr)
+		return 2
+	opts = options_from_args(args)
+	os.makedirs(opts.output_dir, exist_ok=True)
+
+	# Progress of an interrupted run into the same directory; finished images are skipped without decoding
+	journal = ExportJournal.for_output_dir(opts.output_dir, opts)
+	if args.restart:
+		journal.reset()
+	elif len(journal):
+		print(f"继续上次未完成的导出（已完成 {len(journal)} 张）", file=sys.stderr)
+	# What produced each output already in the directory; unchanged images are not rendered again
+	# Loaded with --full too: it tells our own earlier outputs apart from files to leave alone
+	manifest = ExportManifest.for_output_dir(opts.output_dir, opts)
+
+	jobs: list[ExportJob] = []
+	skipped = unchanged = 0
+	errors: list[tuple[str, str]] = []
+	claimed: set[str] = set()
+	for src_path in iter_input_files(args.inputs):
+		out_path = output_path_for(src_path, opts)
+		job = ExportJob(src_path, out_path, cfg)
+		if os.path.normcase(out_path) == os.path.normcase(src_path):
+			errors.append((src_path, "输出会覆盖原图"))
+		elif out_path in claimed:
+			errors.append((src_path, f"输出文件名冲突：{out_path}"))
+		elif not args.overwrite and os.path.exists(out_path) and not journal.is_done(job) and not manifest.has_entry(out_path):
+			# Not written by an earlier export here: leave it alone
+			skipped += 1
+		else:
+			claimed.add(out_path)
+			jobs.append(job)
+	claimed.clear()
+
+	workers = args.workers or default_workers()
+	backend = choose_backend(len(jobs), workers) if args.backend == "auto" else args.backend
+	if opts.engine == "qt":
+		ensure_qt_app()
+	print(f"共 {len(jobs)} 张待检查，跳过 {skipped} 张已存在（{backend}，{workers} 个并行任务，{opts.engine} 引擎）", file=sys.stderr)
+
+	saved = failed = done = 0
+	cancel_event = threading.Event()
+	start = last_report = time.perf_counter()
+	results = run_export(jobs, opts, workers=workers, cancel_event=cancel_event, backend=backend, journal=journal, manifest=manifest, incremental=not args.full)
+	interrupted = False
+	try:
+		for res in results:
+			done += 1
+			if res.skipped:
+				unchanged += 1
+			elif res.ok:
+				saved += 1
+			elif not res.cancelled:
+				failed += 1
+				errors.append((res.job.src_path, res.error))
+			now = time.perf_counter()
+			if args.progress_interval > 0 and now - last_report >= args.progress_interval:
+				last_report = now
+				print(f"[{now - start:.0f}s] {done}/{len(jobs)}  {_format_rate(done, now - start)}  失败 {failed}", file=sys.stderr)
+	except KeyboardInterrupt:
+		interrupted = True
+		cancel_event.set()
+	finally:
+		# Closing the generator stops its workers (terminates the process pool)
+		results.close()
+	elapsed = time.perf_counter() - start
+
+	for src_path, error in errors:
+		print(f"失败：{src_path}：{error}", file=sys.stderr)
+	print(
+		f"成功 {saved}，失败 {len(errors)}，跳过 {skipped}，未变化 {unchanged}"
+		+ (f"，已取消 {len(jobs) - done}" if interrupted else "")
+		+ f"，用时 {elapsed:.1f} 秒，吞吐 {_format_rate(saved, elapsed)}"
+	)
+	if interrupted:
+		return 130
+	return 1 if errors else 0
+
+
+def _cmd_watch(args: argparse.Namespace) -> int:
+	from app.core.watcher import FolderWatcher
+
+	cfg = resolve_template(args.template)
+	if cfg is None:
+		print(f"错误：无法加载模板：{args.template}", file=sys.stderr)
+		return 2
+	missing = [d for d in args.dirs if not os.path.isdir(d)]
+	if missing:
+		print(f"错误：文件夹不存在：{', '.join(missing)}", file=sys.stderr)
+		return 2
+	opts = options_from_args(args)
+	os.makedirs(opts.output_dir, exist_ok=True)
+
+	def report(res, latency_s: float) -> None:
+		if res.ok:
+			print(f"已导出：{res.job.src_path} -> {res.job.out_path}（处理 {res.elapsed_s:.2f} 秒，延迟 {latency_s:.1f} 秒）", flush=True)
+		else:
+			print(f"失败：{res.job.src_path}：{res.error}", file=sys.stderr, flush=True)
+
+	try:
+		watcher = FolderWatcher(
+			args.dirs, cfg, opts,
+			state_path=args.state,
+			workers=args.workers,
+			settle_s=args.settle,
+			recursive=args.recursive,
+			polling=args.polling,
+			poll_interval_s=args.poll_interval,
+			on_result=report,
+		)
+	except ValueError:
+		print("错误：输出目录不能是被监视的文件夹（或其上级目录）", file=sys.stderr)
+		return 2
+	if opts.engine == "qt":
+		ensure_qt_app()
+	stop = threading.Event()
+	# SIGTERM (service managers) and Ctrl+C both finish in-flight images, save state and exit
+	signal.signal(signal.SIGTERM, lambda *_: stop.set())
+	signal.signal(signal.SIGINT, lambda *_: stop.set())
+	print(f"正在监视：{', '.join(watcher.dirs)} -> {opts.output_dir}（Ctrl+C 退出）", file=sys.stderr, flush=True)
+	watcher.run(stop)
+	return 0
+
+
+def _cmd_serve(args: argparse.Namespace) -> int:
+	from app.server import RenderService, make_server
+
+	if args.engine == "qt":
+		ensure_qt_app()
+	service = RenderService(args.engine, args.workers, args.max_queue, args.queue_timeout)
+	try:
+		server = make_server(service, args.port)
+	except OSError as e:
+		print(f"错误：无法监听端口 {args.port}：{e}", file=sys.stderr)
+		return 2
+	# shutdown() waits for serve_forever to return, so it must run off the serving thread
+	signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+	print(f"渲染服务已启动：http://127.0.0.1:{server.server_address[1]}（{service.workers} 个引擎，Ctrl+C 退出）", file=sys.stderr, flush=True)
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+	return 0
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+	args = build_parser().parse_args(argv)
+	return args.handler(args)
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional, Union
+
+from .exporter import decode, default_workers, encode, engine_class, output_path_for, save_output
+from .lru import ByteBudgetLRU
+from .models import ExportOptions, WatermarkConfig
+
+# A path (str or os.PathLike) or encoded image bytes
+Source = Union[str, "os.PathLike[str]", bytes, bytearray, memoryview]
+
+
+@dataclass
+class WatermarkResult:
+	index: int  # position of the source in the input sequence
+	source: Optional[str]  # source path; None for in-memory input
+	ok: bool
+	out_path: Optional[str] = None  # written file, when exporting to opts.output_dir
+	data: Optional[bytes] = None  # encoded output, otherwise
+	error: str = ""
+	decode_s: float = 0.0
+	render_s: float = 0.0
+	encode_s: float = 0.0
+
+	@property
+	def elapsed_s(self) -> float:
+		return self.decode_s + self.render_s + self.encode_s
+
+
+# One engine per worker thread (and per engine kind), sharing an overlay cache per kind
+_local = threading.local()
+_overlays: dict[str, ByteBudgetLRU] = {}
+_overlays_lock = threading.Lock()
+
+
+def _engine(opts: ExportOptions):
+	engines = getattr(_local, "engines", None)
+	if engines is None:
+		engines = _local.engines = {}
+	engine = engines.get(opts.engine)
+	if engine is None:
+		if opts.engine == "qt":
+			ensure_qt_app()
+		engine_cls = engine_class(opts)
+		with _overlays_lock:
+			overlays = _overlays.get(opts.engine)
+			if overlays is None:
+				overlays = _overlays[opts.engine] = engine_cls.new_overlay_cache()
+		engine = engines[opts.engine] = engine_cls(overlay_cache=overlays)
+	return engine
+
+
+_qt_app = None
+
+
+def ensure_qt_app() -> None:
+	"""Make sure a QGuiApplication exists, which the Qt engine needs for fonts.
+
+	Without one Qt aborts the whole process on the first text watermark. An
+	offscreen application is created when missing; that is only possible on the
+	main thread, so elsewhere a RuntimeError is raised instead."""
+	global _qt_app
+	from PySide6.QtGui import QGuiApplication
+	if QGuiApplication.instance() is not None:
+		return
+	if threading.current_thread() is not threading.main_thread():
+		raise RuntimeError("Qt 引擎需要 QGuiApplication：请在主线程创建，或在主线程调用 watermark_iter，或使用 engine=\"pillow\"")
+	os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+	_qt_app = QGuiApplication(["watermark"])
+
+
+def init_process() -> None:
+	"""ProcessPoolExecutor initializer for the Qt engine: boots an offscreen QGuiApplication for fonts."""
+	ensure_qt_app()
+
+
+def watermark_one(index: int, source: Source, cfg: WatermarkConfig, opts: ExportOptions) -> WatermarkResult:
+	"""Watermark a single source; never raises, failures come back as ok=False."""
+	path = os.fspath(source) if isinstance(source, (str, os.PathLike)) else None
+	result = WatermarkResult(index, path, False)
+	try:
+		start = time.perf_counter()
+		img = decode(path if path is not None else bytes(source), opts)
+		result.decode_s = time.perf_counter() - start
+		if img is None:
+			result.error = "无法读取图片"
+			return result
+		start = time.perf_counter()
+		img = _engine(opts).render_in_place(img, cfg)
+		result.render_s = time.perf_counter() - start
+		start = time.perf_counter()
+		if path is not None and opts.output_dir:
+			out_path = output_path_for(path, opts)
+			saved = save_output(img, out_path, opts)
+			result.encode_s = time.perf_counter() - start
+			if not saved:
+				result.error = "无法写入文件"
+				return result
+			result.out_path = out_path
+		else:
+			result.data = encode(img, opts)
+			result.encode_s = time.perf_counter() - start
+			if result.data is None:
+				result.error = "编码失败"
+				return result
+		result.ok = True
+	except Exception as e:
+		result.error = str(e)
+	return result
+
+
+def watermark_iter(
+	sources: Iterable[Source],
+	cfg: WatermarkConfig,
+	opts: Optional[ExportOptions] = None,
+	executor: Optional[Executor] = None,
+	max_in_flight: Optional[int] = None,
+) -> Iterator[WatermarkResult]:
+	"""Watermark sources concurrently, yielding a WatermarkResult as each one finishes.
+
+	Path sources are written to opts.output_dir (named by opts' naming rule) when
+	it is set; in-memory sources, and paths when output_dir is empty, come back
+	as encoded bytes in result.data. Results arrive in completion order; use
+	result.index to match them to the input.
+
+	executor defaults to a private thread pool of default_workers() threads. A
+	ProcessPoolExecutor also works; with the Qt engine give it
+	initializer=init_process. Otherwise the Qt engine gets an offscreen
+	QGuiApplication on first use when the program has none (see ensure_qt_app).
+
+	sources is consumed lazily and at most max_in_flight (default twice the CPU
+	count) items are pending at once, so large or unbounded iterables stream
+	with bounded memory. Closing the generator early cancels work that has not
+	started."""
+	opts = opts or ExportOptions()
+	if opts.engine == "qt" and not isinstance(executor, ProcessPoolExecutor):
+		# Worker threads cannot create the application; do it here, on the caller's thread
+		ensure_qt_app()
+	own_executor = executor is None
+	if own_executor:
+		executor = ThreadPoolExecutor(max_workers=default_workers(), thread_name_prefix="watermark")
+	max_in_flight = max_in_flight or default_workers() * 2
+	pending: set[Future] = set()
+	it = enumerate(sources)
+	exhausted = False
+	try:
+		while True:
+			while not exhausted and len(pending) < max_in_flight:
+				item = next(it, None)
+				if item is None:
+					exhausted = True
+					break
+				pending.add(executor.submit(watermark_one, item[0], item[1], cfg, opts))
+			if not pending:
+				return
+			done, pending = wait(pending, return_when=FIRST_COMPLETED)
+			for fut in done:
+				yield fut.result()
+	finally:
+		for fut in pending:
+			fut.cancel()
+		if own_executor:
+			executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,560 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from typing import Iterable, Iterator, Optional
+
+from PySide6.QtCore import QBuffer, QByteArray, QIODevice, Qt, QSize
+from PySide6.QtGui import QImage, QImageReader
+
+from .geometry import export_dimensions
+from .journal import ExportJournal
+from .manifest import ExportManifest
+from .models import ExportOptions, WatermarkConfig, config_fingerprint
+from .probe import image_index
+from .watermark_engine import WatermarkEngine
+
+SUPPORTED_INPUT_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff"}
+# Worker processes pay a startup cost but scale past the GIL; use them for larger batches
+PROCESS_EXPORT_MIN_JOBS = 32
+
+
+@dataclass
+class ExportJob:
+	src_path: str
+	out_path: str
+	cfg: WatermarkConfig
+
+
+@dataclass
+class ExportResult:
+	job: ExportJob
+	ok: bool
+	error: str = ""
+	elapsed_s: float = 0.0
+	cancelled: bool = False
+	skipped: bool = False  # already up to date per the run's journal or manifest
+
+
+def output_path_for(src_path: str, opts: ExportOptions) -> str:
+	name, _ = os.path.splitext(os.path.basename(src_path))
+	if opts.name_rule == "original":
+		out_name = name
+	elif opts.name_rule == "prefix":
+		out_name = f"{opts.name_affix}{name}"
+	else:
+		out_name = f"{name}{opts.name_affix}"
+	out_ext = ".jpg" if opts.format.upper() == "JPEG" else ".png"
+	return os.path.join(opts.output_dir, out_name + out_ext)
+
+
+def scaled_size(size: QSize, opts: ExportOptions) -> QSize:
+	"""Output size of an image of the given size under opts' scale mode."""
+	return QSize(*export_dimensions(size.width(), size.height(), opts))
+
+
+def apply_scale(img: QImage, opts: ExportOptions) -> QImage:
+	target = scaled_size(img.size(), opts)
+	if target == img.size():
+		return img
+	return img.scaled(target, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+
+
+def load_image(source: str | bytes, opts: ExportOptions) -> QImage:
+	"""Decode source (a path or encoded bytes) already scaled to the export size.
+
+	When the output is smaller than the source, the reader decodes straight to
+	the target size (libjpeg DCT-domain downscaling for JPEG) so the
+	full-resolution bitmap is never materialized."""
+	if isinstance(source, str):
+		reader = QImageReader(source)
+	else:
+		buffer = QBuffer()
+		buffer.setData(QByteArray(bytes(source)))
+		buffer.open(QIODevice.ReadOnly)
+		reader = QImageReader(buffer)
+	src_size = reader.size()
+	if src_size.isValid():
+		target = scaled_size(src_size, opts)
+		if target.width() < src_size.width() and target.height() < src_size.height():
+			reader.setScaledSize(target)
+			img = reader.read()
+			if not img.isNull() and img.size() != target:
+				img = img.scaled(target, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+			return img
+	img = reader.read()
+	if img.isNull():
+		return img
+	return apply_scale(img, opts)
+
+
+def save_image(img: QImage, out, opts: ExportOptions) -> bool:
+	"""Encode img to out, a file path or an open QIODevice."""
+	if opts.format.upper() == "JPEG":
+		# The JPEG writer takes opaque formats as is; only images with alpha need flattening
+		if img.hasAlphaChannel():
+			img = img.convertToFormat(QImage.Format_RGB888)
+		return img.save(out, "JPEG", opts.jpeg_quality)
+	return img.save(out, "PNG")
+
+
+def encode_image(img: QImage, opts: ExportOptions) -> Optional[bytes]:
+	buffer = QBuffer()
+	buffer.open(QIODevice.WriteOnly)
+	if not save_image(img, buffer, opts):
+		return None
+	return bytes(buffer.data())
+
+
+def engine_class(opts: ExportOptions):
+	"""Watermark engine class selected by opts.engine."""
+	if opts.engine == "pillow":
+		from .pil_engine import PillowWatermarkEngine
+		return PillowWatermarkEngine
+	if opts.engine != "qt":
+		raise ValueError(f"unknown watermark engine: {opts.engine}")
+	return WatermarkEngine
+
+
+def decode(source: str | bytes, opts: ExportOptions):
+	"""Bitmap of the opts.engine type for source (a path or encoded bytes) at export size, or None when unreadable."""
+	if opts.engine == "pillow":
+		from . import pil_engine
+		return pil_engine.load_image(source, opts)
+	img = load_image(source, opts)
+	return None if img.isNull() else img
+
+
+def save_output(img, out_path: str, opts: ExportOptions) -> bool:
+	# Encode to a hidden temp file beside the target and rename it into place, so a
+	# crash or kill never leaves a truncated file under the output name
+	out_dir, name = os.path.split(out_path)
+	tmp_path = os.path.join(out_dir, f".{name}.{os.getpid()}.{threading.get_ident()}.part")
+	try:
+		if opts.engine == "pillow":
+			from . import pil_engine
+			ok = pil_engine.save_image(img, tmp_path, opts)
+		else:
+			ok = save_image(img, tmp_path, opts)
+		if ok:
+			os.replace(tmp_path, out_path)
+		return ok
+	except OSError:
+		return False
+	finally:
+		if os.path.exists(tmp_path):
+			os.remove(tmp_path)
+
+
+def remove_partial_outputs(output_dir: str) -> int:
+	"""Delete temp files that save_output left behind when a process was killed mid-write."""
+	removed = 0
+	try:
+		entries = list(os.scandir(output_dir))
+	except OSError:
+		return 0
+	for entry in entries:
+		if entry.name.startswith(".") and entry.name.endswith(".part") and entry.is_file():
+			try:
+				os.remove(entry.path)
+				removed += 1
+			except OSError:
+				pass
+	return removed
+
+
+def encode(img, opts: ExportOptions) -> Optional[bytes]:
+	"""Encode a bitmap from decode() as opts.format."""
+	if opts.engine == "pillow":
+		from . import pil_engine
+		return pil_engine.encode_image(img, opts)
+	return encode_image(img, opts)
+
+
+def export_image(engine, job: ExportJob, opts: ExportOptions) -> ExportResult:
+	"""Decode, scale, watermark and encode a single image with engine (of engine_class(opts))."""
+	start = time.perf_counter()
+	img = decode(job.src_path, opts)
+	if img is None:
+		return ExportResult(job, False, "无法读取图片", time.perf_counter() - start)
+	composited = engine.render_in_place(img, job.cfg)
+	if not save_output(composited, job.out_path, opts):
+		return ExportResult(job, False, "无法写入文件", time.perf_counter() - start)
+	return ExportResult(job, True, "", time.perf_counter() - start)
+
+
+def group_jobs(jobs: Iterable[ExportJob], opts: ExportOptions, probe_workers: int = 8) -> list[ExportJob]:
+	"""Order jobs so images that share an output size and config are consecutive.
+
+	Sizes come from image headers only, through the shared ImageIndex (probed on
+	probe_workers threads; images already probed by the image list cost a stat).
+	Consecutive jobs in a group reuse one cached watermark overlay instead of
+	redrawing it per image. When every job has the same config and scale mode
+	"both" fixes the output size, nothing is probed and the order is kept."""
+	jobs = list(jobs)
+	fingerprints: dict[int, str] = {}
+	for job in jobs:
+		if id(job.cfg) not in fingerprints:
+			fingerprints[id(job.cfg)] = config_fingerprint(job.cfg)
+	if len(jobs) < 2 or (opts.scale_mode == "both" and len(set(fingerprints.values())) == 1):
+		return jobs
+	infos = image_index().probe_many((job.src_path for job in jobs), probe_workers)
+
+	def key(job: ExportJob) -> tuple[str, int, int]:
+		info = infos.get(job.src_path)
+		if info is None:
+			return fingerprints[id(job.cfg)], -1, -1
+		out = scaled_size(QSize(info.width, info.height), opts)
+		return fingerprints[id(job.cfg)], out.width(), out.height()
+
+	return sorted(jobs, key=key)
+
+
+def default_workers() -> int:
+	return max(1, os.cpu_count() or 1)
+
+
+def choose_backend(job_count: int, workers: Optional[int] = None) -> str:
+	"""run_export backend suited to a batch of job_count images."""
+	if job_count >= PROCESS_EXPORT_MIN_JOBS and (workers or default_workers()) > 1:
+		return "process"
+	return "pipeline"
+
+
+def run_export(
+	jobs: Iterable[ExportJob],
+	opts: ExportOptions,
+	workers: Optional[int] = None,
+	cancel_event: Optional[threading.Event] = None,
+	backend: str = "thread",
+	journal: Optional[ExportJournal] = None,
+	manifest: Optional[ExportManifest] = None,
+	incremental: bool = True,
+) -> Iterator[ExportResult]:
+	"""Export jobs on a worker pool, yielding results in completion order.
+
+	backend is "thread" (shared process, one engine per thread), "pipeline"
+	(see run_export_pipeline) or "process" (see run_export_processes). Setting
+	cancel_event stops jobs that have not started yet; they are reported with
+	cancelled=True.
+
+	With a journal, jobs it lists as done are reported with skipped=True before
+	anything is read, each successful export is appended to it, and it is
+	completed (removed) once every job has succeeded. With a manifest, only jobs
+	whose source, config and options are unchanged since their output was written
+	are skipped (the journal is then just kept up to date), and the manifest is
+	updated with every new output. incremental=False skips nothing but still
+	keeps the manifest up to date."""
+	if backend not in ("thread", "pipeline", "process"):
+		raise ValueError(f"unknown export backend: {backend}")
+	skipped: list[ExportJob] = []
+	if journal is not None or manifest is not None:
+		if journal is not None:
+			remove_partial_outputs(opts.output_dir)
+		remaining = []
+		for job in jobs:
+			# The manifest check also remembers the job's key for recording, so run it for every job.
+			# It decides alone when present: the journal does not know whether the source changed since
+			if manifest is not None:
+				done = manifest.check(job) and incremental
+			elif not incremental:
+				done = False
+			else:
+				done = journal.is_done(job)
+			(skipped if done else remaining).append(job)
+		jobs = remaining
+	if backend != "process":
+		# Worker processes each keep their own overlay cache and take jobs in any order: grouping can't help there
+		jobs = group_jobs(jobs, opts)
+	if backend == "process":
+		results = run_export_processes(jobs, opts, workers, cancel_event)
+	elif backend == "pipeline":
+		results = run_export_pipeline(jobs, opts, workers, cancel_event)
+	else:
+		results = _run_export_threads(jobs, opts, workers, cancel_event)
+	if journal is None and manifest is None:
+		return results
+	return _tracked(results, skipped, journal, manifest)
+
+
+def _tracked(
+	results: Iterator[ExportResult],
+	skipped: list[ExportJob],
+	journal: Optional[ExportJournal],
+	manifest: Optional[ExportManifest],
+) -> Iterator[ExportResult]:
+	for job in skipped:
+		yield ExportResult(job, True, skipped=True)
+	all_ok = True
+	try:
+		for res in results:
+			if res.ok:
+				if journal is not None:
+					journal.record(res.job)
+				if manifest is not None:
+					manifest.record(res.job)
+					manifest.save()
+			else:
+				all_ok = False
+			yield res
+	finally:
+		results.close()
+		if journal is not None:
+			journal.close()
+		if manifest is not None:
+			manifest.save(force=True)
+	if all_ok and journal is not None:
+		journal.complete()
+
+
+def _run_export_threads(
+	jobs: Iterable[ExportJob],
+	opts: ExportOptions,
+	workers: Optional[int],
+	cancel_event: Optional[threading.Event],
+) -> Iterator[ExportResult]:
+	local = threading.local()
+	engine_cls = engine_class(opts)
+	overlays = engine_cls.new_overlay_cache()
+
+	def run_one(job: ExportJob) -> ExportResult:
+		if cancel_event is not None and cancel_event.is_set():
+			return ExportResult(job, False, "", 0.0, cancelled=True)
+		engine = getattr(local, "engine", None)
+		if engine is None:
+			engine = local.engine = engine_cls(overlay_cache=overlays)
+		try:
+			return export_image(engine, job, opts)
+		except Exception as e:
+			return ExportResult(job, False, str(e))
+
+	with ThreadPoolExecutor(max_workers=workers or default_workers(), thread_name_prefix="export") as pool:
+		futures = [pool.submit(run_one, job) for job in jobs]
+		try:
+			for fut in as_completed(futures):
+				yield fut.result()
+		finally:
+			# Consumer stopped early: drop jobs that have not started
+			for fut in futures:
+				fut.cancel()
+
+
+# Per-process state for the process backend, set up by _init_export_process
+_process_engine = None
+_process_opts: Optional[ExportOptions] = None
+
+
+def _init_export_process(opts_data: dict) -> None:
+	global _process_engine, _process_opts
+	# Ctrl+C reaches the whole process group; the parent handles it and terminates the pool
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+	_process_opts = ExportOptions(**opts_data)
+	if _process_opts.engine == "qt":
+		from .batch import ensure_qt_app
+		ensure_qt_app()
+	_process_engine = engine_class(_process_opts)()
+
+
+def _export_in_process(payload: tuple[int, str, str, dict]) -> tuple[int, bool, str, float]:
+	from .templates import _from_dict
+	index, src_path, out_path, cfg_data = payload
+	job = ExportJob(src_path, out_path, _from_dict(cfg_data))
+	try:
+		res = export_image(_process_engine, job, _process_opts)
+	except Exception as e:
+		return index, False, str(e), 0.0
+	return index, res.ok, res.error, res.elapsed_s
+
+
+def run_export_processes(
+	jobs: Iterable[ExportJob],
+	opts: ExportOptions,
+	workers: Optional[int] = None,
+	cancel_event: Optional[threading.Event] = None,
+	chunksize: Optional[int] = None,
+) -> Iterator[ExportResult]:
+	"""Export jobs on a pool of worker processes, yielding results as they stream back.
+
+	Each process builds its own engine (booting an offscreen Qt for the Qt engine), and receives
+	shards of chunksize jobs with configs serialized as plain dicts. Encoding and
+	scaling then run without contending for one interpreter's GIL. On cancellation
+	the pool is terminated and unfinished jobs are reported with cancelled=True."""
+	job_list = list(jobs)
+	if not job_list:
+		return
+	workers = min(workers or default_workers(), len(job_list))
+	if chunksize is None:
+		chunksize = max(1, min(32, len(job_list) // (workers * 4)))
+	# One dict per distinct config object: batches usually share a single config
+	cfg_data: dict[int, dict] = {}
+	payloads = []
+	for i, job in enumerate(job_list):
+		data = cfg_data.get(id(job.cfg))
+		if data is None:
+			data = cfg_data[id(job.cfg)] = asdict(job.cfg)
+		payloads.append((i, job.src_path, job.out_path, data))
+	pending = set(range(len(job_list)))
+	# spawn: forking a process that already runs Qt is unsafe
+	ctx = multiprocessing.get_context("spawn")
+	pool = ctx.Pool(workers, initializer=_init_export_process, initargs=(asdict(opts),))
+	try:
+		for index, ok, error, elapsed in pool.imap_unordered(_export_in_process, payloads, chunksize):
+			pending.discard(index)
+			yield ExportResult(job_list[index], ok, error, elapsed)
+			if cancel_event is not None and cancel_event.is_set():
+				break
+		pool.close()
+	finally:
+		pool.terminate()
+		pool.join()
+	for index in sorted(pending):
+		yield ExportResult(job_list[index], False, "", 0.0, cancelled=True)
+
+
+_STAGE_DONE = object()
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+	# Blocking put that gives up once the pipeline is torn down
+	while not stop.is_set():
+		try:
+			q.put(item, timeout=0.1)
+			return True
+		except queue.Full:
+			continue
+	return False
+
+
+def _get(q: queue.Queue, stop: threading.Event):
+	while not stop.is_set():
+		try:
+			return q.get(timeout=0.1)
+		except queue.Empty:
+			continue
+	return _STAGE_DONE
+
+
+def _start_stage(name: str, count: int, target, on_done) -> list[threading.Thread]:
+	# Run target on count threads; the last one to exit calls on_done to close the next stage
+	remaining = [count]
+	lock = threading.Lock()
+
+	def runner() -> None:
+		try:
+			target()
+		finally:
+			with lock:
+				remaining[0] -= 1
+				last = remaining[0] == 0
+			if last:
+				on_done()
+
+	threads = [threading.Thread(target=runner, name=f"export-{name}-{i}", daemon=True) for i in range(count)]
+	for t in threads:
+		t.start()
+	return threads
+
+
+def run_export_pipeline(
+	jobs: Iterable[ExportJob],
+	opts: ExportOptions,
+	workers: Optional[int] = None,
+	cancel_event: Optional[threading.Event] = None,
+	max_in_flight: Optional[int] = None,
+	io_threads: int = 2,
+) -> Iterator[ExportResult]:
+	"""Export jobs through overlapping decode -> composite -> encode stages.
+
+	io_threads readers decode sources at export size, workers compositors (one
+	engine each) watermark, and io_threads writers encode to disk. Stages are
+	joined by queues bounded to max_in_flight images, so disk latency hides behind
+	compositing while the number of decoded bitmaps held in memory stays capped."""
+	job_list = list(jobs)
+	total = len(job_list)
+	if not total:
+		return
+	workers = workers or default_workers()
+	max_in_flight = max_in_flight or workers * 2
+	stop = threading.Event()
+	job_q: queue.Queue = queue.Queue()
+	for job in job_list:
+		job_q.put(job)
+	decoded_q: queue.Queue = queue.Queue(max_in_flight)
+	composited_q: queue.Queue = queue.Queue(max_in_flight)
+	results_q: queue.Queue = queue.Queue()
+
+	def cancelled() -> bool:
+		return cancel_event is not None and cancel_event.is_set()
+
+	def read() -> None:
+		while not stop.is_set():
+			try:
+				job = job_q.get_nowait()
+			except queue.Empty:
+				return
+			if cancelled():
+				results_q.put(ExportResult(job, False, "", 0.0, cancelled=True))
+				continue
+			start = time.perf_counter()
+			try:
+				img = decode(job.src_path, opts)
+			except Exception as e:
+				results_q.put(ExportResult(job, False, str(e), time.perf_counter() - start))
+				continue
+			if img is None:
+				results_q.put(ExportResult(job, False, "无法读取图片", time.perf_counter() - start))
+				continue
+			if not _put(decoded_q, (job, img, start), stop):
+				return
+
+	engine_cls = engine_class(opts)
+	overlays = engine_cls.new_overlay_cache()
+
+	def composite() -> None:
+		engine = engine_cls(overlay_cache=overlays)
+		while True:
+			item = _get(decoded_q, stop)
+			if item is _STAGE_DONE:
+				return
+			job, img, start = item
+			try:
+				out = engine.render_in_place(img, job.cfg)
+			except Exception as e:
+				results_q.put(ExportResult(job, False, str(e), time.perf_counter() - start))
+				continue
+			del img
+			if not _put(composited_q, (job, out, start), stop):
+				return
+
+	def write() -> None:
+		while True:
+			item = _get(composited_q, stop)
+			if item is _STAGE_DONE:
+				return
+			job, out, start = item
+			try:
+				ok = save_output(out, job.out_path, opts)
+				error = "" if ok else "无法写入文件"
+			except Exception as e:
+				ok, error = False, str(e)
+			results_q.put(ExportResult(job, ok, error, time.perf_counter() - start))
+
+	def close_queue(q: queue.Queue, consumers: int):
+		return lambda: [_put(q, _STAGE_DONE, stop) for _ in range(consumers)]
+
+	threads = _start_stage("read", io_threads, read, close_queue(decoded_q, workers))
+	threads += _start_stage("composite", workers, composite, close_queue(composited_q, io_threads))
+	threads += _start_stage("write", io_threads, write, lambda: None)
+	try:
+		for _ in range(total):
+			yield results_q.get()
+	finally:
+		stop.set()
+		for t in threads:
+			t.join()
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from typing import Tuple
+
+from .models import ExportOptions, WatermarkConfig
+
+# Size arithmetic shared by the Qt and Pillow engines so both place and size
+# watermarks identically. Free of Qt so the Pillow path can use it headless.
+
+
+def _fit_keep_aspect(w: int, h: int, box_w: int, box_h: int) -> Tuple[int, int]:
+	# Same integer arithmetic as QSize.scaled(box, Qt.KeepAspectRatio)
+	if w <= 0 or h <= 0:
+		return box_w, box_h
+	rw = box_h * w // h
+	if rw <= box_w:
+		return rw, box_h
+	return box_w, box_w * h // w
+
+
+def export_dimensions(w: int, h: int, opts: ExportOptions) -> Tuple[int, int]:
+	"""Output size of a w x h image under opts' scale mode."""
+	if opts.scale_mode == "percent":
+		s = max(1, int(min(10000, opts.scale_value))) / 100.0
+		return _fit_keep_aspect(w, h, int(w * s), int(h * s))
+	elif opts.scale_mode == "width":
+		return _fit_keep_aspect(w, h, int(opts.scale_value), int(h * (opts.scale_value / w)))
+	elif opts.scale_mode == "height":
+		return _fit_keep_aspect(w, h, int(w * (opts.scale_value / h)), int(opts.scale_value))
+	elif opts.scale_mode == "both":
+		return int(opts.scale_value), int(opts.scale_height)
+	return w, h
+
+
+def logo_dimensions(cfg: WatermarkConfig, base_w: int, base_h: int, logo_w: int, logo_h: int) -> Tuple[int, int]:
+	"""Size the image watermark is drawn at on a base_w x base_h image."""
+	shorter = min(base_w, base_h)
+	# Base width from uniform scale
+	uniform_w = max(1, int(shorter * cfg.image.scale))
+	# Apply non-uniform multipliers
+	sx = max(0.01, float(getattr(cfg.image, "scale_x", 1.0)))
+	sy = max(0.01, float(getattr(cfg.image, "scale_y", 1.0)))
+	w = max(1, int(uniform_w * sx))
+	# Height preserving the logo aspect at width w, then apply sy
+	h = max(1, int(max(1, round(logo_h * w / logo_w)) * sy))
+	return w, h
+
+
+def text_anchor(cfg: WatermarkConfig, w: int, h: int) -> Tuple[float, float]:
+	pos = cfg.layout.text_position if cfg.layout.text_position else cfg.layout.position
+	return w * pos[0], h * pos[1]
+
+
+def image_anchor(cfg: WatermarkConfig, w: int, h: int) -> Tuple[float, float]:
+	pos = cfg.layout.image_position if cfg.layout.image_position else cfg.layout.position
+	return w * pos[0], h * pos[1]
+
+
+def text_rotation(cfg: WatermarkConfig) -> float:
+	# Prefer specific text rotation; fallback to legacy unified rotation
+	return getattr(cfg.layout, "text_rotation_deg", 0.0) or getattr(cfg.layout, "rotation_deg", 0.0)
+
+
+def image_rotation(cfg: WatermarkConfig) -> float:
+	# Prefer specific image rotation; fallback to legacy unified rotation
+	return getattr(cfg.layout, "image_rotation_deg", 0.0) or getattr(cfg.layout, "rotation_deg", 0.0)
+
+
+def text_pixel_size(cfg: WatermarkConfig, geometry_scale: float = 1.0) -> int:
+	try:
+		return max(1, int(round(int(getattr(cfg.text, "size_px", 16)) * geometry_scale)))
+	except Exception:
+		return max(1, int(round(16 * geometry_scale)))
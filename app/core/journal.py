@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from .manifest import options_fingerprint
+from .models import ExportOptions, WatermarkConfig, config_fingerprint
+
+
+class ExportJournal:
+	"""Append-only checkpoint of an export run: one JSON line per finished (source, output, config hash, options hash).
+
+	The journal lives in the output directory while a run is in progress and is
+	deleted when a run finishes without failures, so its presence means an
+	interrupted run that can be resumed. Outputs are renamed into place before
+	their line is appended, so an entry always refers to a complete file; a torn
+	last line from a crash is ignored on load. Entries written with different
+	ExportOptions (scaling, format, quality...) are ignored too, so changing the
+	options between runs re-renders those images instead of resuming."""
+	FILENAME = ".watermark_journal.jsonl"
+
+	def __init__(self, path: str, opts: ExportOptions) -> None:
+		self.path = path
+		self._opts_fp = options_fingerprint(opts)
+		self._lock = threading.Lock()
+		self._file = None
+		self._done: set[tuple[str, str, str]] = set()
+		# id(cfg) -> (cfg, fingerprint); holding cfg keeps its id from being reused
+		self._fingerprints: dict[int, tuple[WatermarkConfig, str]] = {}
+		try:
+			with open(path, "r", encoding="utf-8") as f:
+				for line in f:
+					try:
+						entry = json.loads(line)
+						if entry["opts"] == self._opts_fp:
+							self._done.add((entry["src"], entry["out"], entry["cfg"]))
+					except (ValueError, KeyError, TypeError):
+						continue
+		except OSError:
+			pass
+
+	@classmethod
+	def for_output_dir(cls, output_dir: str, opts: ExportOptions) -> "ExportJournal":
+		return cls(os.path.join(output_dir, cls.FILENAME), opts)
+
+	def __len__(self) -> int:
+		return len(self._done)
+
+	def _fingerprint(self, cfg: WatermarkConfig) -> str:
+		cached = self._fingerprints.get(id(cfg))
+		if cached is None or cached[0] is not cfg:
+			cached = self._fingerprints[id(cfg)] = (cfg, config_fingerprint(cfg))
+		return cached[1]
+
+	def is_done(self, job) -> bool:
+		"""True when job (an ExportJob) finished in this or an earlier run and its output still exists."""
+		key = (job.src_path, job.out_path, self._fingerprint(job.cfg))
+		return key in self._done and os.path.exists(job.out_path)
+
+	def record(self, job) -> None:
+		key = (job.src_path, job.out_path, self._fingerprint(job.cfg))
+		line = json.dumps({"src": key[0], "out": key[1], "cfg": key[2], "opts": self._opts_fp}, ensure_ascii=False) + "\n"
+		with self._lock:
+			if self._file is None:
+				self._file = open(self.path, "a", encoding="utf-8")
+			self._file.write(line)
+			# Flushed per entry so a kill loses at most the images still in flight
+			self._file.flush()
+			self._done.add(key)
+
+	def close(self) -> None:
+		with self._lock:
+			if self._file is not None:
+				self._file.close()
+				self._file = None
+
+	def reset(self) -> None:
+		"""Forget all progress (start the next run from scratch)."""
+		self.close()
+		self._done.clear()
+		self._remove_file()
+
+	def complete(self) -> None:
+		"""Mark the run finished: the journal file is removed."""
+		self.reset()
+
+	def _remove_file(self) -> None:
+		try:
+			os.remove(self.path)
+		except FileNotFoundError:
+			pass
+
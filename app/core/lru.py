@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, Optional, TypeVar
+
+V = TypeVar("V")
+
+
+class ByteBudgetLRU(Generic[V]):
+	"""Least-recently-used cache bounded by the total byte size of its values.
+
+	size_of reports each value's cost; entries are evicted oldest first until the
+	total fits max_bytes. A single value larger than the budget is not stored."""
+
+	def __init__(self, max_bytes: int, size_of: Callable[[V], int]) -> None:
+		self.max_bytes = max_bytes
+		self._size_of = size_of
+		self._items: OrderedDict[Hashable, tuple[V, int]] = OrderedDict()
+		self._bytes = 0
+		self._lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def get(self, key: Hashable) -> Optional[V]:
+		with self._lock:
+			entry = self._items.get(key)
+			if entry is None:
+				self.misses += 1
+				return None
+			self._items.move_to_end(key)
+			self.hits += 1
+			return entry[0]
+
+	def put(self, key: Hashable, value: V) -> None:
+		size = max(0, int(self._size_of(value)))
+		with self._lock:
+			old = self._items.pop(key, None)
+			if old is not None:
+				self._bytes -= old[1]
+			if size > self.max_bytes:
+				return
+			self._items[key] = (value, size)
+			self._bytes += size
+			while self._bytes > self.max_bytes and self._items:
+				_, (_, evicted) = self._items.popitem(last=False)
+				self._bytes -= evicted
+				self.evictions += 1
+
+	def discard(self, key: Hashable) -> None:
+		with self._lock:
+			old = self._items.pop(key, None)
+			if old is not None:
+				self._bytes -= old[1]
+
+	def clear(self) -> None:
+		with self._lock:
+			self._items.clear()
+			self._bytes = 0
+
+	def __len__(self) -> int:
+		return len(self._items)
+
+	def stats(self) -> dict[str, int]:
+		with self._lock:
+			return {
+				"hits": self.hits,
+				"misses": self.misses,
+				"evictions": self.evictions,
+				"entries": len(self._items),
+				"bytes": self._bytes,
+				"max_bytes": self.max_bytes,
+			}
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import asdict
+from typing import Optional
+
+from .models import ExportOptions, WatermarkConfig, config_fingerprint
+from .templates import _write_text_atomic
+
+# ExportOptions fields that only pick the output path, which is the manifest key already
+_PATH_ONLY_OPTIONS = ("output_dir", "name_rule", "name_affix")
+
+
+def options_fingerprint(opts: ExportOptions) -> str:
+	"""Digest of the ExportOptions that affect output pixels or encoding."""
+	data = {k: v for k, v in asdict(opts).items() if k not in _PATH_ONLY_OPTIONS}
+	data["format"] = opts.format.upper()
+	if data["format"] != "JPEG":
+		del data["jpeg_quality"]
+	return hashlib.sha1(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _file_signature(path: str) -> Optional[tuple[int, int]]:
+	try:
+		st = os.stat(path)
+	except OSError:
+		return None
+	return st.st_size, st.st_mtime_ns
+
+
+class ExportManifest:
+	"""Persistent record of what produced each output in a directory, for incremental re-export.
+
+	Each output file name maps to the source path, the source's (size, mtime_ns),
+	a config key (config fingerprint plus the logo file's signature, so replacing
+	the logo counts as a change) and the fingerprint of the ExportOptions. A job
+	whose key is unchanged and whose output still exists needs no rendering.
+	Saved atomically, throttled to once per save interval while a run is going."""
+	FILENAME = ".watermark_manifest.json"
+	VERSION = 1
+
+	def __init__(self, path: str, opts: ExportOptions, save_interval_s: float = 5.0) -> None:
+		self.path = path
+		self._opts_key = options_fingerprint(opts)
+		self._save_interval_s = save_interval_s
+		self._last_save = time.monotonic()
+		self._dirty = False
+		self._lock = threading.Lock()
+		self._entries: dict[str, list] = {}
+		# output path -> key computed by check(), recorded once that output is written
+		self._checked: dict[str, list] = {}
+		self._cfg_keys: dict[int, tuple[WatermarkConfig, str]] = {}
+		try:
+			with open(path, "r", encoding="utf-8") as f:
+				data = json.load(f)
+			if data.get("version") == self.VERSION:
+				self._entries = data.get("entries", {})
+		except (OSError, ValueError, AttributeError):
+			self._entries = {}
+
+	@classmethod
+	def for_output_dir(cls, output_dir: str, opts: ExportOptions) -> "ExportManifest":
+		return cls(os.path.join(output_dir, cls.FILENAME), opts)
+
+	def __len__(self) -> int:
+		return len(self._entries)
+
+	def _cfg_key(self, cfg: WatermarkConfig) -> str:
+		cached = self._cfg_keys.get(id(cfg))
+		if cached is None or cached[0] is not cfg:
+			key = config_fingerprint(cfg)
+			if cfg.layout.enabled_image and cfg.image.path:
+				sig = _file_signature(cfg.image.path)
+				key += f":{sig[0]}:{sig[1]}" if sig else ":missing"
+			cached = self._cfg_keys[id(cfg)] = (cfg, key)
+		return cached[1]
+
+	def has_entry(self, out_path: str) -> bool:
+		"""Whether out_path was written by an earlier export into this directory."""
+		return os.path.basename(out_path) in self._entries
+
+	def check(self, job) -> bool:
+		"""True when job (an ExportJob) is up to date: same source, config and options as its existing output.
+
+		Otherwise the job's current key is remembered and stored by record() once it is exported."""
+		sig = _file_signature(job.src_path)
+		if sig is None:
+			return False
+		key = [job.src_path, sig[0], sig[1], self._cfg_key(job.cfg), self._opts_key]
+		name = os.path.basename(job.out_path)
+		if self._entries.get(name) == key and os.path.exists(job.out_path):
+			return True
+		with self._lock:
+			self._checked[job.out_path] = key
+		return False
+
+	def record(self, job) -> None:
+		with self._lock:
+			key = self._checked.pop(job.out_path, None)
+			if key is None:
+				return
+			self._entries[os.path.basename(job.out_path)] = key
+			self._dirty = True
+
+	def save(self, force: bool = False) -> None:
+		with self._lock:
+			now = time.monotonic()
+			if not self._dirty or (not force and now - self._last_save < self._save_interval_s):
+				return
+			text = json.dumps({"version": self.VERSION, "entries": self._entries}, ensure_ascii=False, separators=(",", ":"))
+			_write_text_atomic(self.path, text)
+			self._dirty = False
+			self._last_save = now
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, field
+import hashlib
+import json
+from dataclasses import asdict, dataclass, field
 from typing import Optional, Tuple
 
 
@@ -64,4 +66,11 @@ class ExportOptions:
 	scale_height: float = 0.0  # used when scale_mode == 'both'
 	name_rule: str = "suffix"  # original, prefix, suffix
 	name_affix: str = "_watermarked"
+	engine: str = "qt"  # qt or pillow (Qt-free NumPy/Pillow compositing)
 
+
+def config_fingerprint(cfg: WatermarkConfig) -> str:
+	"""Stable digest of every field of cfg; equal settings give equal fingerprints."""
+	# Tuples and lists (as loaded from JSON templates) serialize identically
+	payload = json.dumps(asdict(cfg), sort_keys=True, ensure_ascii=False)
+	return hashlib.sha1(payload.encode("utf-8")).hexdigest()
@@ -0,0 +1,355 @@
+from __future__ import annotations
+
+import functools
+import io
+import math
+import os
+from typing import Optional
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from .geometry import (
+	export_dimensions, image_anchor, image_rotation, logo_dimensions,
+	text_anchor, text_pixel_size, text_rotation,
+)
+from .lru import ByteBudgetLRU
+from .models import ExportOptions, WatermarkConfig, config_fingerprint
+
+# A patch: premultiplied RGBA float32 in 0-1, with its top-left on the canvas
+Patch = tuple[np.ndarray, int, int]
+
+_FONT_DIRS = [
+	os.path.join(os.environ.get("WINDIR", r"C:\Windows"), "Fonts"),
+	"/usr/share/fonts",
+	"/usr/local/share/fonts",
+	os.path.expanduser("~/.fonts"),
+	os.path.expanduser("~/.local/share/fonts"),
+	"/Library/Fonts",
+	"/System/Library/Fonts",
+	os.path.expanduser("~/Library/Fonts"),
+]
+_FALLBACK_FAMILIES = ["Segoe UI", "DejaVu Sans", "Arial", "Helvetica", "Liberation Sans"]
+# Tried for text the chosen font has no glyphs for, as Qt falls back per glyph;
+# wqy-* are WenQuanYi, msyh is Microsoft YaHei (file names rather than family names)
+_CJK_FAMILIES = [
+	"Noto Sans CJK SC", "Noto Sans CJK", "Noto Sans SC", "Source Han Sans SC",
+	"wqy-microhei", "wqy-zenhei", "msyh", "PingFang", "Droid Sans Fallback Full", "simhei",
+]
+_font_index: Optional[dict[str, str]] = None
+
+
+def _norm(name: str) -> str:
+	return "".join(ch for ch in name.lower() if ch.isalnum())
+
+
+def _fonts_on_disk() -> dict[str, str]:
+	# Normalized file stem -> path, e.g. "dejavusansbold" -> .../DejaVuSans-Bold.ttf
+	global _font_index
+	if _font_index is None:
+		index: dict[str, str] = {}
+		for root_dir in _FONT_DIRS:
+			for root, _, files in os.walk(root_dir):
+				for f in files:
+					stem, ext = os.path.splitext(f)
+					if ext.lower() in (".ttf", ".otf", ".ttc"):
+						index.setdefault(_norm(stem), os.path.join(root, f))
+		_font_index = index
+	return _font_index
+
+
+@functools.lru_cache(maxsize=256)
+def find_font_file(family: str, bold: bool = False, italic: bool = False, text: str = "") -> Optional[str]:
+	"""Best font file for a family name, trying common style-suffix conventions (DejaVuSans-Bold, arialbd, segoeuiz).
+
+	When text is given and the font lacks glyphs for some of it (CJK text in a
+	Latin font), the first installed CJK font that covers it is used instead."""
+	path = _find_face(family, bold, italic, [family] + _FALLBACK_FAMILIES)
+	if path is None or not text or text.isascii() or _covers(path, text):
+		return path
+	for fam in _CJK_FAMILIES:
+		fallback = _find_face(fam, bold, italic, [fam])
+		if fallback is not None and _covers(fallback, text):
+			return fallback
+	return path
+
+
+def _find_face(family: str, bold: bool, italic: bool, families: list[str]) -> Optional[str]:
+	index = _fonts_on_disk()
+	if bold and italic:
+		suffixes = ["bolditalic", "boldoblique", "bi", "z"]
+	elif bold:
+		suffixes = ["bold", "bd", "b"]
+	elif italic:
+		suffixes = ["italic", "oblique", "i"]
+	else:
+		suffixes = []
+	# Fall back to the regular face when the styled one isn't installed
+	suffixes += ["", "regular", "book"]
+	for fam in families:
+		base = _norm(fam)
+		for suffix in suffixes:
+			path = index.get(base + suffix)
+			if path:
+				return path
+	return None
+
+
+def _covers(path: str, text: str) -> bool:
+	# A glyph is missing when it renders exactly like a code point no font maps (.notdef)
+	try:
+		font = ImageFont.truetype(path, 24)
+	except OSError:
+		return False
+
+	def glyph(ch: str) -> bytes:
+		img = Image.new("L", (48, 48))
+		ImageDraw.Draw(img).text((8, 8), ch, font=font, fill=255)
+		return img.tobytes()
+
+	notdef = glyph("\U0010fffd")
+	return all(glyph(ch) != notdef for ch in set(text) if not ch.isspace() and not ch.isascii())
+
+
+def _has_alpha(img: Image.Image) -> bool:
+	return img.mode in ("RGBA", "LA", "PA", "RGBa", "La") or (img.mode == "P" and "transparency" in img.info)
+
+
+def _blend(dst: np.ndarray, patch: np.ndarray, x: int, y: int) -> None:
+	# Source-over of a premultiplied patch onto an RGB or straight-alpha RGBA uint8 array, in place
+	h, w = dst.shape[:2]
+	ph, pw = patch.shape[:2]
+	x0, y0 = max(0, x), max(0, y)
+	x1, y1 = min(w, x + pw), min(h, y + ph)
+	if x0 >= x1 or y0 >= y1:
+		return
+	src = patch[y0 - y:y1 - y, x0 - x:x1 - x]
+	region = dst[y0:y1, x0:x1]
+	a = src[..., 3:4]
+	if dst.shape[2] == 3:
+		out = src[..., :3] * 255.0 + region.astype(np.float32) * (1.0 - a)
+		region[...] = np.clip(out + 0.5, 0, 255).astype(np.uint8)
+		return
+	da = region[..., 3:4].astype(np.float32) / 255.0
+	out_a = a + da * (1.0 - a)
+	out_rgb = src[..., :3] + region[..., :3].astype(np.float32) / 255.0 * da * (1.0 - a)
+	out_rgb = np.where(out_a > 0, out_rgb / np.maximum(out_a, 1e-6), 0.0)
+	region[..., :3] = np.clip(out_rgb * 255.0 + 0.5, 0, 255).astype(np.uint8)
+	region[..., 3:4] = np.clip(out_a * 255.0 + 0.5, 0, 255).astype(np.uint8)
+
+
+def _place(sprite: Image.Image, origin: tuple[float, float], anchor: tuple[float, float], angle_deg: float, canvas: tuple[int, int]) -> Optional[Patch]:
+	"""Rotate sprite (whose top-left sits at origin around the anchor) onto the canvas; None if it falls outside."""
+	cx, cy = anchor
+	ox, oy = origin
+	sw, sh = sprite.size
+	# Same convention as QTransform.rotate: positive angles turn clockwise on screen
+	rad = math.radians(angle_deg)
+	c, s = math.cos(rad), math.sin(rad)
+	xs, ys = [], []
+	for px, py in ((ox, oy), (ox + sw, oy), (ox, oy + sh), (ox + sw, oy + sh)):
+		xs.append(cx + c * px - s * py)
+		ys.append(cy + s * px + c * py)
+	# One pixel of slack for resampled edges, clipped to the canvas
+	x0 = max(0, math.floor(min(xs)) - 1)
+	y0 = max(0, math.floor(min(ys)) - 1)
+	x1 = min(canvas[0], math.ceil(max(xs)) + 1)
+	y1 = min(canvas[1], math.ceil(max(ys)) + 1)
+	if x0 >= x1 or y0 >= y1:
+		return None
+	# Inverse map from patch pixels to sprite pixels
+	data = (
+		c, s, c * (x0 - cx) + s * (y0 - cy) - ox,
+		-s, c, -s * (x0 - cx) + c * (y0 - cy) - oy,
+	)
+	# Resample premultiplied so transparent edges don't darken
+	placed = sprite.convert("RGBa").transform((x1 - x0, y1 - y0), Image.AFFINE, data, resample=Image.BILINEAR)
+	return np.asarray(placed, dtype=np.float32) / 255.0, x0, y0
+
+
+class PillowWatermarkEngine:
+	"""Qt-free counterpart of WatermarkEngine over Pillow images with NumPy alpha blending.
+
+	Follows the same WatermarkConfig semantics (positions, separate text/image
+	rotation, shadow, outline, logo scale_x/scale_y, opacity) and shares its
+	size arithmetic through app.core.geometry."""
+	# Byte budget for cached watermark patches
+	PATCH_CACHE_BYTES = 128 * 1024 * 1024
+
+	def __init__(self, overlay_cache: ByteBudgetLRU | None = None) -> None:
+		self._fonts: dict[tuple[Optional[str], int], ImageFont.ImageFont] = {}
+		# path -> (mtime_ns, RGBA logo)
+		self._logos: dict[str, tuple[int, Image.Image]] = {}
+		# Same sharing contract as WatermarkEngine's overlay cache
+		self._patches: ByteBudgetLRU[list[Patch]] = overlay_cache if overlay_cache is not None else self.new_overlay_cache()
+
+	@classmethod
+	def new_overlay_cache(cls) -> ByteBudgetLRU:
+		return ByteBudgetLRU(cls.PATCH_CACHE_BYTES, lambda patches: sum(p[0].nbytes for p in patches))
+
+	def render(self, base: Image.Image, cfg: WatermarkConfig, geometry_scale: float = 1.0) -> Image.Image:
+		"""Watermarked copy of base (RGB, or RGBA when base has alpha)."""
+		img = base.convert("RGBA" if _has_alpha(base) else "RGB")
+		if img is base:
+			img = img.copy()
+		return self.render_in_place(img, cfg, geometry_scale)
+
+	def render_in_place(self, img: Image.Image, cfg: WatermarkConfig, geometry_scale: float = 1.0) -> Image.Image:
+		"""Blend the watermarks into img's pixels; images not in RGB/RGBA are converted first."""
+		if img.mode not in ("RGB", "RGBA"):
+			img = img.convert("RGBA" if _has_alpha(img) else "RGB")
+		patches = self.render_patches(img.size, cfg, geometry_scale)
+		if not patches:
+			return img
+		arr = np.array(img)
+		for patch, x, y in patches:
+			_blend(arr, patch, x, y)
+		return Image.fromarray(arr, img.mode)
+
+	def render_patches(self, size: tuple[int, int], cfg: WatermarkConfig, geometry_scale: float = 1.0) -> list[Patch]:
+		"""Rotated, premultiplied watermark patches for a canvas of the given (w, h), in paint order; cached."""
+		logo_mtime = None
+		if cfg.layout.enabled_image and cfg.image.path:
+			self._logo_source(cfg.image.path)
+			logo_mtime = self._logos.get(cfg.image.path, (None,))[0]
+		key = (size[0], size[1], config_fingerprint(cfg), geometry_scale, logo_mtime)
+		cached = self._patches.get(key)
+		if cached is not None:
+			return cached
+		w, h = size
+		patches: list[Patch] = []
+
+		# image watermark at its own position
+		if cfg.layout.enabled_image and cfg.image.path:
+			logo = self._scaled_logo(cfg, w, h)
+			if logo is not None:
+				origin = (int(-logo.width / 2), int(-logo.height / 2))
+				patch = _place(logo, origin, image_anchor(cfg, w, h), image_rotation(cfg), size)
+				if patch is not None:
+					patches.append(patch)
+
+		# text watermark at its own position
+		if cfg.layout.enabled_text and (cfg.text.text or ""):
+			sprite, origin = self._text_sprite(cfg, geometry_scale)
+			patch = _place(sprite, origin, text_anchor(cfg, w, h), text_rotation(cfg), size)
+			if patch is not None:
+				patches.append(patch)
+
+		self._patches.put(key, patches)
+		return patches
+
+	def _font(self, cfg: WatermarkConfig, size_px: int) -> ImageFont.ImageFont:
+		path = find_font_file(cfg.text.family, bool(cfg.text.bold), bool(cfg.text.italic), cfg.text.text)
+		key = (path, size_px)
+		font = self._fonts.get(key)
+		if font is None:
+			font = ImageFont.truetype(path, size_px) if path else ImageFont.load_default(size_px)
+			self._fonts[key] = font
+		return font
+
+	def _text_sprite(self, cfg: WatermarkConfig, geometry_scale: float = 1.0) -> tuple[Image.Image, tuple[int, int]]:
+		t = cfg.text
+		font = self._font(cfg, text_pixel_size(cfg, geometry_scale))
+		# Baseline-left placement matching WatermarkEngine._text_path_centered, which centers
+		# on QFontMetrics.boundingRect: the ink width and the ascent + descent height
+		ascent, descent = font.getmetrics()
+		ink_left, _, ink_right, _ = font.getbbox(t.text, anchor="ls")
+		bx, by = -(ink_right - ink_left) / 2.0, (ascent + descent) / 2.5
+		shadow_dx = t.shadow_offset[0] * geometry_scale
+		shadow_dy = t.shadow_offset[1] * geometry_scale
+		# Qt strokes a 3px pen centered on the outline, i.e. 1.5px outside the glyphs
+		stroke = max(1, round(1.5 * geometry_scale)) if t.outline else 0
+
+		left, top, right, bottom = font.getbbox(t.text, anchor="ls", stroke_width=stroke)
+		left, top, right, bottom = left + bx, top + by, right + bx, bottom + by
+		if t.shadow:
+			left, top = min(left, left + shadow_dx), min(top, top + shadow_dy)
+			right, bottom = max(right, right + shadow_dx), max(bottom, bottom + shadow_dy)
+		ox, oy = math.floor(left) - 2, math.floor(top) - 2
+		size = (max(1, math.ceil(right) + 2 - ox), max(1, math.ceil(bottom) + 2 - oy))
+
+		sprite = Image.new("RGBA", size, (0, 0, 0, 0))
+		passes = []
+		if t.shadow:
+			passes.append(((bx - ox + shadow_dx, by - oy + shadow_dy), tuple(t.shadow_color), 0))
+		if t.outline:
+			passes.append(((bx - ox, by - oy), tuple(t.outline_color), stroke))
+		passes.append(((bx - ox, by - oy), tuple(t.color), 0))
+		for xy, color, stroke_width in passes:
+			# Each pass on its own layer so translucent colors blend like QPainter's passes
+			layer = Image.new("RGBA", size, (0, 0, 0, 0))
+			ImageDraw.Draw(layer).text(xy, t.text, font=font, fill=color, anchor="ls", stroke_width=stroke_width, stroke_fill=color)
+			sprite = Image.alpha_composite(sprite, layer)
+		return sprite, (ox, oy)
+
+	def _logo_source(self, path: str) -> Optional[Image.Image]:
+		# Original logo, reloaded when the file changes on disk
+		try:
+			mtime = os.stat(path).st_mtime_ns
+		except OSError:
+			return None
+		cached = self._logos.get(path)
+		if cached is not None and cached[0] == mtime:
+			return cached[1]
+		try:
+			with Image.open(path) as f:
+				logo = f.convert("RGBA")
+		except Exception:
+			self._logos.pop(path, None)
+			return None
+		self._logos[path] = (mtime, logo)
+		return logo
+
+	def _scaled_logo(self, cfg: WatermarkConfig, base_w: int, base_h: int) -> Optional[Image.Image]:
+		logo = self._logo_source(cfg.image.path or "")
+		if logo is None:
+			return None
+		w, h = logo_dimensions(cfg, base_w, base_h, logo.width, logo.height)
+		# Resample premultiplied, then bake the opacity into alpha
+		scaled = logo.convert("RGBa").resize((w, h), Image.BILINEAR).convert("RGBA")
+		opacity = max(0.0, min(1.0, float(cfg.image.opacity)))
+		if opacity < 1.0:
+			alpha = scaled.getchannel("A").point(lambda v: int(v * opacity + 0.5))
+			scaled.putalpha(alpha)
+		return scaled
+
+
+def load_image(source: str | bytes, opts: ExportOptions) -> Optional[Image.Image]:
+	"""Decode source (a path or encoded bytes) at export size; JPEGs are reduced in the DCT domain via draft() first."""
+	try:
+		img = Image.open(source if isinstance(source, str) else io.BytesIO(source))
+		target = export_dimensions(img.width, img.height, opts)
+		if target[0] <= 0 or target[1] <= 0:
+			# e.g. scale mode "both" without a height; like an empty QImage on the Qt side
+			return None
+		if target[0] < img.width and target[1] < img.height:
+			img.draft("RGB", target)
+		img.load()
+		img = img.convert("RGBA" if _has_alpha(img) else "RGB")
+		if img.size != target:
+			img = img.resize(target, Image.BILINEAR)
+	except Exception:
+		return None
+	return img
+
+
+def save_image(img: Image.Image, out, opts: ExportOptions) -> bool:
+	"""Encode img to out, a file path or a binary file object."""
+	try:
+		if opts.format.upper() == "JPEG":
+			if img.mode != "RGB":
+				# Flatten over black like the Qt engine's premultiplied images, rather than dropping alpha
+				img = Image.alpha_composite(Image.new("RGBA", img.size, (0, 0, 0, 255)), img.convert("RGBA")).convert("RGB")
+			img.save(out, "JPEG", quality=opts.jpeg_quality)
+		else:
+			img.save(out, "PNG")
+		return True
+	except Exception:
+		return False
+
+
+def encode_image(img: Image.Image, opts: ExportOptions) -> Optional[bytes]:
+	buffer = io.BytesIO()
+	if not save_image(img, buffer, opts):
+		return None
+	return buffer.getvalue()
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from PySide6.QtGui import QImageReader
+
+from .lru import ByteBudgetLRU
+
+# QImageIOHandler.Transformation value -> EXIF orientation (inverse of Qt's exif2Qt)
+_ORIENTATIONS = {0: 1, 1: 2, 3: 3, 2: 4, 6: 5, 4: 6, 5: 7, 7: 8}
+
+
+@dataclass(frozen=True)
+class ImageInfo:
+	path: str
+	format: str  # reader format, lower case: "jpeg", "png", "bmp", "tiff"
+	width: int  # stored pixel size, before any EXIF orientation
+	height: int
+	orientation: int = 1  # EXIF orientation 1-8; 1 when absent
+	has_icc: bool = False  # embedded ICC color profile
+	file_size: int = 0
+	mtime_ns: int = 0
+
+	@property
+	def pixels(self) -> int:
+		return self.width * self.height
+
+
+def _jpeg_has_icc(f) -> bool:
+	# Walk marker segments up to the start of scan; the profile lives in APP2 "ICC_PROFILE" segments
+	if f.read(2) != b"\xff\xd8":
+		return False
+	while True:
+		head = f.read(4)
+		if len(head) < 4 or head[0] != 0xFF:
+			return False
+		marker, length = head[1], int.from_bytes(head[2:4], "big")
+		if marker == 0xDA or length < 2:
+			return False
+		if marker == 0xE2 and length >= 14:
+			if f.read(12) == b"ICC_PROFILE\x00":
+				return True
+			f.seek(length - 14, os.SEEK_CUR)
+		else:
+			f.seek(length - 2, os.SEEK_CUR)
+
+
+def _png_has_icc(f) -> bool:
+	# Chunk headers only; iCCP must precede the first IDAT
+	if f.read(8) != b"\x89PNG\r\n\x1a\n":
+		return False
+	while True:
+		head = f.read(8)
+		if len(head) < 8:
+			return False
+		kind = head[4:8]
+		if kind == b"iCCP":
+			return True
+		if kind in (b"IDAT", b"IEND"):
+			return False
+		f.seek(int.from_bytes(head[:4], "big") + 4, os.SEEK_CUR)
+
+
+def _tiff_has_icc(path: str) -> bool:
+	try:
+		from PIL import Image
+		# Pillow parses the first IFD on open; pixel data is read lazily and never here
+		with Image.open(path) as im:
+			return bool(im.info.get("icc_profile"))
+	except Exception:
+		return False
+
+
+def _has_icc(path: str, fmt: str) -> bool:
+	if fmt == "tiff":
+		return _tiff_has_icc(path)
+	if fmt not in ("jpeg", "png"):
+		return False
+	try:
+		with open(path, "rb") as f:
+			return _jpeg_has_icc(f) if fmt == "jpeg" else _png_has_icc(f)
+	except OSError:
+		return False
+
+
+def probe_image(path: str) -> Optional[ImageInfo]:
+	"""Format, size, EXIF orientation and ICC presence of path from its headers, or None when unreadable.
+
+	Pixel data is never decoded: QImageReader only parses the header for size(),
+	format() and transformation(), and the ICC check skips between segment headers."""
+	try:
+		st = os.stat(path)
+	except OSError:
+		return None
+	reader = QImageReader(path)
+	size = reader.size()
+	if not size.isValid() or size.isEmpty():
+		return None
+	fmt = bytes(reader.format().data()).decode("ascii", "replace").lower()
+	orientation = _ORIENTATIONS.get(reader.transformation().value, 1)
+	return ImageInfo(path, fmt, size.width(), size.height(), orientation, _has_icc(path, fmt), st.st_size, st.st_mtime_ns)
+
+
+class ImageIndex:
+	"""Thread-safe cache of probe_image() results keyed by path.
+
+	An entry is reused while the file's size and mtime are unchanged, so a query
+	costs one stat; unreadable files are remembered too. get() never touches the
+	disk, for callers that only want what is already known. The least recently
+	used entries are dropped beyond max_bytes (at ENTRY_BYTES each)."""
+	# Measured size of one entry: key, signature tuple and ImageInfo with its strings
+	ENTRY_BYTES = 600
+	MAX_BYTES = 64 * 1024 * 1024
+
+	def __init__(self, max_bytes: int = MAX_BYTES) -> None:
+		# path -> ((size, mtime_ns), info or None)
+		self._entries: ByteBudgetLRU[tuple[tuple[int, int], Optional[ImageInfo]]] = ByteBudgetLRU(max_bytes, lambda _: self.ENTRY_BYTES)
+
+	def __len__(self) -> int:
+		return len(self._entries)
+
+	def probe(self, path: str) -> Optional[ImageInfo]:
+		try:
+			st = os.stat(path)
+		except OSError:
+			self.discard(path)
+			return None
+		sig = (st.st_size, st.st_mtime_ns)
+		entry = self._entries.get(path)
+		if entry is not None and entry[0] == sig:
+			return entry[1]
+		info = probe_image(path)
+		self._entries.put(path, (sig, info))
+		return info
+
+	def probe_many(self, paths: Iterable[str], workers: int = 4) -> dict[str, Optional[ImageInfo]]:
+		"""probe() every path, overlapping the file reads on a few threads."""
+		paths = list(paths)
+		if len(paths) < 2 * workers:
+			return {p: self.probe(p) for p in paths}
+		with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="probe") as pool:
+			return dict(zip(paths, pool.map(self.probe, paths)))
+
+	def get(self, path: str) -> Optional[ImageInfo]:
+		"""Cached info for path without any I/O; None when unknown or unreadable."""
+		entry = self._entries.get(path)
+		return entry[1] if entry is not None else None
+
+	def discard(self, path: str) -> None:
+		self._entries.discard(path)
+
+	def clear(self) -> None:
+		self._entries.clear()
+
+
+_index = ImageIndex()
+
+
+def image_index() -> ImageIndex:
+	"""The process-wide ImageIndex shared by the image list, preview and export planning."""
+	return _index
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import os
+import threading
+from typing import Iterator, Optional
+
+from .exporter import SUPPORTED_INPUT_EXTS
+
+
+def iter_image_files(root: str, cancel_event: Optional[threading.Event] = None) -> Iterator[str]:
+	"""Supported image files under root, depth first, sorted by name within each directory.
+
+	Built on os.scandir and filtered by extension on the entry name, so files are
+	never opened or stat'ed. Like os.walk, symlinked directories are not entered
+	and unreadable directories are skipped. Stops early once cancel_event is set."""
+	stack = [root]
+	while stack:
+		if cancel_event is not None and cancel_event.is_set():
+			return
+		directory = stack.pop()
+		files: list[str] = []
+		subdirs: list[str] = []
+		try:
+			with os.scandir(directory) as it:
+				for entry in it:
+					try:
+						if entry.is_dir(follow_symlinks=False):
+							subdirs.append(entry.path)
+							continue
+					except OSError:
+						continue
+					if os.path.splitext(entry.name)[1].lower() in SUPPORTED_INPUT_EXTS:
+						files.append(entry.path)
+		except OSError:
+			continue
+		files.sort()
+		yield from files
+		# Reversed so the stack pops subdirectories in name order
+		stack.extend(sorted(subdirs, reverse=True))
@@ -1,7 +1,12 @@
 from __future__ import annotations
 
+import atexit
 import json
+import math
 import os
+import tempfile
+import threading
+import time
 from dataclasses import asdict
 from typing import Optional, List, Dict
 
@@ -42,6 +47,83 @@ def load_template(path: str) -> Optional[WatermarkConfig]:
 		return None
 
 
+def resolve_template(spec: str) -> Optional[WatermarkConfig]:
+	"""Load a template by path, or by name from the templates directory."""
+	if not os.path.isfile(spec):
+		named = os.path.join(get_templates_dir(), spec if spec.lower().endswith(".json") else f"{spec}.json")
+		if os.path.isfile(named):
+			spec = named
+	return load_template(spec)
+
+
+# Allowed ranges for numeric config fields from untrusted input; pairs bound both components
+_NUMBER_LIMITS = {
+	("text", "size_px"): (1, 1000),
+	("text", "shadow_offset"): (-1000, 1000),
+	("image", "scale"): (0.01, 10.0),
+	("image", "scale_x"): (0.01, 100.0),
+	("image", "scale_y"): (0.01, 100.0),
+	("image", "opacity"): (0.0, 1.0),
+	("layout", "position"): (0.0, 1.0),
+	("layout", "text_position"): (0.0, 1.0),
+	("layout", "image_position"): (0.0, 1.0),
+	("layout", "rotation_deg"): (-360.0, 360.0),
+	("layout", "text_rotation_deg"): (-360.0, 360.0),
+	("layout", "image_rotation_deg"): (-360.0, 360.0),
+}
+_COLOR_FIELDS = {("text", "color"), ("text", "outline_color"), ("text", "shadow_color")}
+_MAX_STRING_LENGTH = 1000
+
+
+def _is_number(value) -> bool:
+	return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _check_field(section: str, name: str, value, default):
+	"""value for section.name, checked against the type of its default and _NUMBER_LIMITS; raises ValueError."""
+	field = f"{section}.{name}"
+	if (section, name) in _COLOR_FIELDS:
+		if not isinstance(value, (list, tuple)) or len(value) not in (3, 4) or not all(isinstance(c, int) and not isinstance(c, bool) and 0 <= c <= 255 for c in value):
+			raise ValueError(f"{field} must be 3 or 4 integers from 0 to 255")
+		return tuple(value) if len(value) == 4 else (*value, 255)
+	low, high = _NUMBER_LIMITS.get((section, name), (None, None))
+	if isinstance(default, bool):
+		if not isinstance(value, bool):
+			raise ValueError(f"{field} must be true or false")
+	elif isinstance(default, tuple):
+		if not isinstance(value, (list, tuple)) or len(value) != len(default) or not all(_is_number(v) and low <= v <= high for v in value):
+			raise ValueError(f"{field} must be {len(default)} numbers from {low} to {high}")
+		value = tuple(value)
+	elif isinstance(default, (int, float)):
+		if not _is_number(value) or (isinstance(default, int) and not isinstance(value, int)) or not low <= value <= high:
+			raise ValueError(f"{field} must be a number from {low} to {high}")
+	elif not (isinstance(value, str) or (default is None and value is None)):
+		raise ValueError(f"{field} must be a string")
+	elif value is not None and len(value) > _MAX_STRING_LENGTH:
+		raise ValueError(f"{field} is too long")
+	return value
+
+
+def parse_config(data: dict) -> WatermarkConfig:
+	"""Build a config from untrusted JSON (e.g. a network request).
+
+	Unknown sections or fields, values of the wrong type and numbers outside
+	their allowed range raise ValueError."""
+	if not isinstance(data, dict):
+		raise ValueError("config must be a JSON object")
+	defaults = WatermarkConfig()
+	checked: dict[str, dict] = {}
+	for section, values in data.items():
+		if section not in ("text", "image", "layout") or not isinstance(values, dict):
+			raise ValueError(f"unknown config section: {section}")
+		fields = asdict(getattr(defaults, section))
+		unknown = set(values) - set(fields)
+		if unknown:
+			raise ValueError(f"unknown {section} fields: {', '.join(sorted(unknown))}")
+		checked[section] = {name: _check_field(section, name, value, fields[name]) for name, value in values.items()}
+	return _from_dict(checked)
+
+
 def list_templates() -> list[str]:
 	dir_path = get_templates_dir()
 	return [os.path.join(dir_path, f) for f in os.listdir(dir_path) if f.lower().endswith(".json")]
@@ -68,9 +150,109 @@ def rename_template(path: str, new_name: str) -> Optional[str]:
 
 
 def save_last_settings(cfg: WatermarkConfig) -> None:
-	path = get_last_settings_path()
-	with open(path, "w", encoding="utf-8") as f:
-		json.dump(asdict(cfg), f, ensure_ascii=False, indent=2)
+	_last_settings_writer.write_now(asdict(cfg))
+
+
+def schedule_save_last_settings(cfg: WatermarkConfig) -> None:
+	"""Queue cfg for a debounced background write; returns without touching the disk."""
+	_last_settings_writer.submit(asdict(cfg))
+
+
+def flush_last_settings() -> None:
+	"""Write any queued last settings synchronously (call before exit)."""
+	_last_settings_writer.flush()
+
+
+def _write_text_atomic(path: str, text: str) -> None:
+	# A unique temp file beside path, so concurrent writers never share one
+	fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=os.path.dirname(path) or ".")
+	try:
+		with os.fdopen(fd, "w", encoding="utf-8") as f:
+			f.write(text)
+		os.replace(tmp_path, path)
+	except BaseException:
+		try:
+			os.remove(tmp_path)
+		except OSError:
+			pass
+		raise
+
+
+class _DebouncedJsonWriter:
+	"""Background writer that keeps only the newest payload and writes it once input settles."""
+
+	def __init__(self, path_getter, delay_s: float = 0.5) -> None:
+		self._path_getter = path_getter
+		self._delay_s = delay_s
+		self._cond = threading.Condition()
+		self._write_lock = threading.Lock()
+		self._pending: Optional[dict] = None
+		# Set while the writer thread writes a payload it already took from _pending
+		self._writing = False
+		self._due = 0.0
+		self._last_text: Optional[str] = None
+		self._thread: Optional[threading.Thread] = None
+
+	def submit(self, data: dict) -> None:
+		with self._cond:
+			self._pending = data
+			self._due = time.monotonic() + self._delay_s
+			if self._thread is None:
+				self._thread = threading.Thread(target=self._run, name="last-settings-writer", daemon=True)
+				self._thread.start()
+			self._cond.notify()
+
+	def flush(self) -> None:
+		"""Write the pending payload now, after any write already under way."""
+		with self._cond:
+			while self._writing:
+				self._cond.wait()
+			data = self._pending
+			self._pending = None
+		if data is not None:
+			self.write_now(data)
+
+	def write_now(self, data: dict) -> None:
+		text = json.dumps(data, ensure_ascii=False, indent=2)
+		with self._write_lock:
+			path = self._path_getter()
+			if self._last_text is None and os.path.exists(path):
+				try:
+					with open(path, "r", encoding="utf-8") as f:
+						self._last_text = f.read()
+				except Exception:
+					self._last_text = None
+			# Skip the write when nothing changed since the last save
+			if text == self._last_text:
+				return
+			_write_text_atomic(path, text)
+			self._last_text = text
+
+	def _run(self) -> None:
+		while True:
+			with self._cond:
+				while self._pending is None:
+					self._cond.wait()
+				remaining = self._due - time.monotonic()
+				if remaining > 0:
+					self._cond.wait(remaining)
+					continue
+				data = self._pending
+				self._pending = None
+				self._writing = True
+			try:
+				self.write_now(data)
+			except Exception:
+				# Last settings are a convenience; never let a failed write kill the writer
+				pass
+			finally:
+				with self._cond:
+					self._writing = False
+					self._cond.notify_all()
+
+
+_last_settings_writer = _DebouncedJsonWriter(get_last_settings_path)
+atexit.register(flush_last_settings)
 
 
 def load_last_settings() -> Optional[WatermarkConfig]:
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS thumbs (
+	path TEXT NOT NULL,
+	icon TEXT NOT NULL,
+	size INTEGER NOT NULL,
+	mtime_ns INTEGER NOT NULL,
+	data BLOB NOT NULL,
+	bytes INTEGER NOT NULL,
+	atime REAL NOT NULL,
+	PRIMARY KEY (path, icon)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS thumbs_atime ON thumbs (atime);
+"""
+
+
+def get_thumbnail_cache_path() -> str:
+	dir_path = os.path.join(os.path.expanduser("~"), ".watermark_studio")
+	os.makedirs(dir_path, exist_ok=True)
+	return os.path.join(dir_path, "thumbnails.sqlite")
+
+
+class ThumbnailCache:
+	"""Encoded thumbnails in one SQLite file, bounded by max_bytes with LRU eviction.
+
+	An entry belongs to (absolute source path, icon size) and is valid while the
+	source's size and mtime match, so editing a file invalidates it and replaces
+	it on the next put(). Each put() commits at once so other app instances are
+	never blocked; access-time updates from get() are buffered and written in
+	batches (and on flush), which keeps lookups cheap enough to run for every
+	list item. Safe to share between threads."""
+	TOUCH_BATCH = 256
+
+	def __init__(self, path: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+		self.path = path or get_thumbnail_cache_path()
+		self.max_bytes = max_bytes
+		self._lock = threading.Lock()
+		self._db: Optional[sqlite3.Connection] = None
+		# (atime, path, icon) of hits not yet written
+		self._touched: list[tuple[float, str, str]] = []
+		try:
+			self._db = self._open()
+		except sqlite3.DatabaseError:
+			# Corrupt or foreign file: start over
+			try:
+				os.remove(self.path)
+				self._db = self._open()
+			except (OSError, sqlite3.Error):
+				self._db = None
+		except sqlite3.Error:
+			self._db = None
+		self._bytes = self._stored_bytes() if self._db else 0
+
+	def _open(self) -> sqlite3.Connection:
+		db = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+		db.execute("PRAGMA journal_mode=WAL")
+		db.execute("PRAGMA synchronous=NORMAL")
+		db.executescript(_SCHEMA)
+		return db
+
+	def _stored_bytes(self) -> int:
+		return self._db.execute("SELECT COALESCE(SUM(length(data)), 0) FROM thumbs").fetchone()[0]
+
+	@staticmethod
+	def _key(path: str, icon: tuple[int, int]) -> tuple[str, str]:
+		return os.path.abspath(path), f"{icon[0]}x{icon[1]}"
+
+	def get(self, path: str, icon: tuple[int, int], size: int, mtime_ns: int) -> Optional[bytes]:
+		"""Cached thumbnail for path at icon size, or None when missing or stale."""
+		if self._db is None:
+			return None
+		key = self._key(path, icon)
+		with self._lock:
+			try:
+				row = self._db.execute("SELECT size, mtime_ns, data FROM thumbs WHERE path=? AND icon=?", key).fetchone()
+				if row is None or row[0] != size or row[1] != mtime_ns:
+					return None
+				self._touched.append((time.time(), *key))
+				if len(self._touched) >= self.TOUCH_BATCH:
+					self._write_touched()
+			except sqlite3.Error:
+				return None
+		return row[2]
+
+	def put(self, path: str, icon: tuple[int, int], size: int, mtime_ns: int, data: bytes) -> None:
+		if self._db is None or len(data) > self.max_bytes:
+			return
+		key = self._key(path, icon)
+		with self._lock:
+			try:
+				self._db.execute("BEGIN IMMEDIATE")
+				try:
+					old = self._db.execute("SELECT bytes FROM thumbs WHERE path=? AND icon=?", key).fetchone()
+					self._db.execute(
+						"INSERT OR REPLACE INTO thumbs (path, icon, size, mtime_ns, data, bytes, atime) VALUES (?, ?, ?, ?, ?, ?, ?)",
+						(*key, size, mtime_ns, sqlite3.Binary(data), len(data), time.time()),
+					)
+					self._bytes += len(data) - (old[0] if old else 0)
+					if self._bytes > self.max_bytes:
+						self._evict()
+					self._db.execute("COMMIT")
+				except sqlite3.Error:
+					self._db.execute("ROLLBACK")
+					raise
+			except sqlite3.Error:
+				pass
+
+	def _write_touched(self) -> None:
+		touched, self._touched = self._touched, []
+		self._db.execute("BEGIN IMMEDIATE")
+		try:
+			self._db.executemany("UPDATE thumbs SET atime=? WHERE path=? AND icon=?", touched)
+			self._db.execute("COMMIT")
+		except sqlite3.Error:
+			self._db.execute("ROLLBACK")
+			raise
+
+	def _evict(self) -> None:
+		# Drop least recently used entries down to 90% of the cap, so eviction runs rarely.
+		# The running total misses other instances' writes and rolled-back puts: recount first
+		self._bytes = self._stored_bytes()
+		target = self.max_bytes * 9 // 10
+		rows = self._db.execute("SELECT path, icon, length(data) FROM thumbs ORDER BY atime")
+		doomed = []
+		for path, icon, n in rows:
+			if self._bytes <= target:
+				break
+			doomed.append((path, icon))
+			self._bytes -= n
+		self._db.executemany("DELETE FROM thumbs WHERE path=? AND icon=?", doomed)
+
+	def total_bytes(self) -> int:
+		return self._bytes
+
+	def flush(self) -> None:
+		"""Write buffered access times."""
+		with self._lock:
+			if self._db is not None and self._touched:
+				try:
+					self._write_touched()
+				except sqlite3.Error:
+					pass
+
+	def close(self) -> None:
+		self.flush()
+		with self._lock:
+			if self._db is not None:
+				self._db.close()
+				self._db = None
@@ -0,0 +1,377 @@
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import json
+import os
+import queue
+import select
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional
+
+from .exporter import SUPPORTED_INPUT_EXTS, ExportJob, ExportResult, default_workers, engine_class, export_image, output_path_for
+from .manifest import options_fingerprint
+from .models import ExportOptions, WatermarkConfig, config_fingerprint
+from .templates import _write_text_atomic
+
+# (mtime_ns, size): a file whose signature stops changing is considered fully written
+Signature = tuple[int, int]
+
+
+def _signature(path: str) -> Optional[Signature]:
+	try:
+		st = os.stat(path)
+	except OSError:
+		return None
+	return st.st_mtime_ns, st.st_size
+
+
+def _is_candidate(path: str) -> bool:
+	name = os.path.basename(path)
+	return not name.startswith(".") and os.path.splitext(name)[1].lower() in SUPPORTED_INPUT_EXTS
+
+
+def _is_under(path: str, roots: Iterable[str]) -> bool:
+	return any(path == root or path.startswith(root + os.sep) for root in roots)
+
+
+def _walk_files(dirs: Iterable[str], recursive: bool, excluded: tuple[str, ...]) -> Iterator[str]:
+	stack = list(dirs)
+	while stack:
+		d = stack.pop()
+		try:
+			with os.scandir(d) as it:
+				for entry in it:
+					if entry.is_dir(follow_symlinks=False):
+						if recursive and not _is_under(entry.path, excluded):
+							stack.append(entry.path)
+					elif _is_candidate(entry.path):
+						yield entry.path
+		except OSError:
+			continue
+
+
+class WatchState:
+	"""Processed sources as {path: [mtime_ns, size, config fingerprint, options fingerprint]} in a small JSON file."""
+
+	def __init__(self, path: str, save_interval_s: float = 2.0) -> None:
+		self.path = path
+		self._save_interval_s = save_interval_s
+		self._last_save = 0.0
+		self._dirty = False
+		self._entries: dict[str, list] = {}
+		try:
+			with open(path, "r", encoding="utf-8") as f:
+				self._entries = json.load(f)
+		except (OSError, ValueError):
+			self._entries = {}
+
+	def is_done(self, src_path: str, sig: Signature, fingerprint: str, options: str) -> bool:
+		return self._entries.get(src_path) == [sig[0], sig[1], fingerprint, options]
+
+	def mark(self, src_path: str, sig: Signature, fingerprint: str, options: str) -> None:
+		self._entries[src_path] = [sig[0], sig[1], fingerprint, options]
+		self._dirty = True
+
+	def save(self, force: bool = False) -> None:
+		"""Write the state atomically, at most once per save interval unless forced."""
+		now = time.monotonic()
+		if not self._dirty or (not force and now - self._last_save < self._save_interval_s):
+			return
+		_write_text_atomic(self.path, json.dumps(self._entries, ensure_ascii=False, separators=(",", ":")))
+		self._dirty = False
+		self._last_save = now
+
+
+class PollingSource:
+	"""Change source that rescans the directories every interval_s (works on network shares)."""
+
+	def __init__(self, dirs: list[str], recursive: bool = True, excluded: tuple[str, ...] = (), interval_s: float = 2.0) -> None:
+		self._dirs = dirs
+		self._recursive = recursive
+		self._excluded = excluded
+		self._interval_s = interval_s
+		self._snapshot = self._scan()
+		self._next = time.monotonic() + interval_s
+
+	def _scan(self) -> dict[str, Signature]:
+		snapshot: dict[str, Signature] = {}
+		for path in _walk_files(self._dirs, self._recursive, self._excluded):
+			sig = _signature(path)
+			if sig is not None:
+				snapshot[path] = sig
+		return snapshot
+
+	def changes(self, timeout: float) -> list[str]:
+		"""Paths created or modified since the previous call; waits up to timeout."""
+		wait = self._next - time.monotonic()
+		if wait > timeout:
+			time.sleep(timeout)
+			return []
+		if wait > 0:
+			time.sleep(wait)
+		self._next = time.monotonic() + self._interval_s
+		old, self._snapshot = self._snapshot, self._scan()
+		return [path for path, sig in self._snapshot.items() if old.get(path) != sig]
+
+	def close(self) -> None:
+		pass
+
+
+class InotifySource:
+	"""Linux inotify change source; new subdirectories are watched as they appear."""
+	IN_MODIFY = 0x00000002
+	IN_CLOSE_WRITE = 0x00000008
+	IN_MOVED_TO = 0x00000080
+	IN_CREATE = 0x00000100
+	IN_Q_OVERFLOW = 0x00004000
+	IN_ISDIR = 0x40000000
+	IN_NONBLOCK = 0o4000
+	IN_CLOEXEC = 0o2000000
+	_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+	_EVENT = struct.Struct("iIII")
+
+	def __init__(self, dirs: list[str], recursive: bool = True, excluded: tuple[str, ...] = ()) -> None:
+		self._libc = self._load_libc()
+		if self._libc is None:
+			raise OSError("inotify is not available")
+		fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+		if fd < 0:
+			raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+		self._fd = fd
+		self._recursive = recursive
+		self._excluded = excluded
+		self._dirs = dirs
+		self._wds: dict[int, str] = {}
+		for d in dirs:
+			self._watch_tree(d)
+
+	@staticmethod
+	def _load_libc():
+		name = ctypes.util.find_library("c")
+		if not name:
+			return None
+		libc = ctypes.CDLL(name, use_errno=True)
+		if not hasattr(libc, "inotify_init1"):
+			return None
+		libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+		return libc
+
+	@classmethod
+	def available(cls) -> bool:
+		return cls._load_libc() is not None
+
+	def _watch(self, d: str) -> None:
+		wd = self._libc.inotify_add_watch(self._fd, os.fsencode(d), self._MASK)
+		if wd >= 0:
+			self._wds[wd] = d
+
+	def _watch_tree(self, root: str) -> list[str]:
+		# Watch root and, when recursive, its subdirectories; returns files already inside
+		self._watch(root)
+		files: list[str] = []
+		if not self._recursive:
+			return files
+		for dirpath, dirnames, filenames in os.walk(root):
+			dirnames[:] = [n for n in dirnames if not _is_under(os.path.join(dirpath, n), self._excluded)]
+			for n in dirnames:
+				self._watch(os.path.join(dirpath, n))
+			files.extend(os.path.join(dirpath, n) for n in filenames if _is_candidate(n))
+		return files
+
+	def changes(self, timeout: float) -> list[str]:
+		"""Paths created or modified since the previous call; waits up to timeout."""
+		ready, _, _ = select.select([self._fd], [], [], timeout)
+		if not ready:
+			return []
+		try:
+			data = os.read(self._fd, 256 * 1024)
+		except BlockingIOError:
+			return []
+		paths: list[str] = []
+		offset = 0
+		while offset + self._EVENT.size <= len(data):
+			wd, mask, _, length = self._EVENT.unpack_from(data, offset)
+			offset += self._EVENT.size
+			name = data[offset:offset + length].rstrip(b"\0")
+			offset += length
+			if mask & self.IN_Q_OVERFLOW:
+				# Events were dropped; fall back to a full listing
+				paths.extend(_walk_files(self._dirs, self._recursive, self._excluded))
+				continue
+			parent = self._wds.get(wd)
+			if parent is None or not name:
+				continue
+			path = os.path.join(parent, os.fsdecode(name))
+			if mask & self.IN_ISDIR:
+				if self._recursive and mask & (self.IN_CREATE | self.IN_MOVED_TO) and not _is_under(path, self._excluded):
+					# Files may land before the new directory's watch exists
+					paths.extend(self._watch_tree(path))
+			elif _is_candidate(path):
+				paths.append(path)
+		return paths
+
+	def close(self) -> None:
+		if self._fd >= 0:
+			os.close(self._fd)
+			self._fd = -1
+
+
+def make_source(dirs: list[str], recursive: bool = True, excluded: tuple[str, ...] = (), polling: bool = False, poll_interval_s: float = 2.0):
+	"""inotify where available, otherwise (or when polling is requested) a rescanning source."""
+	if not polling and InotifySource.available():
+		try:
+			return InotifySource(dirs, recursive, excluded)
+		except OSError:
+			pass
+	return PollingSource(dirs, recursive, excluded, poll_interval_s)
+
+
+class FolderWatcher:
+	"""Watermark new or changed images in watched directories as soon as they finish writing.
+
+	A file is exported once its (mtime, size) has been stable for settle_s. Exports
+	run on a pool of worker threads (one engine each); processed sources are
+	recorded in a state file so a restart only picks up files that are new,
+	changed, or were last exported with a different config or export options.
+
+	Outputs mirror each source's path relative to its watched directory (under a
+	folder named after that directory when several are watched), so same-named
+	files in different subfolders don't overwrite each other. A source whose
+	output path is still taken by another existing source is reported as failed."""
+
+	def __init__(
+		self,
+		dirs: Iterable[str],
+		cfg: WatermarkConfig,
+		opts: ExportOptions,
+		state_path: Optional[str] = None,
+		workers: Optional[int] = None,
+		settle_s: float = 1.0,
+		recursive: bool = True,
+		polling: bool = False,
+		poll_interval_s: float = 2.0,
+		on_result: Optional[Callable[[ExportResult, float], None]] = None,
+	) -> None:
+		self.dirs = [os.path.abspath(d) for d in dirs]
+		# Watched dir -> where its tree is mirrored; deepest first so nested watched dirs win
+		if len(self.dirs) == 1:
+			self._out_roots = [(self.dirs[0], opts.output_dir)]
+		else:
+			self._out_roots = sorted(((d, os.path.join(opts.output_dir, os.path.basename(d))) for d in self.dirs), key=lambda r: len(r[0]), reverse=True)
+		self.cfg = cfg
+		self.opts = opts
+		self._fingerprint = config_fingerprint(cfg)
+		self._options_fingerprint = options_fingerprint(opts)
+		self._settle_s = settle_s
+		self._recursive = recursive
+		self._polling = polling
+		self._poll_interval_s = poll_interval_s
+		self._on_result = on_result
+		# Never watch our own output when it sits inside an input directory
+		self._excluded = (os.path.abspath(opts.output_dir),)
+		if any(_is_under(d, self._excluded) for d in self.dirs):
+			raise ValueError("output directory must not contain a watched directory")
+		self.state = WatchState(state_path or os.path.join(opts.output_dir, ".watermark_watch.json"))
+		self._workers = workers or default_workers()
+		self._engine_cls = engine_class(opts)
+		self._overlays = self._engine_cls.new_overlay_cache()
+		self._local = threading.local()
+		# path -> (signature, monotonic time the signature was last seen changing, first seen)
+		self._pending: dict[str, tuple[Optional[Signature], float, float]] = {}
+		# path -> (signature being exported, first seen)
+		self._in_flight: dict[str, tuple[Signature, float]] = {}
+		# output path -> source it was exported from in this session
+		self._claimed: dict[str, str] = {}
+		self._done: queue.Queue = queue.Queue()
+
+	def run(self, stop: threading.Event) -> None:
+		"""Watch until stop is set; jobs already started are finished before returning."""
+		source = make_source(self.dirs, self._recursive, self._excluded, self._polling, self._poll_interval_s)
+		pool = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="watch")
+		try:
+			# Files dropped while the watcher was not running
+			for path in _walk_files(self.dirs, self._recursive, self._excluded):
+				sig = _signature(path)
+				if sig is not None and not self.state.is_done(path, sig, self._fingerprint, self._options_fingerprint):
+					self._note(path)
+			while not stop.is_set():
+				for path in source.changes(0.2 if self._pending else 1.0):
+					if not _is_under(path, self._excluded):
+						self._note(path)
+				self._drain_results()
+				self._submit_ready(pool)
+				self.state.save()
+		finally:
+			pool.shutdown(wait=True, cancel_futures=True)
+			self._drain_results()
+			self.state.save(force=True)
+			source.close()
+
+	def output_path(self, src_path: str) -> str:
+		"""Where src_path (inside a watched directory) is exported to."""
+		out = output_path_for(src_path, self.opts)
+		for root, out_root in self._out_roots:
+			if _is_under(src_path, (root,)):
+				rel_dir = os.path.relpath(os.path.dirname(src_path), root)
+				return os.path.normpath(os.path.join(out_root, rel_dir, os.path.basename(out)))
+		return out
+
+	def _note(self, path: str) -> None:
+		now = time.monotonic()
+		first_seen = self._pending[path][2] if path in self._pending else now
+		self._pending[path] = (_signature(path), now, first_seen)
+
+	def _submit_ready(self, pool: ThreadPoolExecutor) -> None:
+		now = time.monotonic()
+		for path, (sig, changed_at, first_seen) in list(self._pending.items()):
+			if path in self._in_flight:
+				continue
+			current = _signature(path)
+			if current is None:
+				# Deleted, or renamed away before it settled
+				del self._pending[path]
+				continue
+			if current != sig:
+				self._pending[path] = (current, now, first_seen)
+				continue
+			if now - changed_at < self._settle_s:
+				continue
+			del self._pending[path]
+			if self.state.is_done(path, sig, self._fingerprint, self._options_fingerprint):
+				continue
+			job = ExportJob(path, self.output_path(path), self.cfg)
+			owner = self._claimed.get(job.out_path)
+			if owner is not None and owner != path and os.path.exists(owner):
+				if self._on_result is not None:
+					self._on_result(ExportResult(job, False, f"输出文件名冲突：{job.out_path}（已由 {owner} 使用）"), now - first_seen)
+				continue
+			self._claimed[job.out_path] = path
+			self._in_flight[path] = (sig, first_seen)
+			pool.submit(self._export, job).add_done_callback(lambda fut: self._done.put(fut.result()))
+
+	def _export(self, job: ExportJob) -> ExportResult:
+		engine = getattr(self._local, "engine", None)
+		if engine is None:
+			engine = self._local.engine = self._engine_cls(overlay_cache=self._overlays)
+		try:
+			os.makedirs(os.path.dirname(job.out_path), exist_ok=True)
+			return export_image(engine, job, self.opts)
+		except Exception as e:
+			return ExportResult(job, False, str(e))
+
+	def _drain_results(self) -> None:
+		while True:
+			try:
+				res: ExportResult = self._done.get_nowait()
+			except queue.Empty:
+				return
+			sig, first_seen = self._in_flight.pop(res.job.src_path)
+			if res.ok:
+				# Recorded with the signature that was exported; a later rewrite is still pending
+				self.state.mark(res.job.src_path, sig, self._fingerprint, self._options_fingerprint)
+			if self._on_result is not None:
+				self._on_result(res, time.monotonic() - first_seen)
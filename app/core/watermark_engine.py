@@ -1,121 +1,301 @@
 from __future__ import annotations
 
-from PySide6.QtGui import QImage, QPainter, QColor, QFont, QPixmap, QTransform, QPainterPath, QPen
-from PySide6.QtCore import Qt, QPointF, QRectF
-from .models import WatermarkConfig
+import math
+import os
+from collections import OrderedDict
+
+from PySide6.QtGui import QImage, QPainter, QColor, QFont, QFontMetrics, QTransform, QPainterPath, QPen
+from PySide6.QtCore import Qt, QPoint, QPointF, QRect, QRectF, QSize, QSizeF
+from .geometry import image_anchor, image_rotation, logo_dimensions, text_anchor, text_pixel_size, text_rotation
+from .lru import ByteBudgetLRU
+from .models import WatermarkConfig, config_fingerprint
+
+# Formats render_in_place paints on directly, without a whole-image conversion
+_PAINTABLE_FORMATS = {
+	QImage.Format_RGB32,
+	QImage.Format_ARGB32,
+	QImage.Format_ARGB32_Premultiplied,
+	QImage.Format_RGB888,
+	QImage.Format_BGR888,
+	QImage.Format_RGBX8888,
+	QImage.Format_RGBA8888,
+	QImage.Format_RGBA8888_Premultiplied,
+}
 
 
 class WatermarkEngine:
-	def __init__(self) -> None:
-		self._logo_cache: dict[str, QPixmap] = {}
+	# Distinct text styles kept rasterized (typing in the text box creates one per keystroke)
+	TEXT_SPRITE_CACHE_SIZE = 64
+	# Byte budget for scaled, opacity-baked logos
+	LOGO_CACHE_BYTES = 64 * 1024 * 1024
+	# Byte budget for watermark overlay layers (shared when passed in by the caller)
+	OVERLAY_CACHE_BYTES = 128 * 1024 * 1024
+
+	def __init__(self, overlay_cache: ByteBudgetLRU | None = None) -> None:
+		# path -> (mtime_ns, logo); QImage rather than QPixmap so engines can render on worker threads
+		self._logo_cache: dict[str, tuple[int, QImage]] = {}
+		self._scaled_logos: ByteBudgetLRU[QImage] = ByteBudgetLRU(self.LOGO_CACHE_BYTES, lambda img: img.sizeInBytes())
+		self._text_sprites: OrderedDict[tuple, tuple[QImage, QPointF]] = OrderedDict()
+		# Thread-safe, so export workers can share one to build each group's overlay once
+		self._overlays: ByteBudgetLRU[list[tuple[QImage, QPoint]]] = overlay_cache if overlay_cache is not None else self.new_overlay_cache()
+
+	@classmethod
+	def new_overlay_cache(cls) -> ByteBudgetLRU:
+		return ByteBudgetLRU(cls.OVERLAY_CACHE_BYTES, lambda patches: sum(layer.sizeInBytes() for layer, _ in patches))
 
-	def render(self, base: QImage, cfg: WatermarkConfig) -> QImage:
+	def render(self, base: QImage, cfg: WatermarkConfig, geometry_scale: float = 1.0) -> QImage:
+		# geometry_scale: ratio of `base` to the full-resolution image the config was authored for.
+		# Preview proxies pass < 1 so pixel-sized values (font size, shadow offset, outline) shrink with the proxy.
 		if base.isNull():
 			return base
-		canvas = QImage(base.size(), QImage.Format_ARGB32_Premultiplied)
-		canvas.fill(Qt.transparent)
+		return self.composite(base, self.render_overlay(base.size(), cfg, geometry_scale))
+
+	def render_in_place(self, img: QImage, cfg: WatermarkConfig, geometry_scale: float = 1.0) -> QImage:
+		"""Paint the watermarks straight onto img, which the caller gives up.
+
+		Only the dirty rects are blended (Qt converts just those spans to and from
+		img's format); every other pixel is left exactly as decoded. Images QPainter
+		can't paint on, or that would lose the watermark's color (indexed,
+		grayscale), are converted first. Returns the painted image, which is img
+		itself unless such a conversion was needed."""
+		if img.isNull():
+			return img
+		if img.format() not in _PAINTABLE_FORMATS:
+			img = img.convertToFormat(QImage.Format_ARGB32_Premultiplied if img.hasAlphaChannel() else QImage.Format_RGB32)
+		patches = self.render_overlay(img.size(), cfg, geometry_scale)
+		if patches:
+			p = QPainter(img)
+			try:
+				for layer, offset in patches:
+					p.drawImage(offset, layer)
+			finally:
+				p.end()
+		return img
+
+	def composite(self, base: QImage, patches: list[tuple[QImage, QPoint]]) -> QImage:
+		"""Blend overlay patches from render_overlay onto a premultiplied copy of base."""
+		canvas = base.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+		if patches:
+			p = QPainter(canvas)
+			try:
+				for layer, offset in patches:
+					p.drawImage(offset, layer)
+			finally:
+				p.end()
+		return canvas
+
+	def dirty_rects(self, size: QSize, cfg: WatermarkConfig, geometry_scale: float = 1.0) -> list[QRect]:
+		"""Canvas regions the watermarks touch on an image of the given size; all other pixels are untouched."""
+		return [QRect(offset, layer.size()) for layer, offset in self.render_overlay(size, cfg, geometry_scale)]
+
+	def render_overlay(self, size: QSize, cfg: WatermarkConfig, geometry_scale: float = 1.0) -> list[tuple[QImage, QPoint]]:
+		"""Pre-transformed watermark layer for a canvas of the given size.
+
+		The layer is split into patches, one per dirty rect: the rotated bounding box
+		of each enabled watermark, merged where they overlap and clipped to the
+		canvas. Each patch is returned with its top-left on the canvas. Patches are
+		cached per (size, config), so same-sized images sharing a config pay for the
+		translate/rotate/draw once and are composited with one blit per patch."""
+		logo_mtime = None
+		if cfg.layout.enabled_image and cfg.image.path:
+			# Refreshes the logo if it changed on disk, so stale layers are never reused
+			self._logo_source(cfg.image.path)
+			logo_mtime = self._logo_cache.get(cfg.image.path, (None,))[0]
+		key = (size.width(), size.height(), config_fingerprint(cfg), geometry_scale, logo_mtime)
+		cached = self._overlays.get(key)
+		if cached is not None:
+			return cached
+
+		canvas_rect = QRect(QPoint(0, 0), size)
+		# Each region: (rect, [(paint order, placement)])
+		regions: list[tuple[QRect, list[tuple[int, tuple[QTransform, QImage, QPointF]]]]] = []
+		for order, placement in enumerate(self._placements(size, cfg, geometry_scale)):
+			transform, img, origin = placement
+			# One pixel of slack for antialiased edges
+			rect = transform.mapRect(QRectF(origin, QSizeF(img.size()))).toAlignedRect().adjusted(-1, -1, 1, 1)
+			rect = rect.intersected(canvas_rect)
+			if rect.isEmpty():
+				continue
+			members = [(order, placement)]
+			# Merge with every region it overlaps, repeating as the merged rect grows
+			merged = True
+			while merged:
+				merged = False
+				for i, (other, other_members) in enumerate(regions):
+					if other.intersects(rect):
+						rect = rect.united(other)
+						members = other_members + members
+						del regions[i]
+						merged = True
+						break
+			regions.append((rect, members))
 
-		p = QPainter(canvas)
-		p.setRenderHints(QPainter.Antialiasing | QPainter.TextAntialiasing | QPainter.SmoothPixmapTransform, True)
+		patches: list[tuple[QImage, QPoint]] = []
+		for rect, members in regions:
+			layer = QImage(rect.size(), QImage.Format_ARGB32_Premultiplied)
+			layer.fill(Qt.transparent)
+			p = QPainter(layer)
+			try:
+				p.setRenderHints(QPainter.Antialiasing | QPainter.TextAntialiasing | QPainter.SmoothPixmapTransform, True)
+				to_layer = QTransform.fromTranslate(-rect.x(), -rect.y())
+				for _, (transform, img, origin) in sorted(members, key=lambda m: m[0]):
+					p.setTransform(transform * to_layer)
+					p.drawImage(origin, img)
+			finally:
+				p.end()
+			patches.append((layer, rect.topLeft()))
+		self._overlays.put(key, patches)
+		return patches
 
-		p.drawImage(0, 0, base)
+	def _placements(self, size: QSize, cfg: WatermarkConfig, geometry_scale: float) -> list[tuple[QTransform, QImage, QPointF]]:
+		# (canvas transform, rasterized watermark, its top-left around the anchor), in paint order
+		placements: list[tuple[QTransform, QImage, QPointF]] = []
 
 		# image watermark at its own position
 		if cfg.layout.enabled_image and cfg.image.path:
-			ix = base.width() * (cfg.layout.image_position[0] if cfg.layout.image_position else cfg.layout.position[0])
-			iy = base.height() * (cfg.layout.image_position[1] if cfg.layout.image_position else cfg.layout.position[1])
-			p.save()
-			p.translate(QPointF(ix, iy))
-			# Prefer specific image rotation; fallback to legacy unified rotation
-			p.rotate(getattr(cfg.layout, "image_rotation_deg", 0.0) or getattr(cfg.layout, "rotation_deg", 0.0))
-			self._draw_image_watermark(p, base, cfg)
-			p.restore()
+			logo = self._scaled_logo(cfg, size)
+			if not logo.isNull():
+				t = QTransform()
+				t.translate(*image_anchor(cfg, size.width(), size.height()))
+				t.rotate(image_rotation(cfg))
+				placements.append((t, logo, QPointF(int(-logo.width() / 2), int(-logo.height() / 2))))
 
 		# text watermark at its own position
 		if cfg.layout.enabled_text and (cfg.text.text or ""):
-			tx = base.width() * (cfg.layout.text_position[0] if cfg.layout.text_position else cfg.layout.position[0])
-			ty = base.height() * (cfg.layout.text_position[1] if cfg.layout.text_position else cfg.layout.position[1])
-			p.save()
-			p.translate(QPointF(tx, ty))
-			# Prefer specific text rotation; fallback to legacy unified rotation
-			p.rotate(getattr(cfg.layout, "text_rotation_deg", 0.0) or getattr(cfg.layout, "rotation_deg", 0.0))
-			self._draw_text_watermark(p, base, cfg)
-			p.restore()
-
-		p.end()
-		return canvas
+			t = QTransform()
+			t.translate(*text_anchor(cfg, size.width(), size.height()))
+			t.rotate(text_rotation(cfg))
+			sprite, origin = self._text_sprite(cfg, geometry_scale)
+			placements.append((t, sprite, origin))
+
+		return placements
 
-	def _text_path_centered(self, painter: QPainter, text: str) -> QPainterPath:
-		metrics = painter.fontMetrics()
+	def _text_path_centered(self, font: QFont, text: str) -> QPainterPath:
+		metrics = QFontMetrics(font)
 		rect = metrics.boundingRect(text)
 		path = QPainterPath()
-		path.addText(-rect.width() / 2.0, rect.height() / 2.5, painter.font(), text)
+		path.addText(-rect.width() / 2.0, rect.height() / 2.5, font, text)
 		return path
 
-	def _draw_text_watermark(self, p: QPainter, base: QImage, cfg: WatermarkConfig) -> None:
-		font = QFont(cfg.text.family)
+	def _text_sprite(self, cfg: WatermarkConfig, geometry_scale: float = 1.0) -> tuple[QImage, QPointF]:
+		"""Styled text rasterized once per style; returns the sprite and its top-left relative to the text center."""
+		size_px = text_pixel_size(cfg, geometry_scale)
+		t = cfg.text
+		shadow_dx = t.shadow_offset[0] * geometry_scale
+		shadow_dy = t.shadow_offset[1] * geometry_scale
+		outline_w = 3 * geometry_scale
+		key = (
+			t.text, t.family, size_px, bool(t.bold), bool(t.italic), tuple(t.color),
+			bool(t.shadow), tuple(t.shadow_color) if t.shadow else None, (shadow_dx, shadow_dy) if t.shadow else None,
+			bool(t.outline), tuple(t.outline_color) if t.outline else None, outline_w if t.outline else None,
+		)
+		hit = self._text_sprites.get(key)
+		if hit is not None:
+			self._text_sprites.move_to_end(key)
+			return hit
+
+		font = QFont(t.family)
 		# Use pixel size to avoid DPI differences across images
+		font.setPixelSize(size_px)
+		font.setBold(t.bold)
+		font.setItalic(t.italic)
+		path = self._text_path_centered(font, t.text)
+
+		# Sprite bounds: glyphs, plus the shadow copy and half the outline pen on every side
+		bounds = path.boundingRect()
+		if t.shadow:
+			bounds = bounds.united(bounds.translated(shadow_dx, shadow_dy))
+		pad = outline_w / 2.0 + 2.0
+		bounds = bounds.adjusted(-pad, -pad, pad, pad)
+		# Snap the origin to whole pixels so an unrotated blit needs no resampling
+		left = math.floor(bounds.left())
+		top = math.floor(bounds.top())
+		w = max(1, math.ceil(bounds.right()) - left)
+		h = max(1, math.ceil(bounds.bottom()) - top)
+
+		sprite = QImage(w, h, QImage.Format_ARGB32_Premultiplied)
+		sprite.fill(Qt.transparent)
+		p = QPainter(sprite)
 		try:
-			font.setPixelSize(int(getattr(cfg.text, "size_px", 16)))
-		except Exception:
-			font.setPixelSize(16)
-		font.setBold(cfg.text.bold)
-		font.setItalic(cfg.text.italic)
-		p.setFont(font)
-
-		main_color = QColor(*cfg.text.color)
-		outline_color = QColor(*cfg.text.outline_color)
-		shadow_color = QColor(*cfg.text.shadow_color)
-
-		path = self._text_path_centered(p, cfg.text.text)
-
-		if cfg.text.shadow:
-			p.save()
-			p.translate(cfg.text.shadow_offset[0], cfg.text.shadow_offset[1])
+			p.setRenderHints(QPainter.Antialiasing | QPainter.TextAntialiasing, True)
+			p.translate(-left, -top)
+
+			if t.shadow:
+				p.save()
+				p.translate(shadow_dx, shadow_dy)
+				p.setPen(Qt.NoPen)
+				p.setBrush(QColor(*t.shadow_color))
+				p.drawPath(path)
+				p.restore()
+
+			if t.outline:
+				p.save()
+				pen = QPen(QColor(*t.outline_color))
+				pen.setWidthF(outline_w)
+				p.setPen(pen)
+				p.setBrush(Qt.NoBrush)
+				p.drawPath(path)
+				p.restore()
+
 			p.setPen(Qt.NoPen)
-			p.setBrush(shadow_color)
-			p.drawPath(path)
-			p.restore()
-
-		if cfg.text.outline:
-			p.save()
-			pen = QPen(outline_color)
-			pen.setWidth(3)
-			p.setPen(pen)
-			p.setBrush(Qt.NoBrush)
+			p.setBrush(QColor(*t.color))
 			p.drawPath(path)
-			p.restore()
+		finally:
+			p.end()
+
+		entry = (sprite, QPointF(left, top))
+		self._text_sprites[key] = entry
+		while len(self._text_sprites) > self.TEXT_SPRITE_CACHE_SIZE:
+			self._text_sprites.popitem(last=False)
+		return entry
 
-		p.save()
-		p.setPen(Qt.NoPen)
-		p.setBrush(main_color)
-		p.drawPath(path)
-		p.restore()
+	def _logo_source(self, path: str) -> QImage:
+		# Original logo, reloaded when the file changes on disk
+		try:
+			mtime = os.stat(path).st_mtime_ns
+		except OSError:
+			return QImage()
+		cached = self._logo_cache.get(path)
+		if cached is not None and cached[0] == mtime:
+			return cached[1]
+		img = QImage(path)
+		if img.isNull():
+			self._logo_cache.pop(path, None)
+			return img
+		self._logo_cache[path] = (mtime, img)
+		return img
+
+	def logo_size(self, cfg: WatermarkConfig, base_size: QSize) -> QSize:
+		"""Size the image watermark is drawn at on a base of base_size (invalid if the logo can't load)."""
+		pix = self._logo_source(cfg.image.path or "")
+		if pix.isNull():
+			return QSize()
+		w, h = logo_dimensions(cfg, base_size.width(), base_size.height(), pix.width(), pix.height())
+		return QSize(w, h)
 
-	def _draw_image_watermark(self, p: QPainter, base: QImage, cfg: WatermarkConfig) -> None:
+	def _scaled_logo(self, cfg: WatermarkConfig, base_size: QSize) -> QImage:
 		path = cfg.image.path or ""
-		pix = self._logo_cache.get(path)
-		if pix is None:
-			pm = QPixmap(path)
-			if pm.isNull():
-				return
-			self._logo_cache[path] = pm
-			pix = pm
-
-		shorter = min(base.width(), base.height())
-		# Base width from uniform scale
-		base_w = max(1, int(shorter * cfg.image.scale))
-		# Apply non-uniform multipliers
-		sx = max(0.01, float(getattr(cfg.image, "scale_x", 1.0)))
-		sy = max(0.01, float(getattr(cfg.image, "scale_y", 1.0)))
-		w = max(1, int(base_w * sx))
-		# Compute height preserving pixmap aspect then apply sy
-		scaled_w = pix.scaledToWidth(w, Qt.SmoothTransformation)
-		h = max(1, int(scaled_w.height() * sy))
-		scaled = pix.scaled(w, h, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
-
-		p.save()
-		p.setOpacity(cfg.image.opacity)
-		p.drawPixmap(int(-scaled.width() / 2), int(-scaled.height() / 2), scaled)
-		p.restore()
+		pix = self._logo_source(path)
+		if pix.isNull():
+			return pix
+		size = self.logo_size(cfg, base_size)
+		opacity = max(0.0, min(1.0, float(cfg.image.opacity)))
+		key = (path, self._logo_cache[path][0], size.width(), size.height(), round(opacity, 4))
+		scaled = self._scaled_logos.get(key)
+		if scaled is not None:
+			return scaled
+		resampled = pix.scaled(size, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+		# Bake opacity in so drawing the cached logo is a plain blit
+		scaled = QImage(size, QImage.Format_ARGB32_Premultiplied)
+		scaled.fill(Qt.transparent)
+		p = QPainter(scaled)
+		try:
+			p.setOpacity(opacity)
+			p.drawImage(0, 0, resampled)
+		finally:
+			p.end()
+		self._scaled_logos.put(key, scaled)
+		return scaled
 
+	def logo_cache_stats(self) -> dict[str, int]:
+		return self._scaled_logos.stats()
@@ -0,0 +1,358 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+import math
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from app.core.exporter import decode, default_workers, encode, engine_class
+from app.core.models import ExportOptions, WatermarkConfig
+from app.core.templates import get_templates_dir, list_templates, load_template, parse_config
+
+MAX_BODY_BYTES = 64 * 1024 * 1024
+
+
+class RenderError(Exception):
+	"""A request that cannot be served, with the HTTP status to answer with."""
+
+	def __init__(self, status: int, message: str) -> None:
+		super().__init__(message)
+		self.status = status
+
+
+class LatencyHistogram:
+	"""Thread-safe latency histogram with fixed millisecond buckets."""
+	BOUNDS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+	def __init__(self) -> None:
+		self._lock = threading.Lock()
+		self._counts = [0] * (len(self.BOUNDS_MS) + 1)
+		self._sum_ms = 0.0
+
+	def observe(self, seconds: float) -> None:
+		ms = seconds * 1000.0
+		index = next((i for i, bound in enumerate(self.BOUNDS_MS) if ms <= bound), len(self.BOUNDS_MS))
+		with self._lock:
+			self._counts[index] += 1
+			self._sum_ms += ms
+
+	def snapshot(self) -> dict:
+		"""Cumulative bucket counts keyed by upper bound, plus bucket-resolution percentiles."""
+		with self._lock:
+			counts = list(self._counts)
+			sum_ms = self._sum_ms
+		total = sum(counts)
+		labels = [str(b) for b in self.BOUNDS_MS] + ["+Inf"]
+		buckets: dict[str, int] = {}
+		running = 0
+		for label, n in zip(labels, counts):
+			running += n
+			buckets[label] = running
+
+		def percentile(q: float) -> Optional[float]:
+			if not total:
+				return None
+			rank = q * total
+			running = 0
+			for bound, n in zip(self.BOUNDS_MS + (float("inf"),), counts):
+				running += n
+				if running >= rank:
+					return bound
+			return float("inf")
+
+		return {
+			"count": total,
+			"mean_ms": sum_ms / total if total else None,
+			"p50_ms": percentile(0.5),
+			"p90_ms": percentile(0.9),
+			"p99_ms": percentile(0.99),
+			"buckets_ms": buckets,
+		}
+
+
+class RenderService:
+	"""Warm engine pool with admission control; renders encoded images independently of HTTP.
+
+	workers engines are created up front, sharing one overlay cache, and warmed
+	with every saved template so fonts and logos are loaded before the first
+	request. At most workers requests render at once and max_queue more may
+	wait up to queue_timeout_s for an engine; anything beyond is rejected with 503."""
+
+	def __init__(
+		self,
+		engine: str = "qt",
+		workers: Optional[int] = None,
+		max_queue: int = 16,
+		queue_timeout_s: float = 30.0,
+		warm_templates: bool = True,
+	) -> None:
+		self.engine = engine
+		self.workers = workers or default_workers()
+		self._queue_timeout_s = queue_timeout_s
+		self._admission = threading.BoundedSemaphore(self.workers + max_queue)
+		engine_cls = engine_class(ExportOptions(engine=engine))
+		overlays = engine_cls.new_overlay_cache()
+		warm = [cfg for cfg in (load_template(p) for p in list_templates()) if cfg is not None] if warm_templates else []
+		self._engines: queue.Queue = queue.Queue()
+		for _ in range(self.workers):
+			instance = engine_cls(overlay_cache=overlays)
+			for cfg in warm:
+				instance.render(self._blank(), cfg)
+			self._engines.put(instance)
+		# name -> (template file mtime, config)
+		self._templates: dict[str, tuple[float, WatermarkConfig]] = {}
+		self._templates_lock = threading.Lock()
+		self._stats_lock = threading.Lock()
+		self._counters = {"requests": 0, "ok": 0, "errors": 0, "rejected": 0, "in_flight": 0}
+		self.latency = LatencyHistogram()
+		self.queue_wait = LatencyHistogram()
+		self.started = time.time()
+
+	def _blank(self):
+		if self.engine == "pillow":
+			from PIL import Image
+			return Image.new("RGB", (64, 64))
+		from PySide6.QtGui import QImage
+		img = QImage(64, 64, QImage.Format_RGB32)
+		img.fill(0)
+		return img
+
+	def template(self, name: str) -> WatermarkConfig:
+		"""Saved template by name, cached until its file changes."""
+		if not name or os.path.basename(name) != name:
+			raise RenderError(400, f"invalid template name: {name}")
+		path = os.path.join(get_templates_dir(), f"{name}.json")
+		try:
+			mtime = os.path.getmtime(path)
+		except OSError:
+			raise RenderError(404, f"unknown template: {name}")
+		with self._templates_lock:
+			cached = self._templates.get(name)
+			if cached is not None and cached[0] == mtime:
+				return cached[1]
+		cfg = load_template(path)
+		if cfg is None:
+			raise RenderError(500, f"cannot load template: {name}")
+		with self._templates_lock:
+			self._templates[name] = (mtime, cfg)
+		return cfg
+
+	def _count(self, **deltas: int) -> None:
+		with self._stats_lock:
+			for key, delta in deltas.items():
+				self._counters[key] += delta
+
+	@contextmanager
+	def _engine(self) -> Iterator[object]:
+		if not self._admission.acquire(blocking=False):
+			self._count(rejected=1)
+			raise RenderError(503, "server busy")
+		try:
+			start = time.perf_counter()
+			try:
+				engine = self._engines.get(timeout=self._queue_timeout_s)
+			except queue.Empty:
+				self._count(rejected=1)
+				raise RenderError(503, "timed out waiting for a render slot")
+			self.queue_wait.observe(time.perf_counter() - start)
+			try:
+				yield engine
+			finally:
+				self._engines.put(engine)
+		finally:
+			self._admission.release()
+
+	def render(self, data: bytes, cfg: WatermarkConfig, opts: ExportOptions) -> bytes:
+		"""Watermark encoded image data and return it encoded as opts.format."""
+		opts.engine = self.engine
+		start = time.perf_counter()
+		self._count(requests=1, in_flight=1)
+		try:
+			with self._engine() as engine:
+				img = decode(data, opts)
+				if img is None:
+					raise RenderError(400, "无法读取图片")
+				out = encode(engine.render_in_place(img, cfg), opts)
+				if out is None:
+					raise RenderError(500, "编码失败")
+		except RenderError:
+			self._count(errors=1)
+			raise
+		except Exception as e:
+			self._count(errors=1)
+			raise RenderError(500, str(e))
+		finally:
+			self._count(in_flight=-1)
+		self._count(ok=1)
+		self.latency.observe(time.perf_counter() - start)
+		return out
+
+	def stats(self) -> dict:
+		with self._stats_lock:
+			counters = dict(self._counters)
+		return {
+			**counters,
+			"engine": self.engine,
+			"workers": self.workers,
+			"uptime_s": round(time.time() - self.started, 1),
+			"latency": self.latency.snapshot(),
+			"queue_wait": self.queue_wait.snapshot(),
+		}
+
+
+_OPTION_FIELDS = {"format": str, "jpeg_quality": int, "scale_mode": str, "scale_value": float, "scale_height": float}
+_SCALE_MODES = ("none", "width", "height", "both", "percent")
+# Same limits as the export dialog (1-1000 %); pixel sizes are capped so a request can't allocate huge canvases
+_MAX_PERCENT = 1000.0
+_MAX_EDGE_PX = 10000.0
+
+
+def _clamp(value: float, high: float) -> float:
+	if not math.isfinite(value):
+		raise RenderError(400, f"invalid scale value: {value}")
+	return min(high, max(1.0, value))
+
+
+def _options_from(values: dict) -> ExportOptions:
+	opts = ExportOptions()
+	for key, value in values.items():
+		key = "jpeg_quality" if key == "quality" else key
+		if key not in _OPTION_FIELDS:
+			continue
+		try:
+			setattr(opts, key, _OPTION_FIELDS[key](value))
+		except (TypeError, ValueError):
+			raise RenderError(400, f"invalid {key}: {value!r}")
+	opts.format = opts.format.upper()
+	if opts.format not in ("PNG", "JPEG"):
+		raise RenderError(400, f"unsupported format: {opts.format}")
+	if opts.scale_mode not in _SCALE_MODES:
+		raise RenderError(400, f"unsupported scale_mode: {opts.scale_mode}")
+	if opts.scale_mode != "none":
+		opts.scale_value = _clamp(opts.scale_value, _MAX_PERCENT if opts.scale_mode == "percent" else _MAX_EDGE_PX)
+	if opts.scale_mode == "both":
+		opts.scale_height = _clamp(opts.scale_height, _MAX_EDGE_PX)
+	opts.jpeg_quality = min(100, max(0, opts.jpeg_quality))
+	return opts
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+	"""POST /render, GET /stats, GET /health.
+
+	/render takes either the raw image as the body, with ?template=NAME or
+	?config=<WatermarkConfig JSON> and optional format/quality/scale_* query
+	parameters, or a JSON body {"image": base64, "template" | "config", "options": {...}}.
+	Inline configs may not set image.path (logos come from saved templates) and
+	scale values are clamped to the export dialog's limits. It answers with the
+	encoded image; errors are JSON {"error": message}."""
+	server_version = "WatermarkStudio"
+	protocol_version = "HTTP/1.1"
+
+	@property
+	def service(self) -> RenderService:
+		return self.server.service
+
+	def log_message(self, format: str, *args) -> None:
+		pass
+
+	def _send(self, status: int, body: bytes, content_type: str, headers: Optional[dict] = None) -> None:
+		self.send_response(status)
+		self.send_header("Content-Type", content_type)
+		self.send_header("Content-Length", str(len(body)))
+		for key, value in (headers or {}).items():
+			self.send_header(key, value)
+		self.end_headers()
+		self.wfile.write(body)
+
+	def _send_json(self, status: int, data: dict) -> None:
+		headers = None
+		if status >= 400:
+			# The request body may be unread; don't reuse the connection
+			self.close_connection = True
+			headers = {"Connection": "close"}
+		self._send(status, json.dumps(data, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8", headers)
+
+	def do_GET(self) -> None:
+		path = urlsplit(self.path).path
+		if path == "/stats":
+			self._send_json(200, self.service.stats())
+		elif path == "/health":
+			self._send_json(200, {"ok": True})
+		else:
+			self._send_json(404, {"error": "not found"})
+
+	def do_POST(self) -> None:
+		url = urlsplit(self.path)
+		if url.path != "/render":
+			self._send_json(404, {"error": "not found"})
+			return
+		start = time.perf_counter()
+		try:
+			data, cfg, opts = self._parse_render_request(url.query)
+			out = self.service.render(data, cfg, opts)
+		except RenderError as e:
+			self._send_json(e.status, {"error": str(e)})
+			return
+		content_type = "image/jpeg" if opts.format == "JPEG" else "image/png"
+		self._send(200, out, content_type, {"X-Render-Ms": f"{(time.perf_counter() - start) * 1000:.1f}"})
+
+	def _parse_render_request(self, query: str) -> tuple[bytes, WatermarkConfig, ExportOptions]:
+		try:
+			length = int(self.headers.get("Content-Length", ""))
+		except ValueError:
+			raise RenderError(411, "Content-Length required")
+		if length < 0:
+			# rfile.read(-1) would wait for the client to close the connection
+			raise RenderError(400, "invalid Content-Length")
+		if length > MAX_BODY_BYTES:
+			raise RenderError(413, "request body too large")
+		body = self.rfile.read(length)
+		params = {k: v[-1] for k, v in parse_qs(query).items()}
+		if self.headers.get("Content-Type", "").split(";")[0].strip() == "application/json":
+			try:
+				envelope = json.loads(body)
+				data = base64.b64decode(envelope["image"], validate=True)
+			except (ValueError, KeyError, TypeError, binascii.Error):
+				raise RenderError(400, "JSON body needs a base64 'image' field")
+			options = envelope.get("options") or {}
+			if not isinstance(options, dict):
+				raise RenderError(400, "'options' must be a JSON object")
+			params.update(options)
+			template, config = envelope.get("template"), envelope.get("config")
+		else:
+			data = body
+			template, config = params.get("template"), params.get("config")
+			if isinstance(config, str):
+				try:
+					config = json.loads(config)
+				except ValueError:
+					raise RenderError(400, "config is not valid JSON")
+		if config is not None:
+			try:
+				cfg = parse_config(config)
+			except ValueError as e:
+				raise RenderError(400, str(e))
+			if cfg.image.path is not None:
+				# Would let any client have the server open and decode arbitrary local files
+				raise RenderError(400, "image.path is not allowed in inline configs; use a template")
+		elif template:
+			cfg = self.service.template(str(template))
+		else:
+			raise RenderError(400, "template or config required")
+		return data, cfg, _options_from(params)
+
+
+def make_server(service: RenderService, port: int = 8765) -> ThreadingHTTPServer:
+	"""HTTP server for service bound to localhost; port 0 picks a free port."""
+	server = ThreadingHTTPServer(("127.0.0.1", port), RenderRequestHandler)
+	server.daemon_threads = True
+	server.service = service
+	return server
@@ -0,0 +1,34 @@
+from PySide6.QtCore import QObject, QTimer, Signal
+
+
+class ChangeScheduler(QObject):
+	"""Coalesces bursts of change notifications into at most one delivery per interval.
+
+	The latest scheduled value always wins, so the final state of a slider drag is
+	delivered once the burst settles."""
+	flushed = Signal(object)
+
+	def __init__(self, interval_ms: int = 16, parent=None) -> None:
+		super().__init__(parent)
+		self._pending = None
+		self._has_pending = False
+		self._timer = QTimer(self)
+		self._timer.setSingleShot(True)
+		self._timer.setInterval(interval_ms)
+		self._timer.timeout.connect(self.flush)
+
+	def schedule(self, value) -> None:
+		self._pending = value
+		self._has_pending = True
+		if not self._timer.isActive():
+			self._timer.start()
+
+	def flush(self) -> None:
+		# Deliver any pending value immediately (e.g. before switching the current image)
+		self._timer.stop()
+		if not self._has_pending:
+			return
+		value = self._pending
+		self._pending = None
+		self._has_pending = False
+		self.flushed.emit(value)
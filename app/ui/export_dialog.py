@@ -89,6 +89,19 @@ class ExportDialog(QDialog):
 		row_name.addWidget(self.cmb_rule); row_name.addWidget(self.edit_affix)
 		layout.addLayout(row_name)
 
+		# Render engine
+		row_engine = QHBoxLayout(); row_engine.addWidget(QLabel("渲染引擎"))
+		self.cmb_engine = QComboBox()
+		self.cmb_engine.addItem("Qt", "qt")
+		self.cmb_engine.addItem("Pillow", "pillow")
+		row_engine.addWidget(self.cmb_engine)
+		layout.addLayout(row_engine)
+
+		# Incremental export
+		self.chk_incremental = QCheckBox("跳过未变化的图片（源图、水印和导出设置均未改变）")
+		self.chk_incremental.setChecked(True)
+		layout.addWidget(self.chk_incremental)
+
 		# Warning about output directory
 		self.warn_label = QLabel("")
 		self.warn_label.setStyleSheet("color: #FF6B6B")
@@ -200,6 +213,9 @@ class ExportDialog(QDialog):
 						return
 		super().accept()
 
+	def incremental(self) -> bool:
+		return self.chk_incremental.isChecked()
+
 	def options(self) -> ExportOptions:
 		opts = ExportOptions()
 		opts.output_dir = self.edit_dir.text().strip()
@@ -226,5 +242,6 @@ class ExportDialog(QDialog):
 			opts.name_affix = self.edit_affix.text().strip() or "wm_"
 		else:
 			opts.name_affix = self.edit_affix.text().strip() or "_watermarked"
+		opts.engine = self.cmb_engine.currentData()
 		return opts
 
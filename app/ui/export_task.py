@@ -0,0 +1,57 @@
+import threading
+import time
+
+from PySide6.QtCore import QObject, Signal, Slot
+
+from app.core.exporter import ExportJob, run_export
+from app.core.journal import ExportJournal
+from app.core.manifest import ExportManifest
+from app.core.models import ExportOptions
+
+
+class ExportTask(QObject):
+	"""Runs an export batch off the GUI thread; move to a QThread and start run()."""
+	progress = Signal(int, int, str)  # done, total, source path
+	finished = Signal(dict)  # summary: saved, skipped, failed, cancelled, errors, elapsed_s
+
+	def __init__(self, jobs: list[ExportJob], opts: ExportOptions, workers: int | None = None, backend: str = "thread", journal: ExportJournal | None = None, manifest: ExportManifest | None = None, incremental: bool = True) -> None:
+		super().__init__()
+		self._jobs = jobs
+		self._opts = opts
+		self._workers = workers
+		self._backend = backend
+		self._journal = journal
+		self._manifest = manifest
+		self._incremental = incremental
+		self._cancel = threading.Event()
+
+	def cancel(self) -> None:
+		# Cooperative: images already being processed finish, the rest are skipped
+		self._cancel.set()
+
+	@Slot()
+	def run(self) -> None:
+		start = time.perf_counter()
+		total = len(self._jobs)
+		saved = skipped = failed = cancelled = 0
+		errors: list[tuple[str, str]] = []
+		results = run_export(self._jobs, self._opts, self._workers, self._cancel, self._backend, self._journal, self._manifest, self._incremental)
+		for done, res in enumerate(results, 1):
+			if res.skipped:
+				skipped += 1
+			elif res.ok:
+				saved += 1
+			elif res.cancelled:
+				cancelled += 1
+			else:
+				failed += 1
+				errors.append((res.job.src_path, res.error))
+			self.progress.emit(done, total, res.job.src_path)
+		self.finished.emit({
+			"saved": saved,
+			"skipped": skipped,
+			"failed": failed,
+			"cancelled": cancelled,
+			"errors": errors,
+			"elapsed_s": time.perf_counter() - start,
+		})
@@ -0,0 +1,73 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PySide6.QtCore import QObject, Signal, Slot
+
+from app.core.probe import image_index
+from app.core.scan import iter_image_files
+
+
+class FolderScanTask(QObject):
+	"""Scans folders for images off the GUI thread; move to a QThread and start run().
+
+	Headers are probed into the shared ImageIndex in chunks of PROBE_CHUNK files on
+	PROBE_WORKERS threads, overlapping the reads, and files that are not readable
+	images are left out. Paths arrive in batches (at most every BATCH_INTERVAL_S,
+	or BATCH_SIZE paths) so the list grows while the scan is still running."""
+	batchFound = Signal(list)  # image paths
+	finished = Signal(int, bool)  # total found, cancelled
+
+	BATCH_SIZE = 2000
+	BATCH_INTERVAL_S = 0.1
+	PROBE_CHUNK = 128
+	PROBE_WORKERS = 8
+
+	def __init__(self, folders: list[str]) -> None:
+		super().__init__()
+		self._folders = folders
+		self._cancel = threading.Event()
+
+	def cancel(self) -> None:
+		self._cancel.set()
+
+	@Slot()
+	def run(self) -> None:
+		# One pool for the whole scan: starting threads per chunk costs as much as the probes
+		with ThreadPoolExecutor(self.PROBE_WORKERS, thread_name_prefix="scan-probe") as pool:
+			self._scan(pool)
+
+	def _scan(self, pool: ThreadPoolExecutor) -> None:
+		probe = image_index().probe
+
+		def readable(paths: list[str]) -> list[str]:
+			return [path for path, info in zip(paths, pool.map(probe, paths)) if info is not None]
+
+		total = 0
+		batch: list[str] = []
+		unprobed: list[str] = []
+		# Slow folders still probe a partial chunk every interval; the emit clock only
+		# restarts on an emit, so the first image after a quiet stretch shows at once
+		probed = emitted = time.monotonic()
+		for folder in self._folders:
+			for path in iter_image_files(folder, self._cancel):
+				unprobed.append(path)
+				now = time.monotonic()
+				if len(unprobed) < self.PROBE_CHUNK and now - probed < self.BATCH_INTERVAL_S:
+					continue
+				batch += readable(unprobed)
+				unprobed = []
+				probed = now
+				if batch and (len(batch) >= self.BATCH_SIZE or now - emitted >= self.BATCH_INTERVAL_S):
+					total += len(batch)
+					self.batchFound.emit(batch)
+					batch = []
+					emitted = now
+				if self._cancel.is_set():
+					break
+		if unprobed and not self._cancel.is_set():
+			batch += readable(unprobed)
+		if batch and not self._cancel.is_set():
+			total += len(batch)
+			self.batchFound.emit(batch)
+		self.finished.emit(total, self._cancel.is_set())
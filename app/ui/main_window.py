@@ -1,5 +1,5 @@
-from PySide6.QtWidgets import QMainWindow, QWidget, QHBoxLayout, QSplitter, QFileDialog, QMessageBox, QMenuBar, QDialog, QApplication
-from PySide6.QtCore import Qt, QTimer
+from PySide6.QtWidgets import QMainWindow, QWidget, QHBoxLayout, QSplitter, QFileDialog, QMessageBox, QMenuBar, QDialog, QApplication, QProgressDialog
+from PySide6.QtCore import Qt, QTimer, QThread
 from PySide6.QtGui import QAction
 
 import os
@@ -9,10 +9,13 @@ from .widgets.image_list import ImageListWidget
 from .widgets.preview import PreviewWidget
 from .widgets.controls_panel import ControlsPanel
 from .export_dialog import ExportDialog
-from app.core.templates import load_last_settings, load_template, save_session_state, load_session_state
+from .change_scheduler import ChangeScheduler
+from .export_task import ExportTask
+from app.core.templates import load_last_settings, load_template, save_session_state, load_session_state, flush_last_settings
 from app.core.models import ExportOptions, WatermarkConfig
-from app.core.watermark_engine import WatermarkEngine
-from PySide6.QtGui import QImage
+from app.core.exporter import ExportJob, output_path_for, choose_backend
+from app.core.journal import ExportJournal
+from app.core.manifest import ExportManifest
 from app.ui.theme import LIGHT_QSS, DARK_QSS, BW_QSS
 
 
@@ -28,11 +31,19 @@ class MainWindow(QMainWindow):
 		self.controls = ControlsPanel(self)
 		# Fix controls panel width; allow collapse via splitter but not resizing width
 		self.controls.setFixedWidth(460)
-		self._engine = WatermarkEngine()
 
 		self._per_image_cfg: dict[str, WatermarkConfig] = {}
 		self._current_path: str | None = None
 		self._dark = False
+		self._export_thread: QThread | None = None
+		self._export_task: ExportTask | None = None
+		self._export_progress: QProgressDialog | None = None
+		self._export_opts: ExportOptions | None = None
+		# Slider drags emit dozens of changes per second; apply at most one per frame
+		self._controls_changes = ChangeScheduler(16, self)
+		self._controls_changes.flushed.connect(self._apply_controls_change)
+		self._preview_changes = ChangeScheduler(16, self)
+		self._preview_changes.flushed.connect(self._apply_preview_change)
 
 		splitter = QSplitter(Qt.Horizontal, self)
 		splitter.addWidget(self.image_list)
@@ -87,6 +98,8 @@ class MainWindow(QMainWindow):
 			app.setStyleSheet(BW_QSS)
 
 	def _on_image_selected(self, path: str) -> None:
+		# Commit pending edits to the image they were made on
+		self._flush_pending_changes()
 		self._current_path = path
 		self.preview.onImageSelected(path)
 		cfg = self._per_image_cfg.get(path)
@@ -117,12 +130,22 @@ class MainWindow(QMainWindow):
 			self.controls.setConfig(deepcopy(self._per_image_cfg[self._current_path]))
 			self.preview.updateConfig(self._per_image_cfg[self._current_path])
 
+	def _flush_pending_changes(self) -> None:
+		self._preview_changes.flush()
+		self._controls_changes.flush()
+
 	def _on_controls_changed(self, cfg: WatermarkConfig) -> None:
+		self._controls_changes.schedule(cfg)
+
+	def _apply_controls_change(self, cfg: WatermarkConfig) -> None:
 		if self._current_path:
 			self._per_image_cfg[self._current_path] = deepcopy(cfg)
 			self.preview.updateConfig(cfg)
 
 	def _on_preview_changed(self, cfg: WatermarkConfig) -> None:
+		self._preview_changes.schedule(cfg)
+
+	def _apply_preview_change(self, cfg: WatermarkConfig) -> None:
 		# Sync preview-side changes (drag/rotate) back into current per-image config and controls
 		if self._current_path:
 			self._per_image_cfg[self._current_path] = deepcopy(cfg)
@@ -149,6 +172,10 @@ class MainWindow(QMainWindow):
 		QMessageBox.information(self, "应用设置", f"已将当前设置应用到全部 {len(paths)} 张图片。")
 
 	def _export(self) -> None:
+		self._flush_pending_changes()
+		if self._export_thread is not None:
+			QMessageBox.information(self, "导出", "已有导出任务正在进行。")
+			return
 		paths = self.image_list.get_selected_paths()
 		if not paths:
 			QMessageBox.warning(self, "导出", "请先选择要导出的图片。")
@@ -165,28 +192,34 @@ class MainWindow(QMainWindow):
 
 		# 目录检查现在在ExportDialog中实现，这里不再需要
 
-		saved = 0
+		# 上次导出中断时，可跳过已完成的图片继续
+		journal = ExportJournal.for_output_dir(opts.output_dir, opts)
+		if len(journal):
+			res = QMessageBox.question(
+				self,
+				"继续导出",
+				f"检测到该目录有未完成的导出（已完成 {len(journal)} 张）。\n是否跳过已完成的图片继续导出？",
+				QMessageBox.Yes | QMessageBox.No,
+				QMessageBox.Yes
+			)
+			if res == QMessageBox.No:
+				journal.reset()
+		# 增量导出：源图、水印和导出设置都未变化的图片直接跳过；关闭时也会更新清单
+		incremental = dlg.incremental()
+		manifest = ExportManifest.for_output_dir(opts.output_dir, opts)
+
+		# 先在界面线程上确定输出路径并处理覆盖确认，再交给后台线程
+		jobs: list[ExportJob] = []
 		overwrite_all = False
 		skip_all = False
 		for src_path in paths:
-			img = QImage(src_path)
-			if img.isNull():
+			out_path = output_path_for(src_path, opts)
+			cfg = deepcopy(self._per_image_cfg.get(src_path) or self.controls._cfg)
+			job = ExportJob(src_path, out_path, cfg)
+			if journal.is_done(job) or (incremental and manifest.check(job)):
+				# 已完成或未变化，导出时会跳过，无需确认覆盖
+				jobs.append(job)
 				continue
-			img = self._apply_scale(img, opts)
-			cfg = self._per_image_cfg.get(src_path) or deepcopy(self.controls._cfg)
-			composited = self._engine.render(img, cfg)
-
-			name, ext = os.path.splitext(os.path.basename(src_path))
-			if opts.name_rule == "original":
-				out_name = name
-			elif opts.name_rule == "prefix":
-				out_name = f"{opts.name_affix}{name}"
-			else:
-				out_name = f"{name}{opts.name_affix}"
-			fmt = opts.format.upper()
-			out_ext = ".jpg" if fmt == "JPEG" else ".png"
-			out_path = os.path.join(opts.output_dir, out_name + out_ext)
-
 			if os.path.exists(out_path) and not overwrite_all and not skip_all:
 				res = QMessageBox.question(
 					self,
@@ -204,37 +237,88 @@ class MainWindow(QMainWindow):
 					continue
 				elif res == QMessageBox.YesToAll:
 					overwrite_all = True
+			elif os.path.exists(out_path) and skip_all:
+				continue
 			# QMessageBox.Yes -> overwrite this one
+			jobs.append(job)
 
-			if fmt == "JPEG":
-				composited = composited.convertToFormat(QImage.Format_RGB888)
-				composited.save(out_path, "JPEG", opts.jpeg_quality)
-			else:
-				composited.save(out_path, "PNG")
-			saved += 1
-
-		QMessageBox.information(self, "导出完成", f"成功导出 {saved} 张图片到:\n{opts.output_dir}")
-
-	def _apply_scale(self, img: QImage, opts: ExportOptions) -> QImage:
-		if opts.scale_mode == "none":
-			return img
-		w = img.width(); h = img.height()
-		if opts.scale_mode == "percent":
-			s = max(1, int(min(10000, opts.scale_value))) / 100.0
-			return img.scaled(int(w * s), int(h * s), Qt.KeepAspectRatio, Qt.SmoothTransformation)
-		elif opts.scale_mode == "width":
-			return img.scaled(int(opts.scale_value), int(h * (opts.scale_value / w)), Qt.KeepAspectRatio, Qt.SmoothTransformation)
-		elif opts.scale_mode == "height":
-			return img.scaled(int(w * (opts.scale_value / h)), int(opts.scale_value), Qt.KeepAspectRatio, Qt.SmoothTransformation)
-		elif opts.scale_mode == "both":
-			return img.scaled(int(opts.scale_value), int(opts.scale_height), Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
-		return img
+		if not jobs:
+			QMessageBox.information(self, "导出完成", f"成功导出 0 张图片到:\n{opts.output_dir}")
+			return
+		self._start_export(jobs, opts, journal, manifest, incremental)
+
+	def _start_export(self, jobs: list[ExportJob], opts: ExportOptions, journal: ExportJournal | None = None, manifest: ExportManifest | None = None, incremental: bool = True) -> None:
+		progress = QProgressDialog("正在导出图片…", "取消", 0, len(jobs), self)
+		progress.setWindowTitle("导出")
+		progress.setWindowModality(Qt.WindowModal)
+		progress.setMinimumDuration(0)
+		progress.setAutoClose(False)
+		progress.setAutoReset(False)
+
+		backend = choose_backend(len(jobs))
+		thread = QThread(self)
+		task = ExportTask(jobs, opts, backend=backend, journal=journal, manifest=manifest, incremental=incremental)
+		task.moveToThread(thread)
+		thread.started.connect(task.run)
+		# Bound methods of the window so the worker's signals are queued onto the GUI thread
+		task.progress.connect(self._on_export_progress)
+		task.finished.connect(self._on_export_finished)
+		task.finished.connect(thread.quit)
+		thread.finished.connect(task.deleteLater)
+		thread.finished.connect(thread.deleteLater)
+		progress.canceled.connect(self._cancel_export)
+		self._export_thread = thread
+		self._export_task = task
+		self._export_progress = progress
+		self._export_opts = opts
+		thread.start()
+
+	def _cancel_export(self) -> None:
+		# Called on the GUI thread; the task's run loop is busy, so set its flag directly
+		if self._export_task is not None:
+			self._export_task.cancel()
+
+	def _on_export_progress(self, done: int, total: int, src: str) -> None:
+		progress = self._export_progress
+		if progress is None:
+			return
+		# A window-modal QProgressDialog processes events in setValue, so keep a local reference
+		progress.setLabelText(f"正在导出 {done}/{total}：\n{os.path.basename(src)}")
+		progress.setValue(done)
+
+	def _on_export_finished(self, summary: dict) -> None:
+		opts = self._export_opts
+		if self._export_progress is not None:
+			self._export_progress.close()
+		self._export_thread = None
+		self._export_task = None
+		self._export_progress = None
+		self._export_opts = None
+		msg = f"成功导出 {summary['saved']} 张图片到:\n{opts.output_dir}"
+		if summary["skipped"]:
+			msg += f"\n跳过未变化或已完成的 {summary['skipped']} 张"
+		if summary["failed"]:
+			msg += f"\n失败 {summary['failed']} 张"
+			for src, err in summary["errors"][:5]:
+				msg += f"\n  {os.path.basename(src)}：{err}"
+		if summary["cancelled"]:
+			msg += f"\n已取消 {summary['cancelled']} 张"
+		msg += f"\n用时 {summary['elapsed_s']:.1f} 秒"
+		QMessageBox.information(self, "导出完成", msg)
 
 	def closeEvent(self, event) -> None:
 		"""程序关闭时保存会话状态"""
+		# 停止进行中的导出，等待正在处理的图片写完
+		if self._export_task is not None and self._export_thread is not None:
+			self._export_task.cancel()
+			self._export_thread.quit()
+			self._export_thread.wait()
 		# 保存图片列表和水印设置
+		self._flush_pending_changes()
 		image_paths = self.image_list.get_all_paths()
 		save_session_state(image_paths, self._per_image_cfg)
+		flush_last_settings()
+		self.image_list.shutdown()
 		super().closeEvent(event)
 
 	def _load_session_state(self) -> None:
@@ -246,14 +330,12 @@ class MainWindow(QMainWindow):
 		# 加载图片列表
 		image_paths = session_data.get("image_paths", [])
 		if image_paths:
-			for path in image_paths:
-				if os.path.exists(path):
-					self.image_list.add_image(path)
+			self.image_list.add_images(path for path in image_paths if os.path.exists(path))
 
 		# 加载每个图片的水印设置
 		per_image_configs = session_data.get("per_image_configs", {})
 		for path, config_data in per_image_configs.items():
-			if os.path.exists(path) and path in self.image_list.get_all_paths():
+			if self.image_list.contains(path):
 				try:
 					# 转换字典为 WatermarkConfig 对象
 					from app.core.templates import _from_dict
@@ -263,6 +345,5 @@ class MainWindow(QMainWindow):
 					continue
 
 		# 如果有图片，自动选择第一张
-		if self.image_list.get_all_paths():
-			first_path = self.image_list.get_all_paths()[0]
-			self.image_list.list.setCurrentRow(0)
+		if self.image_list.count():
+			self.image_list.set_current_row(0)
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from PySide6.QtCore import QBuffer, QByteArray, QIODevice, QObject, QSize, Qt, Signal
+from PySide6.QtGui import QImage, QImageReader
+
+from app.core.probe import image_index
+from app.core.thumbcache import ThumbnailCache
+
+# EXIF IFD1 tags locating the embedded JPEG thumbnail
+_THUMB_OFFSET = 0x0201
+_THUMB_LENGTH = 0x0202
+
+
+def _exif_thumbnail(path: str, stored: QSize, fitted: QSize) -> Optional[QImage]:
+	"""The JPEG's embedded EXIF thumbnail scaled to fitted, or None when absent or unsuitable."""
+	try:
+		from PIL import ExifTags, Image
+		with Image.open(path) as im:
+			if im.format != "JPEG":
+				return None
+			raw = im.info.get("exif") or b""
+			exif = im.getexif()
+			ifd1 = exif.get_ifd(ExifTags.IFD.IFD1)
+	except Exception:
+		return None
+	offset, length = ifd1.get(_THUMB_OFFSET), ifd1.get(_THUMB_LENGTH)
+	if not raw.startswith(b"Exif\x00\x00") or not offset or not length:
+		return None
+	# Offsets count from the TIFF header, right after the "Exif\0\0" marker
+	thumb = QImage.fromData(raw[6 + offset:6 + offset + length])
+	if thumb.isNull() or thumb.width() < fitted.width() or thumb.height() < fitted.height():
+		return None
+	# Many cameras letterbox thumbnails to a fixed aspect ratio; only use ones matching the photo
+	if abs(thumb.width() * stored.height() - thumb.height() * stored.width()) > 0.01 * thumb.height() * stored.width():
+		return None
+	return thumb.scaled(fitted, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+
+
+def load_thumbnail(path: str, size: QSize) -> QImage:
+	"""Image fitting size for a list icon, without a full-resolution decode when avoidable.
+
+	Uses the embedded EXIF thumbnail when it is large enough, otherwise decodes
+	straight to the icon size (DCT-domain downscaling for JPEG). Like the preview
+	and export, the stored orientation is kept (EXIF orientation is not applied).
+	Returns a null QImage when the file cannot be read."""
+	reader = QImageReader(path)
+	stored = reader.size()
+	if not stored.isValid():
+		return QImage()
+	fitted = stored.scaled(size, Qt.KeepAspectRatio)
+	if fitted.width() < stored.width() and fitted.height() < stored.height():
+		thumb = _exif_thumbnail(path, stored, fitted)
+		if thumb is not None:
+			return thumb
+		reader.setScaledSize(fitted)
+	return reader.read()
+
+
+def _encode_thumbnail(img: QImage) -> bytes:
+	data = QByteArray()
+	buf = QBuffer(data)
+	buf.open(QIODevice.WriteOnly)
+	if img.hasAlphaChannel():
+		img.save(buf, "PNG")
+	else:
+		img.save(buf, "JPG", 85)
+	buf.close()
+	return bytes(data)
+
+
+class ThumbnailLoader(QObject):
+	"""Produces list thumbnails on worker threads, newest request first.
+
+	request() queues a path, or moves it to the front when already queued. The
+	model asks only for rows being painted, so the latest requests are the rows
+	on screen now and are served ahead of rows scrolled past while the view was
+	moving; clear() drops those once scrolling settles. Each result is delivered
+	through thumbnailReady on the receiver's thread, with a null QImage when the
+	file could not be read.
+	With a ThumbnailCache, cached thumbnails are used while the source is
+	unchanged and new ones are stored in it."""
+	thumbnailReady = Signal(str, QImage)
+
+	def __init__(self, size: QSize, workers: Optional[int] = None, cache: Optional[ThumbnailCache] = None, parent: Optional[QObject] = None) -> None:
+		super().__init__(parent)
+		self._size = QSize(size)
+		self._cache = cache
+		self._cond = threading.Condition()
+		# Queued paths, most recently requested last
+		self._queue: OrderedDict[str, None] = OrderedDict()
+		# Paths a worker is loading right now; requesting them again is a no-op
+		self._loading: set[str] = set()
+		self._stopped = False
+		count = workers or max(1, min(4, os.cpu_count() or 1))
+		self._threads = [threading.Thread(target=self._run, name=f"thumbnail-{i}", daemon=True) for i in range(count)]
+		for t in self._threads:
+			t.start()
+
+	def request(self, path: str) -> None:
+		with self._cond:
+			if path in self._loading:
+				return
+			if path in self._queue:
+				self._queue.move_to_end(path)
+				return
+			self._queue[path] = None
+			self._cond.notify()
+
+	def clear(self) -> None:
+		with self._cond:
+			self._queue.clear()
+
+	def pending(self) -> int:
+		with self._cond:
+			return len(self._queue)
+
+	def shutdown(self) -> None:
+		with self._cond:
+			self._stopped = True
+			self._queue.clear()
+			self._cond.notify_all()
+		for t in self._threads:
+			t.join(timeout=2.0)
+		if self._cache is not None:
+			self._cache.flush()
+
+	def _next(self) -> Optional[str]:
+		with self._cond:
+			while True:
+				if self._stopped:
+					return None
+				if self._queue:
+					path = self._queue.popitem(last=True)[0]
+					self._loading.add(path)
+					return path
+				self._cond.wait()
+
+	def _load(self, path: str) -> QImage:
+		# Header probe first: unreadable files are rejected without a decode or cache lookup
+		if image_index().probe(path) is None:
+			return QImage()
+		if self._cache is None:
+			return load_thumbnail(path, self._size)
+		try:
+			st = os.stat(path)
+		except OSError:
+			return QImage()
+		icon = (self._size.width(), self._size.height())
+		data = self._cache.get(path, icon, st.st_size, st.st_mtime_ns)
+		if data is not None:
+			img = QImage.fromData(data)
+			if not img.isNull():
+				return img
+		img = load_thumbnail(path, self._size)
+		if not img.isNull():
+			self._cache.put(path, icon, st.st_size, st.st_mtime_ns, _encode_thumbnail(img))
+		return img
+
+	def _run(self) -> None:
+		while True:
+			path = self._next()
+			if path is None:
+				return
+			try:
+				img = self._load(path)
+			except Exception:
+				img = QImage()
+			with self._cond:
+				self._loading.discard(path)
+			if self._stopped:
+				return
+			try:
+				self.thumbnailReady.emit(path, img)
+			except RuntimeError:
+				# Deleted together with its parent widget
+				return
+			if self._cache is not None and not self.pending():
+				# Queue drained: persist buffered cache access times
+				self._cache.flush()
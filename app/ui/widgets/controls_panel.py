@@ -5,7 +5,7 @@ import os
 import math
 
 from app.core.models import WatermarkConfig
-from app.core.templates import save_template, list_templates, load_template, save_last_settings, delete_template, rename_template
+from app.core.templates import save_template, list_templates, load_template, schedule_save_last_settings, delete_template, rename_template
 from PySide6.QtGui import QFont, QColor
 from .auto_fit_button import AutoFitButton
 from shiboken6 import isValid
@@ -306,7 +306,7 @@ class ControlsPanel(QWidget):
 		# Do not emit here to avoid re-entrant updates during initialization
 
 	def _emit(self) -> None:
-		save_last_settings(self._cfg)
+		schedule_save_last_settings(self._cfg)
 		self.configChanged.emit(self._cfg)
 
 	# text controls
@@ -1,9 +1,113 @@
-from PySide6.QtWidgets import QWidget, QVBoxLayout, QListWidget, QListWidgetItem, QFileDialog
-from PySide6.QtGui import QImage, QPixmap, QDragEnterEvent, QDropEvent
-from PySide6.QtCore import Qt, Signal, QSize
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QListView, QFileDialog, QLabel, QPushButton
+from PySide6.QtGui import QImage, QPixmap, QPainter, QPalette, QDragEnterEvent, QDropEvent
+from PySide6.QtCore import Qt, Signal, QSize, QTimer, QThread, QAbstractListModel, QModelIndex
 import os
+from typing import Iterable
 
-SUPPORTED_INPUT_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff"}
+from app.core.exporter import SUPPORTED_INPUT_EXTS
+from app.core.lru import ByteBudgetLRU
+from app.core.thumbcache import ThumbnailCache
+from app.ui.folder_scan_task import FolderScanTask
+from app.ui.thumbnail_loader import ThumbnailLoader
+
+
+class ImageListModel(QAbstractListModel):
+	"""Image paths for the list view; thumbnails are loaded only for rows the view paints.
+
+	Paths live in a plain list with a path -> row dict, so there is no Qt object
+	per image and lookups by path are O(1). Icons are kept in a bounded LRU and
+	fetched again (normally from the disk cache) after eviction, so memory stays
+	flat however many images are loaded."""
+	PIXMAP_CACHE_BYTES = 48 * 1024 * 1024
+
+	def __init__(self, icon_size: QSize, placeholder: QPixmap, parent=None) -> None:
+		super().__init__(parent)
+		self._paths: list[str] = []
+		self._rows: dict[str, int] = {}
+		self._placeholder = placeholder
+		self._pixmaps: ByteBudgetLRU[QPixmap] = ByteBudgetLRU(self.PIXMAP_CACHE_BYTES, lambda pix: pix.width() * pix.height() * pix.depth() // 8)
+		# Paths whose thumbnail failed once (retried) and twice (left as a placeholder)
+		self._retried: set[str] = set()
+		self._failed: set[str] = set()
+		self._thumbnails = ThumbnailLoader(icon_size, cache=ThumbnailCache(), parent=self)
+		self._thumbnails.thumbnailReady.connect(self._on_thumbnail)
+
+	def rowCount(self, parent=QModelIndex()) -> int:
+		return 0 if parent.isValid() else len(self._paths)
+
+	def data(self, index, role=Qt.DisplayRole):
+		if not index.isValid() or index.row() >= len(self._paths):
+			return None
+		path = self._paths[index.row()]
+		if role == Qt.DisplayRole:
+			return os.path.basename(path)
+		if role == Qt.ToolTipRole and path in self._failed:
+			return f"{path}\n无法读取缩略图"
+		if role in (Qt.ToolTipRole, Qt.UserRole):
+			return path
+		if role == Qt.DecorationRole:
+			pix = self._pixmaps.get(path)
+			if pix is not None:
+				return pix
+			if path not in self._failed:
+				# Every repaint requests again, which moves on-screen rows to the front of the queue
+				self._thumbnails.request(path)
+			return self._placeholder
+		return None
+
+	def add_paths(self, paths: Iterable[str]) -> int:
+		"""Append supported, not yet listed paths; returns how many were added."""
+		new: list[str] = []
+		seen: set[str] = set()
+		for path in paths:
+			if path in self._rows or path in seen or os.path.splitext(path)[1].lower() not in SUPPORTED_INPUT_EXTS:
+				continue
+			seen.add(path)
+			new.append(path)
+		if new:
+			first = len(self._paths)
+			self.beginInsertRows(QModelIndex(), first, first + len(new) - 1)
+			self._paths.extend(new)
+			for row, path in enumerate(new, first):
+				self._rows[path] = row
+			self.endInsertRows()
+		return len(new)
+
+	def path(self, row: int) -> str:
+		return self._paths[row]
+
+	def paths(self) -> list[str]:
+		return list(self._paths)
+
+	def contains(self, path: str) -> bool:
+		return path in self._rows
+
+	def drop_pending(self) -> None:
+		"""Forget queued thumbnail requests, e.g. for rows scrolled out of view."""
+		self._thumbnails.clear()
+
+	def shutdown(self) -> None:
+		self._thumbnails.shutdown()
+
+	def _on_thumbnail(self, path: str, image: QImage) -> None:
+		row = self._rows.get(path)
+		if row is None:
+			return
+		index = self.index(row)
+		if image.isNull():
+			# May be transient (file still being copied, share hiccup): retry once, then
+			# keep the row with its placeholder rather than losing it from the list
+			if path not in self._retried:
+				self._retried.add(path)
+				self._thumbnails.request(path)
+			else:
+				self._retried.discard(path)
+				self._failed.add(path)
+				self.dataChanged.emit(index, index, [Qt.DecorationRole, Qt.ToolTipRole])
+			return
+		self._retried.discard(path)
+		self._pixmaps.put(path, QPixmap.fromImage(image))
+		self.dataChanged.emit(index, index, [Qt.DecorationRole])
 
 
 class ImageListWidget(QWidget):
@@ -12,70 +116,151 @@ class ImageListWidget(QWidget):
 	def __init__(self, parent=None) -> None:
 		super().__init__(parent)
 		self.setAcceptDrops(True)
-		self.list = QListWidget(self)
-		self.list.setViewMode(QListWidget.IconMode)
-		self.list.setMovement(QListWidget.Static)
+		icon_size = QSize(160, 120)
+		self.model = ImageListModel(icon_size, self._make_placeholder(icon_size), self)
+		self.list = QListView(self)
+		self.list.setModel(self.model)
+		self.list.setViewMode(QListView.IconMode)
+		self.list.setMovement(QListView.Static)
 		# Slightly smaller thumbnails and grid to reduce sidebar width
-		self.list.setIconSize(QSize(160, 120))
-		self.list.setResizeMode(QListWidget.Adjust)
+		self.list.setIconSize(icon_size)
+		self.list.setResizeMode(QListView.Adjust)
 		self.list.setGridSize(QSize(180, 168))
 		self.list.setWordWrap(True)
 		self.list.setSpacing(8)
-		self.list.itemSelectionChanged.connect(self._emit_selected)
+		self.list.setUniformItemSizes(True)
+		self.list.setLayoutMode(QListView.Batched)
+		self.list.selectionModel().selectionChanged.connect(self._emit_selected)
+
+		# Requests for rows scrolled past are dropped once scrolling settles; the repaint re-queues visible ones
+		self._scroll_timer = QTimer(self)
+		self._scroll_timer.setSingleShot(True)
+		self._scroll_timer.setInterval(60)
+		self._scroll_timer.timeout.connect(self._on_scroll_settled)
+		self.list.verticalScrollBar().valueChanged.connect(self._scroll_timer.start)
+
+		# Folder scans run in the background; this row shows their progress
+		self._scans: list[tuple[QThread, FolderScanTask]] = []
+		self._scan_found = 0
+		self._scan_added = 0
+		self.scan_bar = QWidget(self)
+		scan_layout = QHBoxLayout(self.scan_bar)
+		scan_layout.setContentsMargins(0, 0, 0, 0)
+		self.scan_label = QLabel(self.scan_bar)
+		self.btn_cancel_scan = QPushButton("取消", self.scan_bar)
+		self.btn_cancel_scan.clicked.connect(self.cancel_scans)
+		scan_layout.addWidget(self.scan_label, 1)
+		scan_layout.addWidget(self.btn_cancel_scan)
+		self.scan_bar.hide()
 
 		layout = QVBoxLayout(self)
 		layout.setContentsMargins(4, 4, 4, 4)
 		layout.addWidget(self.list)
+		layout.addWidget(self.scan_bar)
+
+	def _make_placeholder(self, size: QSize) -> QPixmap:
+		pix = QPixmap(size)
+		pix.fill(Qt.transparent)
+		p = QPainter(pix)
+		color = self.palette().color(QPalette.Mid)
+		color.setAlpha(80)
+		p.setPen(Qt.NoPen)
+		p.setBrush(color)
+		p.drawRoundedRect(0, 0, size.width(), size.height(), 6, 6)
+		p.end()
+		return pix
 
-	def _emit_selected(self) -> None:
-		items = self.list.selectedItems()
-		if items:
-			self.imageSelected.emit(items[0].data(Qt.UserRole))
+	def _emit_selected(self, selected, _deselected) -> None:
+		if not selected.isEmpty():
+			self.imageSelected.emit(self.model.path(selected[0].top()))
+
+	def _on_scroll_settled(self) -> None:
+		self.model.drop_pending()
+		self.list.viewport().update()
 
 	def add_image(self, path: str) -> None:
-		ext = os.path.splitext(path)[1].lower()
-		if ext not in SUPPORTED_INPUT_EXTS:
+		self.model.add_paths((path,))
+
+	def add_images(self, paths: Iterable[str]) -> int:
+		return self.model.add_paths(paths)
+
+	def count(self) -> int:
+		return self.model.rowCount()
+
+	def contains(self, path: str) -> bool:
+		return self.model.contains(path)
+
+	def set_current_row(self, row: int) -> None:
+		self.list.setCurrentIndex(self.model.index(row))
+
+	def add_folders(self, folders: list[str]) -> None:
+		"""Scan folders recursively in the background, adding images as they are found."""
+		if not folders:
 			return
-		image = QImage(path)
-		if image.isNull():
+		thread = QThread(self)
+		task = FolderScanTask(folders)
+		task.moveToThread(thread)
+		thread.started.connect(task.run)
+		# Bound methods of the widget so the task's signals are queued onto the GUI thread
+		task.batchFound.connect(self._on_scan_batch)
+		task.finished.connect(self._on_scan_finished)
+		task.finished.connect(thread.quit)
+		thread.finished.connect(task.deleteLater)
+		thread.finished.connect(thread.deleteLater)
+		self._scans.append((thread, task))
+		self._update_scan_bar()
+		thread.start()
+
+	def cancel_scans(self) -> None:
+		for _, task in self._scans:
+			task.cancel()
+
+	def _on_scan_batch(self, paths: list) -> None:
+		self._scan_found += len(paths)
+		self._scan_added += self.model.add_paths(paths)
+		self._update_scan_bar()
+
+	def _on_scan_finished(self, _total: int, _cancelled: bool) -> None:
+		task = self.sender()
+		self._scans = [(th, t) for th, t in self._scans if t is not task]
+		if not self._scans:
+			self._scan_found = self._scan_added = 0
+		self._update_scan_bar()
+
+	def _update_scan_bar(self) -> None:
+		if not self._scans:
+			self.scan_bar.hide()
 			return
-		thumb = QPixmap.fromImage(image.scaled(self.list.iconSize(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
-		item = QListWidgetItem()
-		item.setText(os.path.basename(path))
-		item.setToolTip(path)
-		item.setIcon(thumb)
-		item.setData(Qt.UserRole, path)
-		self.list.addItem(item)
+		text = f"正在扫描文件夹… 已找到 {self._scan_found} 张"
+		if self._scan_added != self._scan_found:
+			text += f"（新增 {self._scan_added} 张）"
+		self.scan_label.setText(text)
+		self.scan_bar.show()
+
+	def shutdown(self) -> None:
+		"""Stop folder scans and thumbnail workers and write pending cache entries; call before the app exits."""
+		scans, self._scans = self._scans, []
+		for thread, task in scans:
+			task.cancel()
+			thread.quit()
+			thread.wait()
+		self.model.shutdown()
 
 	def openFiles(self) -> None:
 		paths, _ = QFileDialog.getOpenFileNames(self, "选择图片", "", "Images (*.png *.jpg *.jpeg *.bmp *.tif *.tiff)")
-		for p in paths:
-			self.add_image(p)
+		self.add_images(paths)
 
 	def openFolder(self) -> None:
 		folder = QFileDialog.getExistingDirectory(self, "选择文件夹")
-		if not folder:
-			return
-		for root, _, files in os.walk(folder):
-			for f in files:
-				self.add_image(os.path.join(root, f))
+		if folder:
+			self.add_folders([folder])
 
 	def get_all_paths(self) -> list[str]:
-		paths: list[str] = []
-		for i in range(self.list.count()):
-			item = self.list.item(i)
-			p = item.data(Qt.UserRole)
-			if isinstance(p, str):
-				paths.append(p)
-		return paths
+		return self.model.paths()
 
 	def get_selected_paths(self) -> list[str]:
-		paths: list[str] = []
-		for item in self.list.selectedItems():
-			p = item.data(Qt.UserRole)
-			if isinstance(p, str):
-				paths.append(p)
-		return paths
+		rows = sorted(index.row() for index in self.list.selectionModel().selectedIndexes())
+		return [self.model.path(row) for row in rows]
 
 	def dragEnterEvent(self, event: QDragEnterEvent) -> None:
 		if event.mimeData().hasUrls():
@@ -84,11 +269,10 @@ class ImageListWidget(QWidget):
 			event.ignore()
 
 	def dropEvent(self, event: QDropEvent) -> None:
+		folders: list[str] = []
+		files: list[str] = []
 		for url in event.mimeData().urls():
 			path = url.toLocalFile()
-			if os.path.isdir(path):
-				for root, _, files in os.walk(path):
-					for f in files:
-						self.add_image(os.path.join(root, f))
-			else:
-				self.add_image(path)
+			(folders if os.path.isdir(path) else files).append(path)
+		self.add_images(files)
+		self.add_folders(folders)
@@ -1,8 +1,9 @@
 from PySide6.QtWidgets import QWidget, QApplication
-from PySide6.QtGui import QPainter, QImage, QMouseEvent, QWheelEvent, QColor, QPen
+from PySide6.QtGui import QPainter, QImage, QImageReader, QPixmap, QMouseEvent, QWheelEvent, QColor, QPen
 from PySide6.QtCore import Qt, QRect, QSize, QPoint, Signal
 
-from app.core.models import WatermarkConfig
+from app.core.models import WatermarkConfig, config_fingerprint
+from app.core.probe import image_index
 from app.core.watermark_engine import WatermarkEngine
 
 
@@ -11,6 +12,15 @@ class PreviewWidget(QWidget):
 	def __init__(self, parent=None) -> None:
 		super().__init__(parent)
 		self._image = QImage()
+		# Full-resolution size of the photo; _image itself may be decoded smaller (at most screen size)
+		self._source_size = QSize()
+		# Display-sized copy of _image; watermark is composited onto this instead of the full-resolution source
+		self._proxy = QImage()
+		# Last composited frame, reused while (image, config, widget size, dpr) stay the same
+		self._frame = QPixmap()
+		self._frame_key: tuple | None = None
+		self._frame_hits = 0
+		self._frame_misses = 0
 		self._engine = WatermarkEngine()
 		self._cfg = WatermarkConfig()
 		self._dragging = False
@@ -77,9 +87,22 @@ class PreviewWidget(QWidget):
 		return QSize(500, 360)
 
 	def onImageSelected(self, path: str) -> None:
-		img = QImage(path)
+		info = image_index().probe(path)
+		if info is None:
+			return
+		source = QSize(info.width, info.height)
+		reader = QImageReader(path)
+		# The preview never shows more pixels than the screen has; decode straight to that size
+		screen = self.screen()
+		if screen is not None:
+			fitted = source.scaled(screen.size() * screen.devicePixelRatio(), Qt.KeepAspectRatio)
+			if fitted.width() < source.width() and fitted.height() < source.height():
+				reader.setScaledSize(fitted)
+		img = reader.read()
 		if not img.isNull():
 			self._image = img
+			self._source_size = source
+			self._proxy = QImage()
 			self.update()
 
 	def updateConfig(self, cfg: WatermarkConfig) -> None:
@@ -92,13 +115,22 @@ class PreviewWidget(QWidget):
 		if self._image.isNull():
 			p.end()
 			return
-		src = self._engine.render(self._image, self._cfg)
 		target = self.rect()
-		scaled = src.scaled(target.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation)
-		x = target.center().x() - scaled.width() // 2
-		y = target.center().y() - scaled.height() // 2
-		self._display_rect = QRect(x, y, scaled.width(), scaled.height())
-		p.drawImage(self._display_rect, scaled)
+		disp = self._source_size.scaled(target.size(), Qt.KeepAspectRatio)
+		x = target.center().x() - disp.width() // 2
+		y = target.center().y() - disp.height() // 2
+		self._display_rect = QRect(x, y, disp.width(), disp.height())
+		key = (self._image.cacheKey(), config_fingerprint(self._cfg), disp.width(), disp.height(), self.devicePixelRatioF())
+		if key == self._frame_key and not self._frame.isNull():
+			self._frame_hits += 1
+		else:
+			self._frame_misses += 1
+			proxy, factor = self._proxy_for(disp)
+			# Render at proxy resolution so cost follows the widget size rather than the photo size
+			self._frame = QPixmap.fromImage(self._engine.render(proxy, self._cfg, factor))
+			self._frame_key = key
+		p.setRenderHint(QPainter.SmoothPixmapTransform, True)
+		p.drawPixmap(self._display_rect, self._frame)
 
 		# Overlay resize handles for image watermark (only when selected)
 		self._image_bbox = QRect()
@@ -118,25 +150,34 @@ class PreviewWidget(QWidget):
 				p.restore()
 		p.end()
 
+	def cacheStats(self) -> dict[str, int]:
+		return {"hits": self._frame_hits, "misses": self._frame_misses}
+
+	def _proxy_for(self, disp: QSize) -> tuple[QImage, float]:
+		# Returns (image to composite on, its scale relative to the full-resolution image)
+		dpr = self.devicePixelRatioF()
+		pw = max(1, int(round(disp.width() * dpr)))
+		ph = max(1, int(round(disp.height() * dpr)))
+		if pw >= self._image.width() or ph >= self._image.height():
+			# Widget is as large as the decoded photo: no downscaling needed
+			return self._image, self._image.width() / float(self._source_size.width())
+		if self._proxy.isNull() or self._proxy.width() != pw or self._proxy.height() != ph:
+			self._proxy = self._image.scaled(pw, ph, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+		return self._proxy, pw / float(self._source_size.width())
+
 	def _display_scale(self) -> float:
 		# ratio from base image to displayed image
 		if self._image.isNull() or self._display_rect.width() == 0 or self._display_rect.height() == 0:
 			return 1.0
-		return min(self._display_rect.width() / float(self._image.width()), self._display_rect.height() / float(self._image.height()))
+		return min(self._display_rect.width() / float(self._source_size.width()), self._display_rect.height() / float(self._source_size.height()))
 
 	def _calc_image_bbox_on_display(self) -> QRect:
-		from PySide6.QtGui import QImage as _QImg
-		path = self._cfg.image.path or ""
-		img = _QImg(path)
-		if img.isNull():
+		# Size on base image, as the engine will draw it (logo decode is cached by the engine)
+		size = self._engine.logo_size(self._cfg, self._source_size)
+		if not size.isValid():
 			return QRect()
-		# Size on base image
-		shorter = min(self._image.width(), self._image.height())
-		base_w = max(1, int(shorter * self._cfg.image.scale))
-		sx = max(0.01, float(getattr(self._cfg.image, "scale_x", 1.0)))
-		sy = max(0.01, float(getattr(self._cfg.image, "scale_y", 1.0)))
-		w_base = max(1, int(base_w * sx))
-		h_base = max(1, int(img.height() * (w_base / float(img.width())) * sy))
+		w_base = size.width()
+		h_base = size.height()
 		# Map to display
 		s = self._display_scale()
 		w_disp = int(w_base * s)
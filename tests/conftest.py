@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+	sys.path.insert(0, ROOT)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+
+@pytest.fixture(scope="session")
+def qapp():
+	from PySide6.QtGui import QGuiApplication
+	return QGuiApplication.instance() or QGuiApplication(["tests"])
+
+
+@pytest.fixture
+def home(tmp_path, monkeypatch):
+	"""Isolated ~ so templates and caches under ~/.watermark_studio don't leak between tests."""
+	monkeypatch.setenv("HOME", str(tmp_path / "home"))
+	return tmp_path / "home"
@@ -0,0 +1,65 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+from conftest import ROOT
+
+# Each script runs in a fresh interpreter with no QGuiApplication, as an importing service would
+_PRELUDE = """
+import io
+from PIL import Image
+from app.core.batch import watermark_iter, watermark_one
+from app.core.models import ExportOptions, WatermarkConfig
+
+buf = io.BytesIO()
+Image.new("RGB", (320, 240), (40, 90, 160)).save(buf, "JPEG")
+data = buf.getvalue()
+cfg = WatermarkConfig()
+cfg.text.text = "Sample"
+"""
+
+
+def _run(script: str) -> subprocess.CompletedProcess:
+	env = dict(os.environ, PYTHONPATH=ROOT)
+	env.pop("QT_QPA_PLATFORM", None)
+	return subprocess.run([sys.executable, "-c", _PRELUDE + textwrap.dedent(script)], cwd=ROOT, env=env, capture_output=True, text=True, timeout=120)
+
+
+def test_watermark_iter_default_qt_engine_without_app():
+	proc = _run("""
+		results = list(watermark_iter([data, data], cfg))
+		assert all(r.ok for r in results), [r.error for r in results]
+		assert all(Image.open(io.BytesIO(r.data)).size == (320, 240) for r in results)
+		print("ok")
+	""")
+	assert proc.returncode == 0, proc.stderr
+	assert proc.stdout.strip() == "ok"
+
+
+def test_qt_engine_off_main_thread_fails_cleanly():
+	proc = _run("""
+		import threading
+		out = []
+		t = threading.Thread(target=lambda: out.append(watermark_one(0, data, cfg, ExportOptions())))
+		t.start(); t.join()
+		assert not out[0].ok
+		assert "QGuiApplication" in out[0].error
+		print("ok")
+	""")
+	assert proc.returncode == 0, proc.stderr
+	assert proc.stdout.strip() == "ok"
+
+
+def test_watermark_iter_pillow_engine(tmp_path):
+	proc = _run(f"""
+		opts = ExportOptions(engine="pillow", output_dir={str(tmp_path)!r})
+		src = {str(tmp_path / "in.jpg")!r}
+		Image.open(io.BytesIO(data)).save(src)
+		results = list(watermark_iter([src, data], cfg, opts))
+		assert all(r.ok for r in results), [r.error for r in results]
+		assert sorted(r.out_path is not None for r in results) == [False, True]
+		print("ok")
+	""")
+	assert proc.returncode == 0, proc.stderr
+	assert len(list(tmp_path.iterdir())) == 2
@@ -0,0 +1,28 @@
+import json
+
+from PIL import Image
+
+from app.cli import main
+
+TEMPLATE = {"text": {"text": "Sample"}, "layout": {"enabled_text": True}}
+
+
+def _batch(tmp_path, capsys, *extra):
+	code = main(["batch", str(tmp_path / "in"), "-t", str(tmp_path / "tpl.json"), "-o", str(tmp_path / "out"), "--engine", "pillow", "-j", "1", "--progress-interval", "0", *extra])
+	assert code == 0
+	return capsys.readouterr().out
+
+
+def test_full_reexports_unchanged_images(tmp_path, home, capsys):
+	(tmp_path / "in").mkdir()
+	(tmp_path / "tpl.json").write_text(json.dumps(TEMPLATE))
+	for i in range(3):
+		Image.new("RGB", (64, 48), (40 * i, 90, 160)).save(tmp_path / "in" / f"img{i}.jpg")
+	assert _batch(tmp_path, capsys).startswith("成功 3，失败 0，跳过 0，未变化 0")
+	assert _batch(tmp_path, capsys).startswith("成功 0，失败 0，跳过 0，未变化 3")
+	# Our own earlier outputs are rendered again, not left alone as foreign files
+	assert _batch(tmp_path, capsys, "--full").startswith("成功 3，失败 0，跳过 0，未变化 0")
+	# A file the export did not write is still left alone
+	Image.new("RGB", (8, 8)).save(tmp_path / "in" / "img3.jpg")
+	Image.new("RGB", (8, 8)).save(tmp_path / "out" / "img3_watermarked.png")
+	assert _batch(tmp_path, capsys, "--full").startswith("成功 3，失败 0，跳过 1，未变化 0")
@@ -0,0 +1,178 @@
+"""Pillow engine against the Qt engine on the same configs.
+
+The two rasterizers anti-alias and hint glyphs differently, so text pixels
+differ a lot right on glyph edges (single channels by up to ~200). Text is
+therefore compared by where its ink lands and how much of it there is; logos,
+which both engines scale and blend the same way, are compared pixel by pixel.
+"""
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.core.models import WatermarkConfig
+from app.core.pil_engine import PillowWatermarkEngine, _covers, find_font_file
+
+# Text: bounding box of the changed pixels may move by this many pixels per edge
+TEXT_BBOX_PX = 3
+# Text: distance between the ink centroids, in pixels
+TEXT_CENTROID_PX = 2.5
+# Text: Pillow's total ink (summed |change|) relative to Qt's
+TEXT_INK_RATIO = (0.85, 1.3)
+# Text: mean absolute channel difference over the whole image
+TEXT_MEAN_DIFF = 3.0
+# Logos: largest channel difference, and the mean over the whole image
+LOGO_MAX_DIFF = 8
+LOGO_MEAN_DIFF = 0.1
+# Rotated logos are resampled differently along their edges (measured up to ~46 on a
+# hard color edge): allow larger differences there, on a small share of the pixels
+ROTATED_LOGO_MAX_DIFF = 64
+ROTATED_LOGO_OUTLIERS = 0.002
+# A pixel counts as watermarked when its channels changed by more than this in total
+INK_THRESHOLD = 24
+
+WIDTH, HEIGHT = 320, 240
+
+
+@pytest.fixture(scope="module")
+def base():
+	pixels = np.zeros((HEIGHT, WIDTH, 3), np.uint8)
+	pixels[..., 0] = np.linspace(20, 230, WIDTH)[None, :]
+	pixels[..., 1] = np.linspace(40, 200, HEIGHT)[:, None]
+	pixels[..., 2] = 120
+	return pixels
+
+
+@pytest.fixture(scope="module")
+def logo(tmp_path_factory):
+	path = tmp_path_factory.mktemp("parity") / "logo.png"
+	img = Image.new("RGBA", (80, 40), (200, 30, 30, 255))
+	img.paste((30, 200, 60, 128), (40, 0, 80, 40))
+	img.save(path)
+	return str(path)
+
+
+def _render_qt(base, cfg):
+	from PySide6.QtGui import QImage
+	from app.core.watermark_engine import WatermarkEngine
+	img = QImage(base.tobytes(), WIDTH, HEIGHT, WIDTH * 3, QImage.Format_RGB888).copy()
+	out = WatermarkEngine().render(img, cfg).convertToFormat(QImage.Format_RGB888)
+	rows = np.frombuffer(bytes(out.constBits()), np.uint8).reshape(HEIGHT, out.bytesPerLine())
+	return rows[:, :WIDTH * 3].reshape(HEIGHT, WIDTH, 3)
+
+
+def _render_pillow(base, cfg):
+	return np.asarray(PillowWatermarkEngine().render(Image.fromarray(base), cfg).convert("RGB"))
+
+
+def _ink(img, base):
+	"""Per-pixel amount of change from base."""
+	return np.abs(img.astype(int) - base.astype(int)).sum(-1)
+
+
+def _bbox(ink):
+	ys, xs = np.nonzero(ink > INK_THRESHOLD)
+	assert len(xs), "nothing was drawn"
+	return np.array([xs.min(), ys.min(), xs.max(), ys.max()])
+
+
+def _centroid(ink):
+	total = ink.sum()
+	return np.array([(ink.sum(0) * np.arange(ink.shape[1])).sum() / total, (ink.sum(1) * np.arange(ink.shape[0])).sum() / total])
+
+
+def _text_cfg(**layout):
+	cfg = WatermarkConfig()
+	cfg.layout.enabled_text = True
+	cfg.text.family = "DejaVu Sans"
+	cfg.text.size_px = 28
+	cfg.text.text = "Watermark"
+	cfg.text.color = (255, 255, 255, 220)
+	for name, value in layout.items():
+		setattr(cfg.layout, name, value)
+	return cfg
+
+
+def _logo_cfg(path, **fields):
+	cfg = WatermarkConfig()
+	cfg.layout.enabled_image = True
+	cfg.image.path = path
+	for name, value in fields.items():
+		setattr(cfg.layout if hasattr(cfg.layout, name) else cfg.image, name, value)
+	return cfg
+
+
+def _text_cases():
+	shadow = _text_cfg()
+	shadow.text.shadow = True
+	outline = _text_cfg()
+	outline.text.outline = True
+	outline.text.outline_color = (0, 0, 0, 200)
+	return {
+		"center": _text_cfg(),
+		"bottom-left": _text_cfg(text_position=(0.1, 0.9)),
+		"top-right": _text_cfg(text_position=(0.85, 0.1)),
+		"rotated": _text_cfg(text_rotation_deg=30.0),
+		"shadow": shadow,
+		"outline": outline,
+	}
+
+
+@pytest.mark.parametrize("name", list(_text_cases()))
+def test_text_parity(qapp, base, name):
+	if find_font_file("DejaVu Sans") is None:
+		pytest.skip("DejaVu Sans is not installed")
+	cfg = _text_cases()[name]
+	qt, pil = _render_qt(base, cfg), _render_pillow(base, cfg)
+	qt_ink, pil_ink = _ink(qt, base), _ink(pil, base)
+	assert np.abs(_bbox(qt_ink) - _bbox(pil_ink)).max() <= TEXT_BBOX_PX
+	assert np.hypot(*(_centroid(qt_ink) - _centroid(pil_ink))) <= TEXT_CENTROID_PX
+	assert TEXT_INK_RATIO[0] <= pil_ink.sum() / qt_ink.sum() <= TEXT_INK_RATIO[1]
+	assert np.abs(qt.astype(int) - pil.astype(int)).mean() <= TEXT_MEAN_DIFF
+
+
+def test_cjk_text_falls_back_like_qt(qapp, base):
+	# DejaVu has no CJK glyphs: both engines must fall back to a CJK font instead of drawing boxes
+	cfg = _text_cfg()
+	cfg.text.text = "水印测试"
+	path = find_font_file(cfg.text.family, text=cfg.text.text)
+	if path is None or not _covers(path, cfg.text.text):
+		pytest.skip("no CJK font is installed")
+	qt, pil = _render_qt(base, cfg), _render_pillow(base, cfg)
+	qt_ink, pil_ink = _ink(qt, base), _ink(pil, base)
+	assert np.hypot(*(_centroid(qt_ink) - _centroid(pil_ink))) <= TEXT_CENTROID_PX
+	assert TEXT_INK_RATIO[0] <= pil_ink.sum() / qt_ink.sum() <= TEXT_INK_RATIO[1]
+
+
+@pytest.mark.parametrize("fields", [
+	{},
+	{"image_position": (0.8, 0.2)},
+	{"image_rotation_deg": 45.0, "image_position": (0.3, 0.7)},
+	{"scale_x": 1.5, "scale_y": 0.5},
+	{"opacity": 0.3},
+	{"opacity": 1.0, "scale": 0.5},
+], ids=["default", "position", "rotated", "scale-xy", "opacity", "opaque-large"])
+def test_logo_parity(qapp, base, logo, fields):
+	cfg = _logo_cfg(logo, **fields)
+	qt, pil = _render_qt(base, cfg), _render_pillow(base, cfg)
+	assert np.array_equal(_bbox(_ink(qt, base)), _bbox(_ink(pil, base)))
+	diff = np.abs(qt.astype(int) - pil.astype(int))
+	assert diff.mean() <= LOGO_MEAN_DIFF
+	if cfg.layout.image_rotation_deg:
+		assert diff.max() <= ROTATED_LOGO_MAX_DIFF
+		assert np.mean(diff.max(-1) > LOGO_MAX_DIFF) <= ROTATED_LOGO_OUTLIERS
+	else:
+		assert diff.max() <= LOGO_MAX_DIFF
+
+
+def test_text_and_logo_rotate_separately(qapp, base, logo):
+	if find_font_file("DejaVu Sans") is None:
+		pytest.skip("DejaVu Sans is not installed")
+	cfg = _text_cfg(text_rotation_deg=-20.0, text_position=(0.6, 0.7), image_rotation_deg=10.0, image_position=(0.3, 0.3))
+	cfg.layout.enabled_image = True
+	cfg.image.path = logo
+	qt, pil = _render_qt(base, cfg), _render_pillow(base, cfg)
+	qt_ink, pil_ink = _ink(qt, base), _ink(pil, base)
+	# The two watermarks don't overlap: compare each half of the image on its own terms
+	for rows in (slice(0, HEIGHT // 2), slice(HEIGHT // 2, HEIGHT)):
+		assert np.hypot(*(_centroid(qt_ink[rows]) - _centroid(pil_ink[rows]))) <= TEXT_CENTROID_PX
+	assert np.abs(qt.astype(int) - pil.astype(int)).mean() <= TEXT_MEAN_DIFF
@@ -0,0 +1,58 @@
+import os
+
+from PIL import Image
+
+from app.core import exporter
+from app.core.exporter import ExportJob, group_jobs, run_export
+from app.core.models import ExportOptions, WatermarkConfig
+
+
+def _jobs(tmp_path, count):
+	cfg = WatermarkConfig()
+	cfg.text.text = "Sample"
+	jobs = []
+	for i in range(count):
+		src = tmp_path / f"src{i}.png"
+		Image.new("RGB", (64, 48), (40 * i, 90, 160)).save(src)
+		jobs.append(ExportJob(str(src), str(tmp_path / "out" / f"src{i}.png"), cfg))
+	os.makedirs(tmp_path / "out")
+	return jobs
+
+
+def test_pipeline_reports_decode_exceptions(tmp_path, monkeypatch):
+	jobs = _jobs(tmp_path, 4)
+	decode = exporter.decode
+
+	def flaky(path, opts):
+		if path.endswith("src1.png"):
+			raise ValueError("boom")
+		return decode(path, opts)
+
+	monkeypatch.setattr(exporter, "decode", flaky)
+	opts = ExportOptions(output_dir=str(tmp_path / "out"), engine="pillow")
+	results = list(run_export(jobs, opts, workers=1, backend="pipeline"))
+	assert len(results) == 4
+	failed = [r for r in results if not r.ok]
+	assert [(r.job.src_path, r.error) for r in failed] == [(jobs[1].src_path, "boom")]
+
+
+def test_group_jobs_orders_by_output_size(tmp_path):
+	cfg = WatermarkConfig()
+	jobs = []
+	for i, size in enumerate([(64, 48), (32, 32), (64, 48), (32, 32)]):
+		src = tmp_path / f"src{i}.png"
+		Image.new("RGB", size).save(src)
+		jobs.append(ExportJob(str(src), str(tmp_path / f"out{i}.png"), cfg))
+	grouped = group_jobs(jobs, ExportOptions(), probe_workers=2)
+	assert [os.path.basename(j.src_path) for j in grouped] == ["src1.png", "src3.png", "src0.png", "src2.png"]
+
+
+def test_group_jobs_skips_probing_for_fixed_output_size(tmp_path, monkeypatch):
+	cfg = WatermarkConfig()
+	jobs = [ExportJob(str(tmp_path / f"src{i}.png"), str(tmp_path / f"out{i}.png"), cfg) for i in range(4)]
+
+	def probe_many(*_args, **_kwargs):
+		raise AssertionError("probed")
+
+	monkeypatch.setattr(exporter.image_index(), "probe_many", probe_many)
+	assert group_jobs(jobs, ExportOptions(scale_mode="both", scale_value=100, scale_height=80)) == jobs
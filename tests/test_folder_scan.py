@@ -0,0 +1,53 @@
+import os
+
+from PIL import Image
+
+from app.core.probe import ImageIndex
+from app.ui.folder_scan_task import FolderScanTask
+
+
+def _scan(folders):
+	batches, finished = [], []
+	task = FolderScanTask([str(f) for f in folders])
+	task.batchFound.connect(batches.append)
+	task.finished.connect(lambda total, cancelled: finished.append((total, cancelled)))
+	task.run()
+	return batches, finished
+
+
+def test_scan_finds_readable_images_only(qapp, tmp_path):
+	good = []
+	for i in range(FolderScanTask.PROBE_CHUNK + 40):
+		path = tmp_path / f"d{i % 3}" / f"img{i:04d}.png"
+		os.makedirs(path.parent, exist_ok=True)
+		Image.new("RGB", (8, 6)).save(path)
+		good.append(str(path))
+	(tmp_path / "d0" / "broken.jpg").write_bytes(b"not an image")
+	(tmp_path / "d1" / "notes.txt").write_text("skip")
+	batches, finished = _scan([tmp_path])
+	found = [p for batch in batches for p in batch]
+	assert sorted(found) == sorted(good)
+	assert finished == [(len(good), False)]
+
+
+def test_cancelled_scan_emits_nothing_more(qapp, tmp_path):
+	for i in range(10):
+		Image.new("RGB", (8, 6)).save(tmp_path / f"img{i}.png")
+	task = FolderScanTask([str(tmp_path)])
+	batches, finished = [], []
+	task.batchFound.connect(batches.append)
+	task.finished.connect(lambda total, cancelled: finished.append((total, cancelled)))
+	task.cancel()
+	task.run()
+	assert batches == [] and finished == [(0, True)]
+
+
+def test_image_index_keeps_recent_entries_within_budget(qapp, tmp_path):
+	index = ImageIndex(max_bytes=4 * ImageIndex.ENTRY_BYTES)
+	paths = []
+	for i in range(6):
+		paths.append(str(tmp_path / f"img{i}.png"))
+		Image.new("RGB", (8, 6)).save(paths[-1])
+		index.probe(paths[-1])
+	assert len(index) == 4
+	assert index.get(paths[0]) is None and index.get(paths[-1]).width == 8
@@ -0,0 +1,70 @@
+import os
+
+from PIL import Image
+
+from app.core.exporter import ExportJob, run_export
+from app.core.journal import ExportJournal
+from app.core.manifest import ExportManifest
+from app.core.models import ExportOptions, WatermarkConfig
+
+
+def _jobs(tmp_path, out_dir, count=3):
+	cfg = WatermarkConfig()
+	cfg.text.text = "Sample"
+	jobs = []
+	for i in range(count):
+		src = tmp_path / f"src{i}.jpg"
+		Image.new("RGB", (320, 240), (30 * i, 90, 160)).save(src)
+		jobs.append(ExportJob(str(src), os.path.join(out_dir, f"src{i}.png"), cfg))
+	# Not an image: fails every run, so the journal is never completed
+	bad = tmp_path / "bad.jpg"
+	bad.write_bytes(b"not an image")
+	jobs.append(ExportJob(str(bad), os.path.join(out_dir, "bad.png"), cfg))
+	return jobs
+
+
+def test_resume_skips_jobs_done_with_same_options(tmp_path):
+	out_dir = str(tmp_path / "out")
+	os.makedirs(out_dir)
+	opts = ExportOptions(output_dir=out_dir, engine="pillow")
+	jobs = _jobs(tmp_path, out_dir)
+	list(run_export(jobs, opts, workers=1, journal=ExportJournal.for_output_dir(out_dir, opts)))
+
+	journal = ExportJournal.for_output_dir(out_dir, opts)
+	assert len(journal) == 3
+	results = list(run_export(jobs, opts, workers=1, journal=journal))
+	assert [r.skipped for r in results if r.ok] == [True] * 3
+
+
+def test_changed_options_are_not_resumed(tmp_path):
+	out_dir = str(tmp_path / "out")
+	os.makedirs(out_dir)
+	jobs = _jobs(tmp_path, out_dir)
+	half = ExportOptions(output_dir=out_dir, engine="pillow", scale_mode="percent", scale_value=50)
+	list(run_export(jobs, half, workers=1, journal=ExportJournal.for_output_dir(out_dir, half)))
+	assert Image.open(jobs[0].out_path).size == (160, 120)
+
+	full = ExportOptions(output_dir=out_dir, engine="pillow")
+	journal = ExportJournal.for_output_dir(out_dir, full)
+	assert len(journal) == 0
+	results = list(run_export(jobs, full, workers=1, journal=journal))
+	assert not any(r.skipped for r in results)
+	assert all(Image.open(job.out_path).size == (320, 240) for job in jobs[:3])
+
+
+def test_manifest_overrides_journal_for_changed_sources(tmp_path):
+	out_dir = str(tmp_path / "out")
+	os.makedirs(out_dir)
+	opts = ExportOptions(output_dir=out_dir, engine="pillow")
+	jobs = _jobs(tmp_path, out_dir)
+	list(run_export(jobs, opts, workers=1, journal=ExportJournal.for_output_dir(out_dir, opts), manifest=ExportManifest.for_output_dir(out_dir, opts)))
+
+	# Edited after the (incomplete) run: the journal still lists it as done
+	Image.new("RGB", (200, 100)).save(jobs[0].src_path)
+	os.utime(jobs[0].src_path, ns=(1, 1))
+	manifest = ExportManifest.for_output_dir(out_dir, opts)
+	results = list(run_export(jobs, opts, workers=1, journal=ExportJournal.for_output_dir(out_dir, opts), manifest=manifest))
+	rendered = {r.job.src_path for r in results if r.ok and not r.skipped}
+	assert rendered == {jobs[0].src_path}
+	assert Image.open(jobs[0].out_path).size == (200, 100)
+	assert ExportManifest.for_output_dir(out_dir, opts).check(jobs[0])
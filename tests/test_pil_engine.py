@@ -0,0 +1,44 @@
+import pytest
+from PIL import Image
+
+from app.core.models import ExportOptions
+from app.core.pil_engine import _covers, find_font_file, load_image, save_image
+
+
+def test_load_image_scales_to_export_size(tmp_path):
+	src = tmp_path / "src.png"
+	Image.new("RGB", (320, 240), (40, 90, 160)).save(src)
+	img = load_image(str(src), ExportOptions(engine="pillow", scale_mode="percent", scale_value=50))
+	assert img.size == (160, 120) and img.mode == "RGB"
+
+
+def test_load_image_rejects_empty_target(tmp_path):
+	src = tmp_path / "src.png"
+	Image.new("RGBA", (320, 240)).save(src)
+	# scale mode "both" without a height
+	assert load_image(str(src), ExportOptions(engine="pillow", scale_mode="both", scale_value=100)) is None
+
+
+def test_load_image_rejects_unreadable(tmp_path):
+	src = tmp_path / "bad.jpg"
+	src.write_bytes(b"not an image")
+	assert load_image(str(src), ExportOptions(engine="pillow")) is None
+	assert load_image(b"\xff\xd8 truncated", ExportOptions(engine="pillow")) is None
+
+
+def test_jpeg_flattens_alpha_over_black(tmp_path):
+	img = Image.new("RGBA", (4, 4), (200, 100, 50, 0))
+	img.paste((200, 100, 50, 255), (0, 0, 2, 4))
+	out = tmp_path / "out.jpg"
+	assert save_image(img, str(out), ExportOptions(engine="pillow", format="JPEG", jpeg_quality=100))
+	pixels = Image.open(out).convert("RGB")
+	assert max(pixels.getpixel((3, 2))) < 16 and pixels.getpixel((0, 2))[0] > 180
+
+
+def test_font_lookup_checks_glyph_coverage():
+	path = find_font_file("DejaVu Sans")
+	if path is None:
+		pytest.skip("DejaVu Sans is not installed")
+	assert _covers(path, "Wasserzeichen über") and not _covers(path, "水印")
+	# No CJK font installed: the requested family is still used rather than nothing
+	assert find_font_file("DejaVu Sans", text="水印") is not None
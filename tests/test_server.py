@@ -0,0 +1,168 @@
+import base64
+import http.client
+import io
+import json
+import threading
+from urllib.parse import quote
+
+import pytest
+from PIL import Image
+
+from app.core.models import WatermarkConfig
+from app.core.templates import save_template
+from app.server import MAX_BODY_BYTES, RenderService, make_server
+
+CONFIG = {"text": {"text": "Sample"}, "layout": {"enabled_text": True}}
+
+
+def _png(size=(64, 48)):
+	buf = io.BytesIO()
+	Image.new("RGB", size, (40, 90, 160)).save(buf, "PNG")
+	return buf.getvalue()
+
+
+@pytest.fixture
+def service(home):
+	return RenderService(engine="pillow", workers=1, max_queue=0, queue_timeout_s=0.5, warm_templates=False)
+
+
+@pytest.fixture
+def server(service):
+	httpd = make_server(service, port=0)
+	thread = threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True)
+	thread.start()
+	yield httpd
+	httpd.shutdown()
+	httpd.server_close()
+
+
+def _request(server, method, path, body=None, headers=None):
+	conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=10)
+	try:
+		conn.request(method, path, body=body, headers=headers or {})
+		resp = conn.getresponse()
+		return resp.status, resp.getheader("Content-Type"), resp.read()
+	finally:
+		conn.close()
+
+
+def _raw_request(server, path, headers):
+	"""Request with exactly the given headers (http.client would add Content-Length itself)."""
+	conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=10)
+	try:
+		conn.putrequest("POST", path)
+		for key, value in headers.items():
+			conn.putheader(key, value)
+		conn.endheaders()
+		resp = conn.getresponse()
+		return resp.status, json.loads(resp.read())
+	finally:
+		conn.close()
+
+
+def test_health_and_stats(server):
+	status, _, body = _request(server, "GET", "/health")
+	assert status == 200 and json.loads(body) == {"ok": True}
+	status, _, body = _request(server, "GET", "/stats")
+	assert status == 200 and json.loads(body)["engine"] == "pillow"
+
+
+def test_render_raw_body_with_config_query(server):
+	path = "/render?format=jpeg&quality=80&config=" + quote(json.dumps(CONFIG))
+	status, content_type, body = _request(server, "POST", path, _png())
+	assert status == 200 and content_type == "image/jpeg"
+	assert Image.open(io.BytesIO(body)).size == (64, 48)
+
+
+def test_render_json_envelope_with_template_and_options(server, service):
+	save_template("nightly", WatermarkConfig())
+	envelope = {"image": base64.b64encode(_png()).decode(), "template": "nightly", "options": {"scale_mode": "percent", "scale_value": 50}}
+	status, content_type, body = _request(server, "POST", "/render", json.dumps(envelope), {"Content-Type": "application/json"})
+	assert status == 200 and content_type == "image/png"
+	assert Image.open(io.BytesIO(body)).size == (32, 24)
+	assert service.stats()["ok"] == 1
+
+
+@pytest.mark.parametrize("envelope, message", [
+	({"image": "", "config": CONFIG, "options": ["format", "JPEG"]}, "options"),
+	({"image": "", "config": CONFIG, "options": "JPEG"}, "options"),
+	(["image"], "image"),
+	({"image": "not base64!", "config": CONFIG}, "image"),
+	({"image": base64.b64encode(_png()).decode(), "config": {"text": {"size": 3}}}, "text"),
+	({"image": base64.b64encode(_png()).decode()}, "template or config"),
+	({"image": base64.b64encode(_png()).decode(), "config": CONFIG, "options": {"quality": "high"}}, "quality"),
+	({"image": base64.b64encode(_png()).decode(), "config": CONFIG, "options": {"format": "gif"}}, "format"),
+	({"image": base64.b64encode(b"not an image").decode(), "config": CONFIG}, ""),
+])
+def test_bad_json_requests_are_400(server, envelope, message):
+	status, _, body = _request(server, "POST", "/render", json.dumps(envelope), {"Content-Type": "application/json"})
+	assert status == 400
+	assert message in json.loads(body)["error"]
+
+
+@pytest.mark.parametrize("bad", [
+	{"text": {"color": "red"}},
+	{"text": {"size_px": 10 ** 9}},
+	{"text": {"shadow": "yes"}},
+	{"image": {"opacity": 5}},
+	{"layout": {"text_position": [0.5, "top"]}},
+	{"layout": {"text_rotation_deg": 1e400}},
+])
+def test_bad_config_values_are_400_and_server_survives(qapp, home, bad):
+	# The Qt engine: a painter left active by a bad value used to crash the process
+	service = RenderService(engine="qt", workers=1, max_queue=0, warm_templates=False)
+	httpd = make_server(service, port=0)
+	threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True).start()
+	try:
+		config = {"text": {**CONFIG["text"], **bad.get("text", {})}, "layout": {**CONFIG["layout"], **bad.get("layout", {})}, "image": bad.get("image", {})}
+		status, _, body = _request(httpd, "POST", "/render?config=" + quote(json.dumps(config)), _png())
+		assert status == 400, body
+		assert _request(httpd, "POST", "/render?config=" + quote(json.dumps(CONFIG)), _png())[0] == 200
+	finally:
+		httpd.shutdown()
+		httpd.server_close()
+
+
+def test_inline_config_cannot_read_local_files(server, tmp_path):
+	logo = tmp_path / "logo.png"
+	logo.write_bytes(_png())
+	config = {"image": {"path": str(logo)}, "layout": {"enabled_image": True}}
+	status, _, body = _request(server, "POST", "/render?config=" + quote(json.dumps(config)), _png())
+	assert status == 400 and "image.path" in json.loads(body)["error"]
+
+
+def test_scale_and_quality_are_clamped():
+	from app.server import _options_from
+	opts = _options_from({"scale_mode": "percent", "scale_value": 10000, "quality": 500})
+	assert opts.scale_value == 1000 and opts.jpeg_quality == 100
+	opts = _options_from({"scale_mode": "both", "scale_value": 1e9, "scale_height": -5})
+	assert (opts.scale_value, opts.scale_height) == (10000, 1)
+
+
+@pytest.mark.parametrize("options", [{"scale_mode": "huge"}, {"scale_mode": "width", "scale_value": "nan"}, {"scale_mode": "percent", "scale_value": "inf"}])
+def test_bad_scale_options_are_400(server, options):
+	query = "&".join(f"{k}={v}" for k, v in options.items())
+	status, _, _ = _request(server, "POST", f"/render?{query}&config=" + quote(json.dumps(CONFIG)), _png())
+	assert status == 400
+
+
+def test_content_length_is_validated(server):
+	assert _raw_request(server, "/render", {"Content-Length": "-1"})[0] == 400
+	assert _raw_request(server, "/render", {})[0] == 411
+	assert _raw_request(server, "/render", {"Content-Length": str(MAX_BODY_BYTES + 1)})[0] == 413
+
+
+def test_not_found(server):
+	assert _request(server, "GET", "/nope")[0] == 404
+	assert _request(server, "POST", "/nope", b"")[0] == 404
+	assert _request(server, "POST", "/render?template=missing", _png())[0] == 404
+	assert _request(server, "POST", "/render?template=../etc", _png())[0] == 400
+
+
+def test_busy_server_answers_503(server, service):
+	# Hold the only render slot; with no queue the request is rejected at once
+	with service._engine():
+		status, _, body = _request(server, "POST", "/render?config=" + quote(json.dumps(CONFIG)), _png())
+	assert status == 503 and json.loads(body)["error"] == "server busy"
+	assert service.stats()["rejected"] == 1
+	assert _request(server, "POST", "/render?config=" + quote(json.dumps(CONFIG)), _png())[0] == 200
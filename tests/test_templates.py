@@ -0,0 +1,34 @@
+import json
+import os
+import time
+
+from app.core import templates
+from app.core.templates import _DebouncedJsonWriter, _write_text_atomic
+
+
+def test_flush_waits_for_a_write_in_progress(tmp_path, monkeypatch):
+	path = str(tmp_path / "last.json")
+	write = templates._write_text_atomic
+
+	def slow_write(p, text):
+		time.sleep(0.2)
+		write(p, text)
+
+	monkeypatch.setattr(templates, "_write_text_atomic", slow_write)
+	writer = _DebouncedJsonWriter(lambda: path, delay_s=0.0)
+	writer.submit({"n": 1})
+	deadline = time.monotonic() + 5
+	while not writer._writing and time.monotonic() < deadline:
+		time.sleep(0.001)
+	# The writer thread has taken the payload: flush must not return before it is on disk
+	writer.flush()
+	with open(path, encoding="utf-8") as f:
+		assert json.load(f) == {"n": 1}
+
+
+def test_atomic_write_leaves_no_temp_files(tmp_path):
+	path = str(tmp_path / "state.json")
+	_write_text_atomic(path, "{}")
+	_write_text_atomic(path, "[]")
+	assert os.listdir(tmp_path) == ["state.json"]
+	assert open(path, encoding="utf-8").read() == "[]"
@@ -0,0 +1,14 @@
+from app.core.thumbcache import ThumbnailCache
+
+
+def test_eviction_counts_entries_written_by_other_instances(tmp_path):
+	path = str(tmp_path / "thumbs.sqlite")
+	first, second = ThumbnailCache(path, max_bytes=10000), ThumbnailCache(path, max_bytes=10000)
+	for i in range(8):
+		first.put(f"/a{i}.jpg", (160, 120), 1, 1, b"x" * 1000)
+		second.put(f"/b{i}.jpg", (160, 120), 1, 1, b"x" * 1000)
+	# Each instance only saw its own 8000 bytes; the next eviction recounts the whole file
+	first.put("/big.jpg", (160, 120), 1, 1, b"x" * 3000)
+	assert first.total_bytes() == first._stored_bytes() <= 9000
+	first.close()
+	second.close()
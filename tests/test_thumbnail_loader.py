@@ -0,0 +1,86 @@
+import time
+
+from PIL import Image
+from PySide6.QtCore import QSize
+
+from app.ui.thumbnail_loader import ThumbnailLoader
+
+
+def test_thumbnails_are_delivered_for_every_path(qapp, tmp_path):
+	paths = []
+	for i in range(5):
+		path = tmp_path / f"img{i}.png"
+		Image.new("RGB", (400, 300), (50 * i, 80, 120)).save(path)
+		paths.append(str(path))
+	bad = tmp_path / "bad.jpg"
+	bad.write_bytes(b"not an image")
+	paths.append(str(bad))
+
+	results = {}
+
+	def on_ready(path, image):
+		results[path] = image.size()
+
+	loader = ThumbnailLoader(QSize(160, 120), workers=2)
+	loader.thumbnailReady.connect(on_ready)
+	try:
+		for path in paths + paths:
+			loader.request(path)
+		# Results are queued to this thread
+		deadline = time.monotonic() + 10
+		while len(results) < len(paths) and time.monotonic() < deadline:
+			qapp.processEvents()
+			time.sleep(0.01)
+		qapp.processEvents()
+	finally:
+		loader.shutdown()
+	assert len(results) == len(paths)
+	assert results[str(bad)].isEmpty()
+	assert all(results[p] == QSize(160, 120) for p in paths[:-1])
+
+
+def test_unreadable_thumbnail_keeps_its_row(qapp, home, tmp_path):
+	from PySide6.QtCore import Qt
+	from PySide6.QtGui import QPixmap
+	from app.ui.widgets.image_list import ImageListModel
+
+	bad = tmp_path / "bad.jpg"
+	bad.write_bytes(b"not an image")
+	model = ImageListModel(QSize(160, 120), QPixmap(160, 120))
+	try:
+		assert model.add_paths([str(bad)]) == 1
+		model.data(model.index(0), Qt.DecorationRole)
+		deadline = time.monotonic() + 10
+		while str(bad) not in model._failed and time.monotonic() < deadline:
+			qapp.processEvents()
+			time.sleep(0.01)
+		# Retried once, then kept with its placeholder
+		assert model.rowCount() == 1 and str(bad) in model._failed
+		assert "无法读取" in model.data(model.index(0), Qt.ToolTipRole)
+	finally:
+		model.shutdown()
+
+
+def test_latest_requests_are_served_first(qapp, tmp_path):
+	paths = []
+	for i in range(6):
+		path = tmp_path / f"img{i}.png"
+		Image.new("RGB", (64, 48)).save(path)
+		paths.append(str(path))
+	order = []
+	loader = ThumbnailLoader(QSize(32, 24), workers=1)
+	loader.thumbnailReady.connect(lambda path, _image: order.append(path))
+	try:
+		# Hold the only worker so the requests below queue up behind it
+		with loader._cond:
+			for path in paths:
+				loader.request(path)
+			# Painted again (still on screen): to the front
+			loader.request(paths[1])
+		deadline = time.monotonic() + 10
+		while len(order) < len(paths) and time.monotonic() < deadline:
+			qapp.processEvents()
+			time.sleep(0.01)
+	finally:
+		loader.shutdown()
+	assert order == [paths[1], paths[5], paths[4], paths[3], paths[2], paths[0]]
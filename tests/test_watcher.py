@@ -0,0 +1,89 @@
+import os
+import threading
+import time
+
+from PIL import Image
+
+from app.core.models import ExportOptions, WatermarkConfig
+from app.core.watcher import FolderWatcher
+
+
+def _image(path, color):
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	Image.new("RGB", (64, 48), color).save(path)
+
+
+def _watch(watcher, expected, timeout=20.0):
+	"""Run watcher until expected results have been reported; returns them."""
+	results = []
+	done = threading.Event()
+
+	def on_result(res, _latency):
+		results.append(res)
+		if len(results) >= expected:
+			done.set()
+
+	watcher._on_result = on_result
+	stop = threading.Event()
+	thread = threading.Thread(target=watcher.run, args=(stop,))
+	thread.start()
+	try:
+		assert done.wait(timeout), results
+	finally:
+		stop.set()
+		thread.join()
+	return results
+
+
+def _watcher(dirs, out_dir, **options):
+	cfg = WatermarkConfig()
+	cfg.text.text = "Sample"
+	opts = ExportOptions(output_dir=str(out_dir), engine="pillow", **options)
+	return FolderWatcher([str(d) for d in dirs], cfg, opts, settle_s=0.0, polling=True, poll_interval_s=0.1, workers=1)
+
+
+def test_outputs_mirror_subfolders(tmp_path):
+	src = tmp_path / "in"
+	_image(str(src / "a" / "img.jpg"), (200, 0, 0))
+	_image(str(src / "b" / "img.jpg"), (0, 200, 0))
+	_image(str(src / "top.jpg"), (0, 0, 200))
+	out = tmp_path / "out"
+	results = _watch(_watcher([src], out), 3)
+	assert all(r.ok for r in results), [r.error for r in results]
+	assert sorted(os.path.relpath(r.job.out_path, out) for r in results) == [
+		os.path.join("a", "img_watermarked.png"),
+		os.path.join("b", "img_watermarked.png"),
+		"top_watermarked.png",
+	]
+	assert Image.open(out / "a" / "img_watermarked.png").getpixel((0, 0))[0] > 150
+	assert Image.open(out / "b" / "img_watermarked.png").getpixel((0, 0))[1] > 150
+
+
+def test_several_watched_dirs_get_their_own_folder_and_collisions_are_reported(tmp_path):
+	first, second, third = tmp_path / "one" / "photos", tmp_path / "two", tmp_path / "three" / "photos"
+	for d in (first, second, third):
+		_image(str(d / "img.jpg"), (90, 90, 90))
+	out = tmp_path / "out"
+	results = _watch(_watcher([first, second, third], out), 3)
+	ok = sorted(os.path.relpath(r.job.out_path, out) for r in results if r.ok)
+	assert ok == [os.path.join("photos", "img_watermarked.png"), os.path.join("two", "img_watermarked.png")]
+	failed = [r for r in results if not r.ok]
+	assert len(failed) == 1 and "冲突" in failed[0].error
+
+
+def test_restart_with_changed_options_exports_again(tmp_path):
+	src, out = tmp_path / "in", tmp_path / "out"
+	_image(str(src / "img.jpg"), (90, 90, 90))
+	assert [r.ok for r in _watch(_watcher([src], out), 1)] == [True]
+
+	# Same config and options: the startup scan finds nothing to do
+	watcher = _watcher([src], out)
+	stop = threading.Event()
+	stop.set()
+	watcher.run(stop)
+	assert watcher._pending == {}
+
+	results = _watch(_watcher([src], out, scale_mode="percent", scale_value=50), 1)
+	assert [r.ok for r in results] == [True]
+	assert Image.open(out / "img_watermarked.png").size == (32, 24)
+